@@ -5,6 +5,7 @@ import Login from "./Login";
 import SearchBox from "./components/SearchBox";
 import ResultsTable from "./components/ResultsTable";
 import DecryptPanel from "./components/DecryptPanel";
+import { decryptBlob } from "./crypto/decrypt";
 
 // ✅ NEW (added, not breaking anything)
 import Dashboard from "./pages/Dashboard";
@@ -16,35 +17,10 @@ const PROXY_BASE =
   process.env.REACT_APP_PROXY_URL || "http://localhost:8000";
 
 // ===============================
-//   Crypto Helpers (UNCHANGED)
+//   Crypto Helpers
 // ===============================
-async function importKeyFromRaw(rawKeyBytes) {
-  return await window.crypto.subtle.importKey(
-    "raw",
-    rawKeyBytes,
-    { name: "AES-GCM" },
-    false,
-    ["decrypt"]
-  );
-}
-
-function hexToUint8(hex) {
-  return new Uint8Array(hex.match(/.{1,2}/g).map((b) => parseInt(b, 16)));
-}
-
-async function decryptBlob(rawKeyBytes, nonceHex, ciphertextHex) {
-  const key = await importKeyFromRaw(rawKeyBytes);
-  const iv = hexToUint8(nonceHex);
-  const ct = hexToUint8(ciphertextHex);
-
-  const plain = await window.crypto.subtle.decrypt(
-    { name: "AES-GCM", iv },
-    key,
-    ct
-  );
-
-  return JSON.parse(new TextDecoder().decode(plain));
-}
+// AES-GCM + binary envelope decoding lives in crypto/decrypt.js
+// (handles base64 and legacy hex blobs)
 
 // ===============================
 // Masking logic
@@ -113,12 +89,11 @@ function LegacyClinicianApp() {
     fr.onload = async (e) => {
       const rawKey = new Uint8Array(e.target.result);
       const r = await axios.get(`${PROXY_BASE}/fetch_blob/${filename}`);
-      const enc = r.data.enc_blob;
+      const enc = r.data; // raw stored blob (served as-is)
 
       let plain = await decryptBlob(
         rawKey.buffer,
-        enc.nonce,
-        enc.ciphertext
+        enc
       );
 
       if (plain.metadata) {
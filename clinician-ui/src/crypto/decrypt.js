@@ -1,9 +1,31 @@
 // AES-GCM helpers (browser crypto)
+//
+// Stored blobs come in two wire encodings:
+//   { nonce, ciphertext, encoding: "base64" }   current
+//   { nonce, ciphertext }                       legacy hex
+//
+// Decrypted plaintexts are either the binary vector envelope
+// (magic "ECXV", see hospital-agent/app/envelope.py) or legacy JSON.
+//
+// Blobs tagged with a "kid" are encrypted with a data key derived from
+// the master key (HKDF-SHA256, see hospital-agent/app/data_keys.py);
+// untagged blobs use the master key directly.
 
 function hexToUint8(hex) {
   return new Uint8Array(hex.match(/.{1,2}/g).map(b => parseInt(b, 16)));
 }
 
+function base64ToUint8(b64) {
+  const bin = atob(b64);
+  const out = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i++) out[i] = bin.charCodeAt(i);
+  return out;
+}
+
+function decodeWire(value, encoding) {
+  return encoding === "base64" ? base64ToUint8(value) : hexToUint8(value);
+}
+
 async function importKeyFromRaw(rawKeyBytes) {
   return await window.crypto.subtle.importKey(
     "raw",
@@ -14,17 +36,108 @@ async function importKeyFromRaw(rawKeyBytes) {
   );
 }
 
+const HKDF_INFO_PREFIX = "cyborg-ehr/data-key/v1:";
+
+async function deriveDataKey(rawKeyBytes, kid) {
+  const master = await window.crypto.subtle.importKey(
+    "raw",
+    rawKeyBytes,
+    "HKDF",
+    false,
+    ["deriveKey"]
+  );
+  return await window.crypto.subtle.deriveKey(
+    {
+      name: "HKDF",
+      hash: "SHA-256",
+      salt: new Uint8Array(0),
+      info: new TextEncoder().encode(HKDF_INFO_PREFIX + kid),
+    },
+    master,
+    { name: "AES-GCM", length: 256 },
+    false,
+    ["decrypt"]
+  );
+}
+
+// ---------------------------------------------------------
+// Binary envelope
+// ---------------------------------------------------------
+const ENVELOPE_MAGIC = "ECXV";
+const ENVELOPE_HEADER = 20;
+const ENVELOPE_ITEMSIZE = { 0: 4, 1: 2, 2: 1 };   // float32, float16, int8
+
+function halfToFloat(h) {
+  const sign = h & 0x8000 ? -1 : 1;
+  const exp = (h >> 10) & 0x1f;
+  const frac = h & 0x3ff;
+  if (exp === 0) return sign * Math.pow(2, -14) * (frac / 1024);
+  if (exp === 0x1f) return frac ? NaN : sign * Infinity;
+  return sign * Math.pow(2, exp - 15) * (1 + frac / 1024);
+}
+
+function isEnvelope(bytes) {
+  return (
+    bytes.length >= ENVELOPE_HEADER &&
+    String.fromCharCode(bytes[0], bytes[1], bytes[2], bytes[3]) === ENVELOPE_MAGIC
+  );
+}
+
+function unpackEnvelope(bytes) {
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  const version = view.getUint8(4);
+  const dtype = view.getUint8(5);
+  const dim = view.getUint32(8, true);
+  const scale = view.getFloat32(12, true);
+  const metaLen = view.getUint32(16, true);
+
+  if (version !== 1) throw new Error(`Unsupported envelope version ${version}`);
+  const itemsize = ENVELOPE_ITEMSIZE[dtype];
+  if (itemsize === undefined) throw new Error(`Unknown envelope dtype ${dtype}`);
+  if (bytes.byteLength !== ENVELOPE_HEADER + dim * itemsize + metaLen) {
+    throw new Error("Truncated envelope");
+  }
+
+  const vector = new Array(dim);
+  let offset = ENVELOPE_HEADER;
+  for (let i = 0; i < dim; i++) {
+    if (dtype === 0) {
+      vector[i] = view.getFloat32(offset, true);
+    } else if (dtype === 1) {
+      vector[i] = halfToFloat(view.getUint16(offset, true));
+    } else {
+      vector[i] = view.getInt8(offset) * scale;
+    }
+    offset += itemsize;
+  }
+
+  const metadata = metaLen
+    ? JSON.parse(new TextDecoder().decode(bytes.subarray(offset, offset + metaLen)))
+    : {};
+
+  return { vector, metadata };
+}
+
+// ---------------------------------------------------------
+// Public API
+// ---------------------------------------------------------
 export async function decryptBlob(rawKeyBytes, encBlob) {
-  const key = await importKeyFromRaw(rawKeyBytes);
-  const iv = hexToUint8(encBlob.nonce);
-  const ciphertext = hexToUint8(encBlob.ciphertext);
-
-  const plaintext = await window.crypto.subtle.decrypt(
-    { name: "AES-GCM", iv },
-    key,
-    ciphertext
+  const key = encBlob.kid
+    ? await deriveDataKey(rawKeyBytes, encBlob.kid)
+    : await importKeyFromRaw(rawKeyBytes);
+  const iv = decodeWire(encBlob.nonce, encBlob.encoding);
+  const ciphertext = decodeWire(encBlob.ciphertext, encBlob.encoding);
+
+  const plaintext = new Uint8Array(
+    await window.crypto.subtle.decrypt(
+      { name: "AES-GCM", iv },
+      key,
+      ciphertext
+    )
   );
 
+  if (isEnvelope(plaintext)) return unpackEnvelope(plaintext);
+
   const decoded = new TextDecoder().decode(plaintext);
   return JSON.parse(decoded);
-}
\ No newline at end of file
+}
@@ -8,6 +8,7 @@ import Badge from "../components/Badge";
 import SearchBox from "../components/SearchBox";
 import ResultsTable from "../components/ResultsTable";
 import DecryptPanel from "../components/DecryptPanel";
+import { decryptBlob } from "../crypto/decrypt";
 
 // ===============================
 // CONFIG — Proxy URL
@@ -18,35 +19,10 @@ const PROXY_BASE =
     : "http://localhost:8000";
 
 // ===============================
-// Crypto helpers (UNCHANGED)
+// Crypto helpers
 // ===============================
-async function importKeyFromRaw(rawKeyBytes) {
-  return await window.crypto.subtle.importKey(
-    "raw",
-    rawKeyBytes,
-    { name: "AES-GCM" },
-    false,
-    ["decrypt"]
-  );
-}
-
-function hexToUint8(hex) {
-  return new Uint8Array(hex.match(/.{1,2}/g).map((b) => parseInt(b, 16)));
-}
-
-async function decryptBlob(rawKeyBytes, nonceHex, ciphertextHex) {
-  const key = await importKeyFromRaw(rawKeyBytes);
-  const iv = hexToUint8(nonceHex);
-  const ct = hexToUint8(ciphertextHex);
-
-  const plain = await window.crypto.subtle.decrypt(
-    { name: "AES-GCM", iv },
-    key,
-    ct
-  );
-
-  return JSON.parse(new TextDecoder().decode(plain));
-}
+// AES-GCM + binary envelope decoding lives in crypto/decrypt.js
+// (handles base64 and legacy hex blobs)
 
 // ===============================
 // Decode JWT (UI only)
@@ -100,12 +76,11 @@ export default function Dashboard() {
     fr.onload = async (e) => {
       const rawKey = new Uint8Array(e.target.result);
       const r = await axios.get(`${PROXY_BASE}/fetch_blob/${filename}`);
-      const enc = r.data.enc_blob;
+      const enc = r.data; // raw stored blob (served as-is)
 
       const plain = await decryptBlob(
         rawKey.buffer,
-        enc.nonce,
-        enc.ciphertext
+        enc
       );
 
       setDecrypted(plain);
@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import queue
+import hashlib
+import datetime
+import threading
+
+"""
+Audit Writer (background, group-commit, hash-chained)
+-----------------------------------------------------
+Request handlers enqueue entries; one background thread drains the
+queue and appends them to audit.log in batches.  A full queue applies
+backpressure: the handler waits (off the event loop) for room, up to
+AUDIT_SUBMIT_TIMEOUT, and only then gives up (counted in "dropped").
+
+Tamper evidence:
+  every entry carries  prev = hash of the previous entry
+                       hash = SHA-256(prev + canonical JSON of entry)
+  so editing, deleting or reordering any line breaks the chain.
+  The chain continues across rotated segments.
+
+Environment variables:
+ - AUDIT_FLUSH_INTERVAL  = max seconds an entry waits before commit (default 0.2)
+ - AUDIT_BATCH_MAX       = max entries per group commit (default 1000)
+ - AUDIT_FSYNC           = "always" (every commit), "interval" or "never"
+ - AUDIT_FSYNC_INTERVAL  = seconds between fsyncs in "interval" mode (default 1)
+ - AUDIT_QUEUE_SIZE      = in-memory queue bound (default 10000)
+ - AUDIT_SUBMIT_TIMEOUT  = max seconds a submit waits on a full queue (default 5)
+ - AUDIT_MAX_BYTES       = rotate segment above this size (default 64 MiB)
+ - AUDIT_MAX_AGE         = rotate segment older than this, seconds (default 86400)
+"""
+
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.2"))
+AUDIT_BATCH_MAX = int(os.getenv("AUDIT_BATCH_MAX", "1000"))
+AUDIT_FSYNC = os.getenv("AUDIT_FSYNC", "always").lower()
+AUDIT_FSYNC_INTERVAL = float(os.getenv("AUDIT_FSYNC_INTERVAL", "1"))
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_SUBMIT_TIMEOUT = float(os.getenv("AUDIT_SUBMIT_TIMEOUT", "5"))
+AUDIT_MAX_BYTES = int(os.getenv("AUDIT_MAX_BYTES", str(64 * 1024 * 1024)))
+AUDIT_MAX_AGE = float(os.getenv("AUDIT_MAX_AGE", "86400"))
+
+GENESIS_HASH = "0" * 64
+
+_STOP = object()
+
+
+def chain_hash(prev: str, entry: dict) -> str:
+    """Hash of an entry (without its own hash field) linked to `prev`."""
+    body = {k: v for k, v in entry.items() if k != "hash"}
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256((prev + canonical).encode("utf-8")).hexdigest()
+
+
+class AuditWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self._queue = queue.Queue(maxsize=AUDIT_QUEUE_SIZE)
+        self._thread = None
+        self._file = None
+        self._opened_at = time.time()
+        self._last_fsync = time.time()
+        self.last_hash = GENESIS_HASH
+
+        # metrics
+        self.written = 0
+        self.batches = 0
+        self.rotations = 0
+        self.backpressure_events = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+
+    # -------------------------------------------------
+    # Lifecycle
+    # -------------------------------------------------
+    def start(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.last_hash = self._recover_last_hash()
+        self._file = open(self.path, "a")
+        self._opened_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+
+    def _segments(self) -> list:
+        base = os.path.basename(self.path)
+        stem = base.rsplit(".", 1)[0]
+        directory = os.path.dirname(self.path)
+        return sorted(
+            os.path.join(directory, f) for f in os.listdir(directory)
+            if f.startswith(stem + "-") and f.endswith(".log")
+        )
+
+    def _recover_last_hash(self) -> str:
+        """Continue the chain from the newest segment that has entries."""
+        for path in [self.path] + self._segments()[::-1]:
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                continue
+            with open(path, "rb") as f:
+                f.seek(max(0, os.path.getsize(path) - 65536))
+                lines = [l for l in f.read().splitlines() if l.strip()]
+            if not lines:
+                continue
+            try:
+                last = json.loads(lines[-1])
+            except ValueError:
+                return hashlib.sha256(lines[-1]).hexdigest()
+            # legacy (unchained) log → anchor the chain to its last line
+            return last.get("hash") or hashlib.sha256(lines[-1]).hexdigest()
+        return GENESIS_HASH
+
+    # -------------------------------------------------
+    # Producer side
+    # -------------------------------------------------
+    def try_submit(self, entry: dict) -> bool:
+        """Enqueue without blocking (safe on the event loop); False if full."""
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            return False
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return True
+
+    def submit(self, entry: dict, timeout: float = AUDIT_SUBMIT_TIMEOUT) -> bool:
+        """
+        Enqueue an entry, waiting up to `timeout` for room on a full queue
+        (blocking: call from a worker thread).  False only if the writer
+        did not catch up in time; the entry is then counted as dropped.
+        """
+        if self.try_submit(entry):
+            return True
+        self.backpressure_events += 1
+        try:
+            self._queue.put(entry, timeout=timeout)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return True
+
+    # -------------------------------------------------
+    # Consumer side
+    # -------------------------------------------------
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=AUDIT_FLUSH_INTERVAL)
+            except queue.Empty:
+                self._maybe_fsync()
+                self._maybe_rotate()
+                continue
+
+            batch = []
+            deadline = time.monotonic() + AUDIT_FLUSH_INTERVAL
+            item = first
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= AUDIT_BATCH_MAX:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._commit(batch)
+
+        # drain anything enqueued after the stop sentinel
+        rest = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                rest.append(item)
+        if rest:
+            self._commit(rest)
+        self._fsync()
+
+    def _commit(self, batch: list):
+        # chain on a local head: last_hash only moves once the batch is on disk
+        head = self.last_hash
+        lines = []
+        for entry in batch:
+            entry["prev"] = head
+            entry["hash"] = chain_hash(head, entry)
+            head = entry["hash"]
+            lines.append(json.dumps(entry) + "\n")
+
+        start = self._file.tell()
+        try:
+            self._file.write("".join(lines))
+            self._file.flush()
+        except OSError:
+            self.errors += 1
+            self.dropped += len(batch)
+            self._discard_tail(start)
+            return
+
+        self.last_hash = head
+        if AUDIT_FSYNC == "always":
+            self._fsync()
+        else:
+            self._maybe_fsync()
+        self.written += len(batch)
+        self.batches += 1
+
+        self._maybe_rotate()
+
+    def _discard_tail(self, size: int):
+        """
+        Drop a failed batch: reopen (discarding buffered lines) and cut
+        the file back to `size`, so no partial line or unchained entry
+        is left behind and the chain continues from the last good entry.
+        """
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        try:
+            os.truncate(self.path, size)
+        except OSError:
+            self.errors += 1
+        self._file = open(self.path, "a")
+
+    def _fsync(self):
+        try:
+            os.fsync(self._file.fileno())
+        except OSError:
+            self.errors += 1
+        self._last_fsync = time.time()
+
+    def _maybe_fsync(self):
+        if AUDIT_FSYNC == "interval" and time.time() - self._last_fsync >= AUDIT_FSYNC_INTERVAL:
+            self._fsync()
+
+    def _maybe_rotate(self):
+        size = self._file.tell()
+        if size == 0:
+            return
+        if size < AUDIT_MAX_BYTES and time.time() - self._opened_at < AUDIT_MAX_AGE:
+            return
+
+        self._fsync()
+        self._file.close()
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        stem = self.path.rsplit(".", 1)[0]
+        os.replace(self.path, f"{stem}-{stamp}.log")
+        self._file = open(self.path, "a")
+        self._opened_at = time.time()
+        self.rotations += 1
+
+    # -------------------------------------------------
+    # Metrics
+    # -------------------------------------------------
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": AUDIT_QUEUE_SIZE,
+            "max_queue_depth": self.max_queue_depth,
+            "backpressure_events": self.backpressure_events,
+            "dropped": self.dropped,
+            "written": self.written,
+            "batches": self.batches,
+            "rotations": self.rotations,
+            "errors": self.errors,
+            "fsync_policy": AUDIT_FSYNC,
+            "last_hash": self.last_hash,
+        }
@@ -1 +1,2 @@
-from .jwt import verify_jwt, require_role, TokenData
\ No newline at end of file
+from .jwt import verify_jwt, require_role, TokenData
+from shared.jwt_cache import token_cache
\ No newline at end of file
@@ -3,6 +3,8 @@ from jose import jwt, JWTError
 from pydantic import BaseModel
 import os
 
+from shared.jwt_cache import token_cache, RevokedTokenError
+
 JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
 JWT_ALG = os.getenv("JWT_ALG", "HS256")
 
@@ -20,10 +22,16 @@ def verify_jwt(authorization: str = Header(None)) -> TokenData:
     token = authorization.split(" ")[1]
 
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
-        return TokenData(sub=payload["sub"], role=payload["role"])
+        # full HMAC verification only on cache miss
+        return token_cache.get_or_verify(token, _decode)
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired JWT")
+    except RevokedTokenError:
+        raise HTTPException(status_code=401, detail="Revoked JWT")
+
+def _decode(token: str):
+    payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+    return TokenData(sub=payload["sub"], role=payload["role"]), payload
 
 def require_role(*allowed_roles):
     def checker(token: TokenData = Depends(verify_jwt)):
@@ -0,0 +1,115 @@
+import os
+import base64
+import bisect
+import hashlib
+import threading
+from collections import OrderedDict
+
+"""
+Sorted Blob Index
+-----------------
+In-memory sorted list of blob filenames in DATA_DIR, used for
+cursor-paginated listing instead of os.listdir() on every request.
+
+ - rebuilt only when the directory's mtime changes (a full scandir:
+   async callers run page()/iter() in a worker thread)
+ - cursor = opaque token encoding the last filename returned
+ - hospital filter = prefix range "{hospital}__" (bisect, no scan)
+
+Strong ETags:
+ - SHA-256 of the stored bytes, computed once per (mtime, size) and
+   kept in a bounded LRU, so conditional fetches never re-read the file
+"""
+
+ETAG_CACHE_SIZE = int(os.getenv("ETAG_CACHE_SIZE", "100000"))
+
+
+def encode_cursor(name: str) -> str:
+    return base64.urlsafe_b64encode(name.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    except (ValueError, UnicodeError):
+        raise ValueError("invalid cursor")
+
+
+class BlobIndex:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._names = []
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> list:
+        mtime = os.stat(self.directory).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with os.scandir(self.directory) as it:
+                        names = sorted(
+                            e.name for e in it
+                            if e.is_file() and not e.name.endswith(".log")
+                        )
+                    self._names = names
+                    self._mtime = mtime
+        return self._names
+
+    def _range(self, cursor: str = None, hospital: str = None):
+        names = self._refresh()
+        lo, hi = 0, len(names)
+
+        if hospital:
+            prefix = f"{hospital}__"
+            lo = bisect.bisect_left(names, prefix)
+            # "_" + 1 == "`" → upper bound of the prefix range
+            hi = bisect.bisect_left(names, f"{hospital}_`")
+
+        if cursor:
+            lo = max(lo, bisect.bisect_right(names, decode_cursor(cursor)))
+
+        return names, lo, hi
+
+    def page(self, cursor: str = None, limit: int = 1000, hospital: str = None):
+        """Return (names, next_cursor); next_cursor is None on the last page."""
+        names, lo, hi = self._range(cursor, hospital)
+        items = names[lo:min(hi, lo + limit)]
+        more = lo + limit < hi
+        return items, (encode_cursor(items[-1]) if more and items else None)
+
+    def iter(self, cursor: str = None, hospital: str = None, chunk: int = 1000):
+        """
+        Chunks of names from the cursor to the end of the range.
+        The range is resolved eagerly, so a bad cursor raises ValueError
+        here and not after a streaming response has started.
+        """
+        names, lo, hi = self._range(cursor, hospital)
+        return (names[start:min(hi, start + chunk)] for start in range(lo, hi, chunk))
+
+
+class ETagCache:
+    def __init__(self, max_entries: int = ETAG_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # path → (mtime_ns, size, etag)
+        self._lock = threading.Lock()
+
+    def etag(self, path: str, st: os.stat_result) -> str:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[:2] == (st.st_mtime_ns, st.st_size):
+                self._entries.move_to_end(path)
+                return entry[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        etag = f'"{digest.hexdigest()}"'
+
+        with self._lock:
+            self._entries[path] = (st.st_mtime_ns, st.st_size, etag)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
@@ -1,5 +1,5 @@
 import os
-import requests
+import httpx
 
 # -------------------------------------------------
 # CyborgDB Service URL
@@ -7,19 +7,67 @@ import requests
 # -------------------------------------------------
 CYBORGDB_URL = os.getenv("CYBORGDB_URL", "http://cyborgdb:7700")
 
+# -------------------------------------------------
+# Connection pool (shared keep-alive, async)
+# -------------------------------------------------
+CYBORGDB_POOL_SIZE = int(os.getenv("CYBORGDB_POOL_SIZE", "100"))
+CYBORGDB_KEEPALIVE = int(os.getenv("CYBORGDB_KEEPALIVE", "20"))
+CYBORGDB_TIMEOUT = float(os.getenv("CYBORGDB_TIMEOUT", "5"))
+CYBORGDB_CONNECT_TIMEOUT = float(os.getenv("CYBORGDB_CONNECT_TIMEOUT", "2"))
+CYBORGDB_BATCH_TIMEOUT = float(os.getenv("CYBORGDB_BATCH_TIMEOUT", "60"))
+
+_client: httpx.AsyncClient = None
+
+
+async def open_client():
+    """Create the shared pool (called from the app lifespan)."""
+    global _client
+    _client = httpx.AsyncClient(
+        base_url=CYBORGDB_URL,
+        limits=httpx.Limits(
+            max_connections=CYBORGDB_POOL_SIZE,
+            max_keepalive_connections=CYBORGDB_KEEPALIVE,
+        ),
+        timeout=httpx.Timeout(CYBORGDB_TIMEOUT, connect=CYBORGDB_CONNECT_TIMEOUT),
+    )
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
-def insert_vector(hospital: str, case_id: str, enc_blob: dict):
+
+def get_client() -> httpx.AsyncClient:
+    if _client is None:
+        raise RuntimeError("CyborgDB client not started (app lifespan not running)")
+    return _client
+
+
+def _blob_tags(enc_blob: dict) -> dict:
+    """Opaque fields the client needs to decrypt later (never key material)."""
+    return {k: enc_blob[k] for k in ("encoding", "kid") if enc_blob.get(k)}
+
+
+async def insert_vector(hospital: str, case_id: str, enc_blob: dict, search_vector: list = None):
     """
     Insert an encrypted vector into CyborgDB.
 
     CyborgDB INSERT EXPECTS (STRICT):
     {
-        index: str,     # hospital name (federation boundary)
-        id: str,        # case identifier
-        vector: str,    # encrypted vector (ciphertext)
-        nonce: str      # AES-GCM nonce
+        index: str,         # hospital name (federation boundary)
+        id: str,            # case identifier
+        vector: str,        # encrypted vector (ciphertext)
+        nonce: str,         # AES-GCM nonce
+        encoding: str,      # OPTIONAL wire encoding of vector/nonce
+        kid: str,           # OPTIONAL data key id (hospital-side HKDF)
+        embedding: list     # OPTIONAL keyed-transformed vector
     }
 
+    The keyed-transformed vector is produced inside the hospital
+    (secret rotation + noise) and is NOT a plaintext embedding.
+
     SECURITY GUARANTEES:
     - Ciphertext is NEVER decrypted
     - CyborgDB sees encrypted data only
@@ -31,19 +79,70 @@ def insert_vector(hospital: str, case_id: str, enc_blob: dict):
         "id": case_id,
         "vector": enc_blob["ciphertext"],  # ciphertext as opaque vector
         "nonce": enc_blob["nonce"],
+        **_blob_tags(enc_blob),
     }
 
-    response = requests.post(
-        f"{CYBORGDB_URL}/insert",
+    if search_vector is not None:
+        payload["embedding"] = search_vector
+
+    response = await get_client().post("/insert", json=payload)
+
+    response.raise_for_status()
+    return response.json()
+
+
+async def insert_vectors_batch(hospital: str, records: list):
+    """
+    Insert many encrypted vectors into CyborgDB in ONE request.
+
+    records: [{ case_id, enc_blob, search_vector?, if_row? }, ...]
+
+    CyborgDB commits the whole batch with a single storage write and
+    returns a per-record status.
+    """
+
+    payload = {
+        "index": hospital,
+        "records": [
+            {
+                "id": r["case_id"],
+                "vector": r["enc_blob"]["ciphertext"],
+                "nonce": r["enc_blob"]["nonce"],
+                **_blob_tags(r["enc_blob"]),
+                **({"embedding": r["search_vector"]} if r.get("search_vector") is not None else {}),
+                **({"if_row": r["if_row"]} if r.get("if_row") is not None else {}),
+            }
+            for r in records
+        ],
+    }
+
+    response = await get_client().post(
+        "/insert_batch",
         json=payload,
-        timeout=5,
+        timeout=CYBORGDB_BATCH_TIMEOUT,
+    )
+
+    response.raise_for_status()
+    return response.json()
+
+
+async def delete_vectors_batch(hospital: str, case_ids: list):
+    """
+    Delete many case ids from a hospital index in ONE request.
+    CyborgDB appends tombstones with a single storage write.
+    """
+
+    response = await get_client().post(
+        "/delete_batch",
+        json={"index": hospital, "ids": case_ids},
+        timeout=CYBORGDB_BATCH_TIMEOUT,
     )
 
     response.raise_for_status()
     return response.json()
 
 
-def search_vectors(hospital: str, enc_query: dict, top_k: int = 5):
+async def search_vectors(hospital: str, enc_query: dict, top_k: int = 5, ef_search: int = None, nprobe: int = None):
     """
     Search encrypted vectors in CyborgDB.
 
@@ -52,12 +151,17 @@ def search_vectors(hospital: str, enc_query: dict, top_k: int = 5):
         index: str,     # hospital name
         vector: str,    # encrypted query vector (ciphertext)
         nonce: str,     # AES-GCM nonce
-        top_k: int
+        top_k: int,
+        embedding: list, # OPTIONAL keyed-transformed query
+        ef_search: int,  # OPTIONAL HNSW recall/latency knob
+        nprobe: int      # OPTIONAL IVF recall/latency knob
     }
 
     ENCRYPTION-IN → ENCRYPTION-OUT
     - No plaintext ever exposed
     - Results are ciphertext references only
+    - With a keyed-transformed query, CyborgDB ranks by true
+      inner product in the transformed space
     """
 
     payload = {
@@ -67,11 +171,60 @@ def search_vectors(hospital: str, enc_query: dict, top_k: int = 5):
         "top_k": top_k,
     }
 
-    response = requests.post(
-        f"{CYBORGDB_URL}/search",
-        json=payload,
-        timeout=5,
-    )
+    if enc_query.get("search_vector") is not None:
+        payload["embedding"] = enc_query["search_vector"]
+    if ef_search is not None:
+        payload["ef_search"] = ef_search
+    if nprobe is not None:
+        payload["nprobe"] = nprobe
+
+    response = await get_client().post("/search", json=payload)
 
     response.raise_for_status()
-    return response.json()
\ No newline at end of file
+    return response.json()
+
+
+async def scan_records(hospital: str, cursor: int = 0, end: int = None, limit: int = 1000):
+    """
+    One page of a hospital index's stored ciphertexts (storage order).
+
+    Returned in the proxy's vocabulary:
+    { records: [{ case_id, enc_blob, has_search_vector, row }], next_cursor, end }
+    """
+
+    params = {"index": hospital, "cursor": cursor, "limit": limit}
+    if end is not None:
+        params["end"] = end
+
+    response = await get_client().get("/scan", params=params, timeout=CYBORGDB_BATCH_TIMEOUT)
+
+    if response.status_code == 404:
+        # index never written → nothing stored
+        return {"records": [], "next_cursor": None, "end": 0}
+
+    response.raise_for_status()
+    page = response.json()
+
+    records = []
+    for r in page["records"]:
+        enc_blob = {"nonce": r["nonce"], "ciphertext": r["vector"]}
+        enc_blob.update(_blob_tags(r))
+        records.append({
+            "case_id": r["id"],
+            "enc_blob": enc_blob,
+            "has_search_vector": r.get("has_embedding", False),
+            "row": r.get("row"),
+        })
+
+    return {"records": records, "next_cursor": page["next_cursor"], "end": page["end"]}
+
+
+async def list_indexes():
+    """
+    List hospital indexes known to CyborgDB (federation members).
+    """
+
+    response = await get_client().get("/indexes")
+
+    response.raise_for_status()
+    return response.json()
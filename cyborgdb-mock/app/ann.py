@@ -0,0 +1,557 @@
+import os
+import json
+import math
+import heapq
+import threading
+import numpy as np
+
+from .pq import DEFAULT_PQ_M, PQStorage, parse_flag
+
+"""
+Approximate Nearest-Neighbour Indexes
+-------------------------------------
+Pluggable per-index search structures over a VectorStore:
+
+ - flat  → exact blocked scan (VectorStore.search)
+ - ivf   → coarse k-means centroids + inverted lists   (knob: nprobe)
+ - hnsw  → hierarchical navigable small-world graph    (knob: ef_search)
+
+All indexes rank by inner product over keyed-transformed vectors and
+support incremental add().  State is persisted next to the store:
+
+ - ivf   → ivf_centroids.npy (nlist x dim, once, at training) +
+           ivf_assign.bin (append-only list id per row); state built
+           for another nlist or dim is discarded and retrained on open
+ - hnsw  → hnsw.npz snapshot every `persist_every` inserts and on
+           shutdown; rows appended after the snapshot are re-inserted
+           on open, so a restart never rebuilds from scratch.
+
+Storage modes:
+ - float → score the float matrix directly
+ - pq    → product-quantized codes (flat + ivf only, see pq.py)
+
+Environment variables:
+ - ANN_INDEX  = default kind for new indexes (default "flat")
+"""
+
+ANN_INDEX = os.getenv("ANN_INDEX", "flat")
+
+CONFIG_FILE = "index.json"
+
+
+class FlatIndex:
+    kind = "flat"
+
+    def __init__(self, store, params: dict, codec: PQStorage = None):
+        self.store = store
+        self.params = params
+        self.codec = codec
+
+    def add(self, rows: list):
+        if self.codec is not None:
+            self.codec.add(rows)
+
+    def search(self, query, top_k: int, ef_search: int = None, nprobe: int = None):
+        if self.codec is not None and self.codec.trained:
+            return self.codec.search(query, top_k)
+        return self.store.search(query, top_k)
+
+    def save(self):
+        codec_wait(self.codec)
+
+    def stats(self) -> dict:
+        return {"kind": self.kind, **codec_stats(self.codec)}
+
+
+def codec_stats(codec) -> dict:
+    return codec.stats() if codec is not None else {"storage": "float"}
+
+
+def codec_wait(codec):
+    # a background PQ training must not outlive its index (reconfigure, shutdown)
+    if codec is not None:
+        codec.wait()
+
+
+# -------------------------------------------------
+# IVF (inverted file)
+# -------------------------------------------------
+def kmeans(data: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (inner product assignment)."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        for c in range(k):
+            members = data[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                centroids[c] = data[rng.integers(len(data))]
+        # spherical: centroids live on the unit sphere like the data
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+class IVFIndex:
+    kind = "ivf"
+
+    def __init__(self, store, params: dict, codec: PQStorage = None):
+        self.store = store
+        self.params = params
+        self.codec = codec
+        self.nlist = int(params.get("nlist", 64))
+        self.nprobe = int(params.get("nprobe", 8))
+        self.train_size = int(params.get("train_size", self.nlist * 32))
+
+        self._lock = threading.Lock()
+        self._centroids_path = os.path.join(store.path, "ivf_centroids.npy")
+        self._assign_path = os.path.join(store.path, "ivf_assign.bin")
+        self.centroids = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists = []
+
+        if os.path.exists(self._centroids_path):
+            self._load()
+
+        self.add(list(range(len(self._assign), store.rows)))
+
+    def _load(self):
+        centroids = np.load(self._centroids_path)
+        assign = np.fromfile(self._assign_path, dtype=np.int32) if os.path.exists(self._assign_path) else self._assign
+        assign = assign[: self.store.rows]
+
+        # trained for another nlist / dim (index reconfigured) → retrain
+        if centroids.shape != (self.nlist, self.store.dim) or (len(assign) and int(assign.max()) >= self.nlist):
+            for path in (self._centroids_path, self._assign_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+
+        self.centroids = centroids
+        self._set_assign(assign)
+        with open(self._assign_path, "wb") as f:
+            f.write(assign.tobytes())
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _set_assign(self, assign: np.ndarray):
+        self._lists = self._build_lists(assign)
+        self._assign = assign
+
+    def _build_lists(self, assign: np.ndarray) -> list:
+        lists = [[] for _ in range(self.nlist)]
+        self._extend_lists(lists, 0, assign)
+        return lists
+
+    @staticmethod
+    def _extend_lists(lists: list, base: int, assign: np.ndarray):
+        for offset, c in enumerate(assign.tolist()):
+            lists[c].append(base + offset)
+
+    def _assign_rows(self, rows: np.ndarray, centroids: np.ndarray = None) -> np.ndarray:
+        centroids = self.centroids if centroids is None else centroids
+        vectors = np.asarray(self.store.matrix()[rows], dtype=np.float32)
+        return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+    def train(self):
+        """
+        Train centroids on the current rows and assign all of them.
+        Caller holds self._lock; centroids, assignments and lists are
+        built aside and published together so search() never sees a
+        trained index without its lists.
+        """
+        matrix = self.store.matrix()
+        live = np.flatnonzero(self.store.live_mask()[: matrix.shape[0]])
+        sample = live[: max(self.train_size, self.nlist)]
+        data = np.asarray(matrix[sample], dtype=np.float32)
+
+        centroids = kmeans(data, self.nlist)
+        assign = self._assign_rows(np.arange(matrix.shape[0]), centroids)
+        lists = self._build_lists(assign)
+
+        np.save(self._centroids_path, centroids)
+        with open(self._assign_path, "wb") as f:
+            f.write(assign.tobytes())
+        self.centroids, self._assign, self._lists = centroids, assign, lists
+
+    def add(self, rows: list):
+        if not rows:
+            return
+        if self.codec is not None:
+            self.codec.add(rows)
+        with self._lock:
+            if not self.trained:
+                if int(self.store.live_mask().sum()) >= max(self.train_size, self.nlist):
+                    self.train()
+                return
+
+            # concurrent requests may call add() out of order → catch up
+            # on every row up to the newest one instead of trusting `rows`
+            start, end = len(self._assign), min(max(rows) + 1, self.store.rows)
+            if start >= end:
+                return
+            assign = self._assign_rows(np.arange(start, end))
+            with open(self._assign_path, "ab") as f:
+                f.write(assign.tobytes())
+            self._extend_lists(self._lists, start, assign)
+            self._assign = np.concatenate([self._assign, assign])
+
+    def search(self, query, top_k: int, ef_search: int = None, nprobe: int = None):
+        if not self.trained:
+            return self.store.search(query, top_k)
+
+        q = np.asarray(query, dtype=np.float32)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+
+        # add() appends to the lists in place → gather candidates under its lock
+        with self._lock:
+            probe = np.argsort(-(self.centroids @ q))[:nprobe]
+            candidates = np.fromiter(
+                (row for c in probe for row in self._lists[c]), dtype=np.int64
+            )
+            covered = len(self._assign)
+
+        # rows appended after the last add() are scanned exactly
+        tail = np.arange(covered, self.store.rows)
+        candidates = np.concatenate([candidates, tail]).astype(np.int64)
+
+        if self.codec is not None and self.codec.trained:
+            return self.codec.search(q, top_k, candidates=candidates)
+        return score_candidates(self.store, q, candidates, top_k)
+
+    def save(self):
+        codec_wait(self.codec)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "trained": self.trained,
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            **codec_stats(self.codec),
+        }
+
+
+def score_candidates(store, q: np.ndarray, candidates: np.ndarray, top_k: int):
+    """Exact inner product over a candidate row set → [(row, score)]."""
+    live = store.live_mask()
+    candidates = candidates[live[candidates]]
+    if len(candidates) == 0 or top_k <= 0:
+        return []
+
+    candidates = np.sort(candidates)
+    scores = np.asarray(store.matrix()[candidates], dtype=np.float32) @ q
+    k = min(top_k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(candidates[i]), float(scores[i])) for i in top]
+
+
+# -------------------------------------------------
+# HNSW (hierarchical navigable small world)
+# -------------------------------------------------
+class HNSWIndex:
+    kind = "hnsw"
+
+    def __init__(self, store, params: dict, codec: PQStorage = None):
+        # graph traversal needs random row access → always float storage
+        self.store = store
+        self.params = params
+        self.M = int(params.get("M", 16))
+        self.M0 = 2 * self.M
+        self.ef_construction = int(params.get("ef_construction", 100))
+        self.ef_search = int(params.get("ef_search", 50))
+        self.persist_every = int(params.get("persist_every", 1000))
+        self._mL = 1.0 / math.log(self.M)
+        self._rng = np.random.default_rng()
+
+        self._lock = threading.Lock()
+        self._path = os.path.join(store.path, "hnsw.npz")
+
+        self.count = 0               # rows covered by the graph
+        self.levels = {}             # row → top level
+        self.links = []              # level → { row: [neighbour rows] }
+        self.entry = None
+        self.max_level = -1
+        self._dirty = 0
+
+        if os.path.exists(self._path):
+            self._load()
+
+        self.add(list(range(self.count, store.rows)))
+
+    # ---------- persistence ----------
+    def _load(self):
+        snap = np.load(self._path)
+        self.count = min(int(snap["count"]), self.store.rows)
+        self.entry = int(snap["entry"]) if int(snap["entry"]) >= 0 else None
+        self.max_level = int(snap["max_level"])
+        nodes, node_levels = snap["nodes"], snap["node_levels"]
+        self.levels = {int(n): int(l) for n, l in zip(nodes, node_levels) if n < self.count}
+        self.links = []
+        for level in range(self.max_level + 1):
+            lnodes, adj = snap[f"nodes_{level}"], snap[f"adj_{level}"]
+            self.links.append({
+                int(n): [int(x) for x in row if 0 <= x < self.count]
+                for n, row in zip(lnodes, adj)
+                if n < self.count
+            })
+        if self.entry is not None and self.entry >= self.count:
+            self.entry = max(self.levels, key=self.levels.get) if self.levels else None
+            self.max_level = self.levels[self.entry] if self.entry is not None else -1
+
+    def save(self):
+        with self._lock:
+            arrays = {
+                "count": np.int64(self.count),
+                "entry": np.int64(-1 if self.entry is None else self.entry),
+                "max_level": np.int64(self.max_level),
+                "nodes": np.fromiter(self.levels.keys(), dtype=np.int64, count=len(self.levels)),
+                "node_levels": np.fromiter(self.levels.values(), dtype=np.int64, count=len(self.levels)),
+            }
+            for level, graph in enumerate(self.links):
+                width = self.M0 if level == 0 else self.M
+                adj = np.full((len(graph), width), -1, dtype=np.int64)
+                for i, nbrs in enumerate(graph.values()):
+                    adj[i, : len(nbrs)] = nbrs[:width]
+                arrays[f"nodes_{level}"] = np.fromiter(graph.keys(), dtype=np.int64, count=len(graph))
+                arrays[f"adj_{level}"] = adj
+
+            tmp = self._path + ".tmp.npz"
+            np.savez(tmp, **arrays)
+            os.replace(tmp, self._path)
+            self._dirty = 0
+
+    # ---------- graph primitives ----------
+    def _scores(self, q: np.ndarray, rows: list) -> np.ndarray:
+        return np.asarray(self.store.matrix()[rows], dtype=np.float32) @ q
+
+    def _search_layer(self, q: np.ndarray, entry_points: list, ef: int, level: int):
+        """Best-first search on one layer → [(score, row)] best ef."""
+        graph = self.links[level]
+        visited = set(entry_points)
+        scores = self._scores(q, entry_points)
+
+        candidates = [(-s, r) for s, r in zip(scores.tolist(), entry_points)]
+        heapq.heapify(candidates)
+        results = [(s, r) for s, r in zip(scores.tolist(), entry_points)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg, row = heapq.heappop(candidates)
+            if -neg < results[0][0] and len(results) >= ef:
+                break
+
+            fresh = [n for n in graph.get(row, ()) if n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+
+            for s, n in zip(self._scores(q, fresh).tolist(), fresh):
+                if len(results) < ef or s > results[0][0]:
+                    heapq.heappush(candidates, (-s, n))
+                    heapq.heappush(results, (s, n))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return sorted(results, reverse=True)
+
+    def _select(self, scores: list, rows: list, width: int) -> list:
+        """
+        Neighbour selection heuristic: keep a candidate only if it is closer
+        to the base node than to any neighbour already kept, so clusters
+        stay connected.  Pruned candidates back-fill up to `width`.
+        """
+        order = np.argsort(-np.asarray(scores))
+        rows = [rows[i] for i in order]
+        scores = [scores[i] for i in order]
+        vectors = np.asarray(self.store.matrix()[rows], dtype=np.float32)
+        pairwise = vectors @ vectors.T
+
+        selected, pruned = [], []
+        for i in range(len(rows)):
+            if len(selected) >= width:
+                break
+            if all(scores[i] > pairwise[i, j] for j in selected):
+                selected.append(i)
+            else:
+                pruned.append(i)
+        selected += pruned[: width - len(selected)]
+        return [rows[i] for i in selected]
+
+    def _prune(self, row: int, level: int):
+        width = self.M0 if level == 0 else self.M
+        nbrs = self.links[level][row]
+        if len(nbrs) <= width:
+            return
+        vec = np.asarray(self.store.matrix()[row], dtype=np.float32)
+        scores = self._scores(vec, nbrs).tolist()
+        self.links[level][row] = self._select(scores, nbrs, width)
+
+    def _insert(self, row: int):
+        q = np.asarray(self.store.matrix()[row], dtype=np.float32)
+        level = int(-math.log(1.0 - self._rng.random()) * self._mL)
+        self.levels[row] = level
+        while len(self.links) <= level:
+            self.links.append({})
+
+        if self.entry is None:
+            for l in range(level + 1):
+                self.links[l][row] = []
+            self.entry, self.max_level = row, level
+            return
+
+        ep = [self.entry]
+        for l in range(self.max_level, level, -1):
+            ep = [self._search_layer(q, ep, 1, l)[0][1]]
+
+        for l in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(q, ep, self.ef_construction, l)
+            width = self.M0 if l == 0 else self.M
+            nbrs = self._select([sc for sc, _ in found], [r for _, r in found], width)
+            self.links[l][row] = nbrs
+            for n in nbrs:
+                self.links[l].setdefault(n, []).append(row)
+                self._prune(n, l)
+            ep = [r for _, r in found]
+
+        for l in range(self.max_level + 1, level + 1):
+            self.links[l][row] = []
+
+        if level > self.max_level:
+            self.entry, self.max_level = row, level
+
+    # ---------- public API ----------
+    def add(self, rows: list):
+        if not rows:
+            return
+        with self._lock:
+            # concurrent requests may call add() out of order → catch up
+            # on every row up to the newest one instead of trusting `rows`
+            for row in range(self.count, min(max(rows) + 1, self.store.rows)):
+                # rows without a vector are skipped; superseded rows are
+                # still linked so the graph stays navigable
+                if self.store.has_vector(row):
+                    self._insert(row)
+                self.count = row + 1
+                self._dirty += 1
+
+        if self._dirty >= self.persist_every:
+            self.save()
+
+    def search(self, query, top_k: int, ef_search: int = None, nprobe: int = None):
+        q = np.asarray(query, dtype=np.float32)
+        ef = max(ef_search or self.ef_search, top_k)
+
+        # add() mutates the adjacency lists in place → traverse under its lock
+        with self._lock:
+            if self.entry is None:
+                return self.store.search(q, top_k)
+            ep = [self.entry]
+            for l in range(self.max_level, 0, -1):
+                ep = [self._search_layer(q, ep, 1, l)[0][1]]
+            found = self._search_layer(q, ep, ef, 0)
+            count = self.count
+
+        candidates = np.asarray([r for _, r in found], dtype=np.int64)
+        # rows appended after the graph's last add() are scanned exactly
+        tail = np.arange(count, self.store.rows)
+        candidates = np.concatenate([candidates, tail]).astype(np.int64)
+        return score_candidates(self.store, q, candidates, top_k)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "nodes": len(self.levels),
+            "max_level": self.max_level,
+            "M": self.M,
+            "ef_search": self.ef_search,
+            "storage": "float",
+        }
+
+
+INDEX_KINDS = {
+    FlatIndex.kind: FlatIndex,
+    IVFIndex.kind: IVFIndex,
+    HNSWIndex.kind: HNSWIndex,
+}
+
+
+# integer params and their minimum value (unknown params are ignored)
+_INT_PARAMS = {
+    "nlist": 1, "nprobe": 1, "train_size": 1,
+    "M": 2, "ef_construction": 1, "ef_search": 1, "persist_every": 1,
+    "pq_m": 1, "pq_train_size": 1, "shortlist_factor": 1,
+}
+
+
+def check_config(kind: str, params: dict, storage: str = "float", dim: int = None):
+    """Raise ValueError for a config that could not be opened."""
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"unknown index kind '{kind}'")
+    if storage not in ("float", "pq"):
+        raise ValueError(f"unknown storage mode '{storage}'")
+    if storage == "pq" and kind == HNSWIndex.kind:
+        raise ValueError("pq storage supports flat and ivf indexes only")
+
+    for name, minimum in _INT_PARAMS.items():
+        if name not in params:
+            continue
+        try:
+            value = int(params[name])
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be an integer")
+        if value < minimum:
+            raise ValueError(f"{name} must be >= {minimum}")
+
+    if "rescore" in params:
+        parse_flag(params["rescore"], "rescore")
+
+    if "recall_target" in params:
+        try:
+            target = float(params["recall_target"])
+        except (TypeError, ValueError):
+            raise ValueError("recall_target must be a number")
+        if not 0.0 < target <= 1.0:
+            raise ValueError("recall_target must be in (0, 1]")
+
+    if storage == "pq" and dim is not None:
+        m = int(params.get("pq_m", DEFAULT_PQ_M))
+        if m > dim or dim % m != 0:
+            raise ValueError(f"pq_m={m} must divide dim={dim}")
+
+
+def load_config(path: str) -> dict:
+    config_path = os.path.join(path, CONFIG_FILE)
+    if os.path.exists(config_path):
+        with open(config_path, "r") as f:
+            return json.load(f)
+    return {"kind": ANN_INDEX, "storage": "float", "params": {}}
+
+
+def save_config(path: str, kind: str, params: dict, storage: str = "float"):
+    check_config(kind, params, storage)
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, CONFIG_FILE), "w") as f:
+        json.dump({"kind": kind, "storage": storage, "params": params}, f)
+
+
+def open_index(store, config: dict = None):
+    """
+    Build the configured ANN index for a store (catching up on new rows).
+    `config` overrides the saved index.json (used to try a new config
+    before saving it).
+    """
+    config = config or load_config(store.path)
+    kind = config.get("kind", ANN_INDEX)
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"unknown index kind '{kind}'")
+
+    params = config.get("params", {})
+    codec = PQStorage(store, params) if config.get("storage") == "pq" else None
+    return INDEX_KINDS[kind](store, params, codec=codec)
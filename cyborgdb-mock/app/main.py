@@ -1,19 +1,56 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import Dict, List
-import os, json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+import os, threading
+
+from .store import VectorStore
+from .ann import check_config, open_index, save_config
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # persist ANN state so restarts do not rebuild from scratch
+    for ann in list(_anns.values()):
+        ann.save()
+
 
 app = FastAPI(
     title="CyborgDB Mock (Encrypted Vectors Only)",
-    description="Mock encrypted-in-use vector database (no plaintext, no decryption)"
+    description="Mock encrypted-in-use vector database (no plaintext, no decryption)",
+    lifespan=lifespan,
 )
 
 # -------------------------------------------------
 # Storage
 # -------------------------------------------------
-DATA_DIR = "/data"
+DATA_DIR = os.getenv("DATA_DIR", "/data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# index name → open VectorStore / ANN index (opened once, kept for process lifetime)
+_stores: Dict[str, VectorStore] = {}
+_anns: Dict[str, object] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(index: str, create: bool = False):
+    store = _stores.get(index)
+    if store is not None:
+        return store
+
+    path = os.path.join(DATA_DIR, index)
+    if not create and not os.path.isdir(path):
+        return None
+
+    with _stores_lock:
+        store = _stores.get(index)
+        if store is None:
+            store = VectorStore(path)
+            _anns[index] = open_index(store)
+            _stores[index] = store
+    return store
+
 # -------------------------------------------------
 # Models (MATCH cyborg-proxy client)
 # -------------------------------------------------
@@ -22,12 +59,41 @@ class InsertRequest(BaseModel):
     id: str                 # case id
     vector: str             # ciphertext
     nonce: str              # AES-GCM nonce
+    encoding: Optional[str] = None            # wire encoding of vector/nonce
+    kid: Optional[str] = None                 # hospital data key id (opaque)
+    embedding: Optional[List[float]] = None   # keyed-transformed vector
+
+class BatchRecord(BaseModel):
+    id: str                 # case id
+    vector: str             # ciphertext
+    nonce: str              # AES-GCM nonce
+    encoding: Optional[str] = None            # wire encoding of vector/nonce
+    kid: Optional[str] = None                 # hospital data key id (opaque)
+    embedding: Optional[List[float]] = None   # keyed-transformed vector
+    if_row: Optional[int] = None              # write only if id still lives at this row
+
+class BatchInsertRequest(BaseModel):
+    index: str              # hospital name (federation)
+    records: List[BatchRecord]
+
+class DeleteBatchRequest(BaseModel):
+    index: str              # hospital name (federation)
+    ids: List[str]          # case ids to delete
 
 class SearchRequest(BaseModel):
     index: str              # hospital name
     vector: str             # encrypted query ciphertext
     nonce: str              # nonce
     top_k: int = 5
+    embedding: Optional[List[float]] = None   # keyed-transformed query
+    ef_search: Optional[int] = None           # HNSW recall/latency knob
+    nprobe: Optional[int] = None              # IVF recall/latency knob
+
+class IndexConfigRequest(BaseModel):
+    index: str              # hospital name
+    kind: str = "flat"      # flat | ivf | hnsw
+    storage: str = "float"  # float | pq (product-quantized codes)
+    params: dict = Field(default_factory=dict)
 
 # -------------------------------------------------
 # Health
@@ -40,6 +106,62 @@ def health():
         "mode": "encrypted-only"
     }
 
+# -------------------------------------------------
+# Index listing (federation members)
+# -------------------------------------------------
+@app.get("/indexes")
+def list_indexes():
+    """List hospital indexes present in storage."""
+    return sorted(
+        name for name in os.listdir(DATA_DIR)
+        if os.path.isdir(os.path.join(DATA_DIR, name))
+    )
+
+@app.get("/indexes/{index}")
+def index_stats(index: str):
+    """ANN state of one index (e.g. whether PQ training has finished)."""
+    if get_store(index) is None:
+        raise HTTPException(status_code=404, detail=f"unknown index '{index}'")
+    return {"index": index, **_anns[index].stats()}
+
+# -------------------------------------------------
+# Index configuration (ANN kind per hospital)
+# -------------------------------------------------
+@app.post("/indexes")
+def configure_index(req: IndexConfigRequest):
+    """
+    Select the ANN structure for an index.
+    Existing rows are indexed immediately (PQ codebooks train in the
+    background, see GET /indexes/{index}); later inserts are incremental.
+    Invalid params are a 400 and leave the previous config in place.
+    """
+    store = get_store(req.index, create=True)
+    config = {"kind": req.kind, "storage": req.storage, "params": req.params}
+
+    # validate + open BEFORE saving: a bad config never reaches index.json
+    try:
+        check_config(req.kind, req.params, req.storage, dim=store.dim)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    old = _anns.get(req.index)
+    if old is not None:
+        old.save()
+
+    try:
+        ann = open_index(store, config)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"cannot open index: {e}")
+
+    save_config(store.path, req.kind, req.params, storage=req.storage)
+    _anns[req.index] = ann
+
+    return {
+        "status": "configured",
+        "index": req.index,
+        **_anns[req.index].stats(),
+    }
+
 # -------------------------------------------------
 # Insert (ciphertext only)
 # -------------------------------------------------
@@ -49,13 +171,14 @@ def insert(req: InsertRequest):
     Store encrypted vector.
     Ciphertext is never decrypted.
     """
-    hospital_dir = os.path.join(DATA_DIR, req.index)
-    os.makedirs(hospital_dir, exist_ok=True)
+    store = get_store(req.index, create=True)
 
-    path = os.path.join(hospital_dir, f"{req.id}.json")
+    try:
+        rows = store.append([req.dict(exclude_none=True)])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    with open(path, "w") as f:
-        json.dump(req.dict(), f)
+    _anns[req.index].add(rows)
 
     return {
         "status": "stored",
@@ -63,28 +186,146 @@ def insert(req: InsertRequest):
         "id": req.id
     }
 
+# -------------------------------------------------
+# Batch insert (single commit)
+# -------------------------------------------------
+@app.post("/insert_batch")
+def insert_batch(req: BatchInsertRequest):
+    """
+    Store many encrypted vectors with ONE write per storage file and one
+    commit (see store.py for the sync points).
+    Invalid records are rejected individually; valid ones commit together.
+    Records with `if_row` (from /scan) are only written if their id still
+    lives at that row; otherwise they are reported as "superseded".
+    """
+    store = get_store(req.index, create=True)
+
+    accepted, results = [], []
+    for rec in req.records:
+        record = rec.dict(exclude_none=True)
+        record["index"] = req.index
+        try:
+            store.validate(record)
+        except ValueError as e:
+            results.append({"id": rec.id, "status": "rejected", "error": str(e)})
+            continue
+        accepted.append((len(results), record))
+        results.append({"id": rec.id, "status": "stored"})
+
+    superseded = []
+    if accepted:
+        rows, superseded = store.append_current([record for _, record in accepted])
+        _anns[req.index].add(rows)
+        for i in superseded:
+            results[accepted[i][0]]["status"] = "superseded"
+
+    return {
+        "index": req.index,
+        "stored": len(accepted) - len(superseded),
+        "rejected": len(results) - len(accepted),
+        "superseded": len(superseded),
+        "results": results,
+    }
+
+# -------------------------------------------------
+# Batch delete (tombstones, single commit)
+# -------------------------------------------------
+@app.post("/delete_batch")
+def delete_batch(req: DeleteBatchRequest):
+    """
+    Delete many ids with ONE storage write (tombstone rows).
+    Unknown ids are reported, not treated as errors.
+    """
+    store = get_store(req.index)
+
+    if store is None:
+        return {"index": req.index, "deleted": 0, "missing": list(dict.fromkeys(req.ids))}
+
+    rows, missing = store.delete(req.ids)
+    _anns[req.index].add(rows)
+
+    return {
+        "index": req.index,
+        "deleted": len(rows),
+        "missing": missing,
+    }
+
+# -------------------------------------------------
+# Scan (ciphertext-out, for hospital-side key rotation)
+# -------------------------------------------------
+@app.get("/scan")
+def scan(
+    index: str,
+    cursor: int = Query(0, ge=0),
+    end: Optional[int] = Query(None, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Stream an index's current records in storage order, page by page.
+
+    The first call (no `end`) snapshots the row count; pass `end` back
+    with each `next_cursor` so records re-inserted during the scan
+    (e.g. re-encrypted ones) are not returned again.
+    """
+    store = get_store(index)
+
+    if store is None:
+        raise HTTPException(status_code=404, detail=f"unknown index '{index}'")
+
+    if end is None:
+        end = store.rows
+
+    records, next_row = store.scan(cursor, limit, end)
+
+    return {
+        "index": index,
+        "records": records,
+        "next_cursor": next_row,
+        "end": end,
+    }
+
 # -------------------------------------------------
 # Search (ciphertext-in → ciphertext-out)
 # -------------------------------------------------
 @app.post("/search")
 def search(req: SearchRequest):
     """
-    Encrypted search mock.
-    Does NOT decrypt or compare vectors.
+    Encrypted search.
+    Ciphertext is NEVER decrypted.
+
+    - embedding given → true top-k inner product over keyed-transformed
+                         vectors (hospital-side secret rotation + noise)
+    - no embedding    → legacy mock ranking
     """
-    hospital_dir = os.path.join(DATA_DIR, req.index)
+    store = get_store(req.index)
 
-    if not os.path.exists(hospital_dir):
+    if store is None:
         return []
 
-    files = sorted(os.listdir(hospital_dir))[: req.top_k]
+    if req.embedding is not None:
+        try:
+            hits = _anns[req.index].search(
+                req.embedding,
+                req.top_k,
+                ef_search=req.ef_search,
+                nprobe=req.nprobe,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return [
+            {"id": store.row_id(row), "score": round(score, 4)}
+            for row, score in hits
+        ]
+
+    ids = store.ids()[: req.top_k]
 
     # Return mock ranked results
     results = []
-    for i, fname in enumerate(files):
+    for i, case_id in enumerate(ids):
         results.append({
-            "id": fname.replace(".json", ""),
+            "id": case_id,
             "score": round(1.0 - (i * 0.05), 3)
         })
 
-    return results
\ No newline at end of file
+    return results
@@ -0,0 +1,321 @@
+import os
+import threading
+import numpy as np
+
+"""
+Product Quantization (PQ) Storage
+---------------------------------
+Compressed storage mode for keyed-transformed vectors:
+
+ - dim is split into `m` sub-spaces, each with a 256-entry codebook
+ - every vector becomes `m` uint8 codes  (384-dim float32 → m bytes,
+   m=48 → 32x smaller, m=96 → 16x smaller)
+ - queries are scored with asymmetric distance tables (ADC):
+   one (m x 256) table of sub-space inner products per query
+
+Optional exact re-scoring: the best `shortlist_factor * top_k` ADC
+hits are re-scored against the float matrix, which stays on disk
+(memory-mapped) and is only touched for the shortlist.
+
+`recall_target` calibrates the shortlist factor after training: the
+smallest factor whose recall@10 on a held-out sample meets the target.
+
+Training (k-means + calibration) runs on a background thread once
+`pq_train_size` live rows exist, so the insert or /indexes request that
+crosses the threshold does not wait for it; rows are scored exactly
+until the codebooks are published, then encoded incrementally.
+
+Files (next to the VectorStore):
+ - pq_codebooks.npz  → m + codebooks + calibrated shortlist factor
+ - pq_codes.bin      → append-only (rows x m) uint8 codes
+A snapshot trained for another `m` is deleted and retrained on open.
+"""
+
+KS = 256
+DEFAULT_PQ_M = 48
+SHORTLIST_FACTORS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def kmeans_l2(data: np.ndarray, k: int, iters: int = 15, seed: int = 0) -> np.ndarray:
+    """Plain Euclidean k-means for sub-space codebooks."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iters):
+        d = (
+            (data ** 2).sum(1, keepdims=True)
+            - 2 * data @ centroids.T
+            + (centroids ** 2).sum(1)
+        )
+        assign = np.argmin(d, axis=1)
+        for c in range(k):
+            members = data[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+    return centroids
+
+
+class ProductQuantizer:
+    def __init__(self, dim: int, m: int):
+        if dim % m != 0:
+            raise ValueError(f"pq_m={m} must divide dim={dim}")
+        self.dim = dim
+        self.m = m
+        self.dsub = dim // m
+        self.codebooks = None   # (m, KS, dsub)
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    def _split(self, x: np.ndarray) -> np.ndarray:
+        return x.reshape(len(x), self.m, self.dsub)
+
+    def train(self, data: np.ndarray):
+        sub = self._split(np.asarray(data, dtype=np.float32))
+        books = np.zeros((self.m, KS, self.dsub), dtype=np.float32)
+        for j in range(self.m):
+            cb = kmeans_l2(sub[:, j, :], KS, seed=j)
+            books[j, : len(cb)] = cb
+        self.codebooks = books
+
+    def encode(self, data: np.ndarray) -> np.ndarray:
+        sub = self._split(np.asarray(data, dtype=np.float32))
+        codes = np.empty((len(data), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            cb = self.codebooks[j]
+            d = (cb ** 2).sum(1) - 2 * sub[:, j, :] @ cb.T
+            codes[:, j] = np.argmin(d, axis=1)
+        return codes
+
+    def distance_table(self, q: np.ndarray) -> np.ndarray:
+        """(m x KS) sub-space inner products for one query."""
+        qs = np.asarray(q, dtype=np.float32).reshape(self.m, self.dsub)
+        return np.einsum("jkd,jd->jk", self.codebooks, qs)
+
+    def adc(self, table: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate inner products for a block of codes."""
+        return table[np.arange(self.m), codes].sum(axis=1)
+
+
+def parse_flag(value, name: str) -> bool:
+    """Boolean param from JSON: true/false, 1/0 or their string forms."""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("true", "1", "yes", "on"):
+        return True
+    if text in ("false", "0", "no", "off"):
+        return False
+    raise ValueError(f"{name} must be a boolean")
+
+
+class PQStorage:
+    """PQ codes for every row of a VectorStore, trained once enough rows exist."""
+
+    def __init__(self, store, params: dict):
+        self.store = store
+        self.m = int(params.get("pq_m", DEFAULT_PQ_M))
+        self.train_size = int(params.get("pq_train_size", 4096))
+        self.rescore = parse_flag(params.get("rescore", True), "rescore")
+        self.recall_target = float(params.get("recall_target", 0.95))
+        self.shortlist_factor = int(params.get("shortlist_factor", 8))
+        self.calibrated_recall = None
+
+        self.pq = ProductQuantizer(store.dim, self.m)
+        self._lock = threading.Lock()
+        self._codebooks_path = os.path.join(store.path, "pq_codebooks.npz")
+        self._codes_path = os.path.join(store.path, "pq_codes.bin")
+        self._codes = np.zeros((0, self.m), dtype=np.uint8)
+        self._trainer = None
+
+        if os.path.exists(self._codebooks_path):
+            self._load()
+
+        self.add(list(range(len(self._codes), store.rows)))
+
+    def _load(self):
+        snap = np.load(self._codebooks_path)
+        m = int(snap["m"]) if "m" in snap.files else len(snap["codebooks"])
+
+        # trained for another pq_m (index reconfigured) → retrain
+        if m != self.m or snap["codebooks"].shape != (self.m, KS, self.pq.dsub):
+            for path in (self._codebooks_path, self._codes_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+
+        self.pq.codebooks = snap["codebooks"]
+        self.shortlist_factor = int(snap["shortlist_factor"])
+        self.calibrated_recall = float(snap["calibrated_recall"])
+        codes = np.fromfile(self._codes_path, dtype=np.uint8) if os.path.exists(self._codes_path) else self._codes
+        rows = min(len(codes) // self.m, self.store.rows)
+        self._codes = codes[: rows * self.m].reshape(rows, self.m)
+        with open(self._codes_path, "wb") as f:
+            f.write(self._codes.tobytes())
+
+    @property
+    def trained(self) -> bool:
+        return self.pq.trained
+
+    def _rows(self, rows) -> np.ndarray:
+        return np.asarray(self.store.matrix()[rows], dtype=np.float32)
+
+    @property
+    def training(self) -> bool:
+        return self._trainer is not None and self._trainer.is_alive()
+
+    def train(self):
+        """
+        Train codebooks on a sample of the current rows, encode those rows
+        and calibrate the shortlist factor, all aside; then publish and
+        encode whatever was appended meanwhile.  Runs without the lock.
+        """
+        matrix = self.store.matrix()
+        live = np.flatnonzero(self.store.live_mask()[: matrix.shape[0]])
+        rng = np.random.default_rng(0)
+        sample = rng.permutation(live)[: self.train_size]
+
+        pq = ProductQuantizer(self.store.dim, self.m)
+        pq.train(self._rows(np.sort(sample)))
+        codes = np.concatenate([
+            pq.encode(self._rows(slice(start, start + 65536)))
+            for start in range(0, matrix.shape[0], 65536)
+        ]) if matrix.shape[0] else self._codes
+        factor, recall = self.calibrate(pq, codes, live)
+
+        with self._lock:
+            with open(self._codes_path, "wb") as f:
+                f.write(codes.tobytes())
+            np.savez(
+                self._codebooks_path,
+                m=self.m,
+                codebooks=pq.codebooks,
+                shortlist_factor=factor,
+                calibrated_recall=recall,
+            )
+            self._codes = codes
+            self.shortlist_factor, self.calibrated_recall = factor, recall
+            self.pq = pq
+            self._catch_up(self.store.rows)
+
+    def _train_in_background(self):
+        # caller holds self._lock; one trainer at a time
+        if self.training:
+            return
+        self._trainer = threading.Thread(target=self.train, name="pq-train", daemon=True)
+        self._trainer.start()
+
+    def wait(self, timeout: float = None):
+        """Block until a running background training has finished."""
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join(timeout)
+
+    def calibrate(self, pq: ProductQuantizer, codes: np.ndarray, live: np.ndarray,
+                  queries: int = 50, k: int = 10) -> tuple:
+        """(smallest shortlist factor meeting recall_target, its recall)."""
+        rng = np.random.default_rng(1)
+        sample = rng.choice(live, size=min(queries, len(live)), replace=False)
+        qs = self._rows(np.sort(sample))
+
+        recall, factor = 0.0, SHORTLIST_FACTORS[0]
+        for factor in SHORTLIST_FACTORS:
+            hits = 0
+            for q in qs:
+                truth = {r for r, _ in self.store.search(q, k)}
+                found = {r for r, _ in self._search(pq, codes, q, k, None, factor, True)}
+                hits += len(truth & found)
+            recall = hits / (len(qs) * k)
+            if recall >= self.recall_target:
+                break
+        return factor, recall
+
+    def _catch_up(self, end: int):
+        # caller holds self._lock; encode rows [len(codes), end) in order
+        start = len(self._codes)
+        if start >= end:
+            return
+        codes = self.pq.encode(self._rows(slice(start, end)))
+        with open(self._codes_path, "ab") as f:
+            f.write(codes.tobytes())
+        self._codes = np.concatenate([self._codes, codes])
+
+    def add(self, rows: list):
+        if not rows:
+            return
+        with self._lock:
+            if not self.trained:
+                if int(self.store.live_mask().sum()) >= self.train_size:
+                    self._train_in_background()
+                return
+            # concurrent requests may call add() out of order → catch up
+            # on every row up to the newest one instead of trusting `rows`
+            self._catch_up(min(max(rows) + 1, self.store.rows))
+
+    def search(self, query, top_k: int, candidates: np.ndarray = None,
+               shortlist_factor: int = None, rescore: bool = None):
+        """
+        ADC scan over `candidates` (default: every row) → [(row, score)].
+        Rows not yet encoded fall back to exact scoring.
+        """
+        pq, codes = self.pq, self._codes
+        if not pq.trained:
+            return None
+
+        rescore = self.rescore if rescore is None else rescore
+        factor = shortlist_factor or self.shortlist_factor
+        return self._search(pq, codes, query, top_k, candidates, factor, rescore)
+
+    def _search(self, pq: ProductQuantizer, codes: np.ndarray, query, top_k: int,
+                candidates: np.ndarray, factor: int, rescore: bool):
+        q = np.asarray(query, dtype=np.float32)
+        live = self.store.live_mask()
+        if candidates is None:
+            candidates = np.arange(len(codes), dtype=np.int64)
+            tail = np.arange(len(codes), self.store.rows, dtype=np.int64)
+        else:
+            tail = candidates[candidates >= len(codes)]
+            candidates = candidates[candidates < len(codes)]
+
+        candidates = candidates[live[candidates]]
+        tail = tail[live[tail]]
+        if top_k <= 0 or len(candidates) + len(tail) == 0:
+            return []
+
+        table = pq.distance_table(q)
+        scores = pq.adc(table, codes[candidates])
+
+        shortlist = min(top_k * factor if rescore else top_k, len(scores))
+        if shortlist:
+            top = np.argpartition(-scores, shortlist - 1)[:shortlist]
+            rows, scores = candidates[top], scores[top]
+        else:
+            rows = candidates[:0]
+
+        if rescore or len(tail):
+            exact_rows = np.sort(np.concatenate([rows, tail]) if rescore else tail)
+            exact = np.asarray(self.store.matrix()[exact_rows], dtype=np.float32) @ q
+            if rescore:
+                rows, scores = exact_rows, exact
+            else:
+                rows = np.concatenate([rows, exact_rows])
+                scores = np.concatenate([scores, exact])
+
+        order = np.argsort(-scores)[:top_k]
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+    def stats(self) -> dict:
+        bytes_float = self.store.dim * 4
+        return {
+            "storage": "pq",
+            "trained": self.trained,
+            "training": self.training,
+            "pq_m": self.m,
+            "bytes_per_vector": self.m,
+            "compression": round(bytes_float / self.m, 1),
+            "rescore": self.rescore,
+            "shortlist_factor": self.shortlist_factor,
+            "recall_target": self.recall_target,
+            "calibrated_recall": self.calibrated_recall,
+        }
@@ -0,0 +1,366 @@
+import os
+import json
+import threading
+import numpy as np
+
+"""
+Column Store (per index)
+------------------------
+Append-only storage replacing one-JSON-file-per-vector:
+
+  {DATA_DIR}/{index}/
+    meta.json      → dim + dtype (written once)
+    ids.txt        → id table, one case id per "\n"-terminated line
+                     (ids containing "\n" are rejected)
+    records.bin    → ciphertext records (JSON lines, opaque)
+    vectors.bin    → contiguous (rows x dim) matrix, memory-mapped
+    offsets.bin    → (offset, length, flags) per row
+
+offsets.bin is written LAST and is the commit marker: on open, every
+other file is truncated back to the number of committed rows, so a
+crash mid-append never exposes a half-written record.  An append is one
+write per file and two ordered sync points, whatever the batch size:
+the data files (records, vectors, ids) are synced first, then the
+marker, so a committed row never points at data that was not on disk.
+
+Re-inserting an id appends a new row; the old row is masked out.
+Deleting an id appends a tombstone row (FLAG_TOMBSTONE, no vector) that
+masks the old row and removes the id.
+
+Environment variables:
+ - VECTOR_DIM         = dimension of keyed-transformed vectors (default 384)
+ - VECTOR_DTYPE       = "float16" or "float32" (default float16)
+ - SEARCH_BLOCK_ROWS  = rows scored per matrix product (default 65536)
+"""
+
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "384"))
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float16")
+SEARCH_BLOCK_ROWS = int(os.getenv("SEARCH_BLOCK_ROWS", "65536"))
+
+# row flags
+FLAG_VECTOR = 1     # row carries a keyed-transformed vector
+FLAG_TOMBSTONE = 2  # row deletes its id
+
+OFFSET_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("flags", "<u4")])
+
+# contents + size, not timestamps: all that recovery reads back
+_datasync = getattr(os, "fdatasync", os.fsync)
+
+
+class VectorStore:
+    def __init__(self, path: str, dim: int = VECTOR_DIM, dtype: str = VECTOR_DTYPE):
+        self.path = path
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        else:
+            meta = {"dim": dim, "dtype": dtype}
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+
+        self.dim = int(meta["dim"])
+        self.dtype = np.dtype(meta["dtype"])
+
+        self._ids_path = os.path.join(path, "ids.txt")
+        self._records_path = os.path.join(path, "records.bin")
+        self._vectors_path = os.path.join(path, "vectors.bin")
+        self._offsets_path = os.path.join(path, "offsets.bin")
+
+        legacy = not os.path.exists(self._offsets_path)
+        self._recover()
+
+        self._ids_f = open(self._ids_path, "a", encoding="utf-8", newline="")
+        self._records_f = open(self._records_path, "ab")
+        self._vectors_f = open(self._vectors_path, "ab")
+        self._offsets_f = open(self._offsets_path, "ab")
+        self._records_fd = os.open(self._records_path, os.O_RDONLY)
+        self._mmap = None
+
+        if legacy:
+            self._import_legacy_files()
+
+    # -------------------------------------------------
+    # Open / crash recovery
+    # -------------------------------------------------
+    def _recover(self):
+        """Load committed rows and truncate any uncommitted tail."""
+        if os.path.exists(self._offsets_path):
+            size = os.path.getsize(self._offsets_path)
+            rows = size // OFFSET_DTYPE.itemsize
+            if size != rows * OFFSET_DTYPE.itemsize:
+                os.truncate(self._offsets_path, rows * OFFSET_DTYPE.itemsize)
+            offsets = np.fromfile(self._offsets_path, dtype=OFFSET_DTYPE)
+        else:
+            offsets = np.zeros(0, dtype=OFFSET_DTYPE)
+
+        rows = len(offsets)
+        end = int(offsets["offset"][-1] + offsets["length"][-1]) if rows else 0
+
+        for p, length in (
+            (self._records_path, end),
+            (self._vectors_path, rows * self.dim * self.dtype.itemsize),
+        ):
+            if not os.path.exists(p):
+                open(p, "wb").close()
+            if os.path.getsize(p) > length:
+                os.truncate(p, length)
+
+        ids = []
+        if os.path.exists(self._ids_path):
+            # split on "\n" only: ids may contain "\r" or other line breaks
+            with open(self._ids_path, "r", encoding="utf-8", newline="") as f:
+                ids = f.read().split("\n")[:-1]
+        if len(ids) != rows:
+            ids = ids[:rows]
+            with open(self._ids_path, "w", encoding="utf-8", newline="") as f:
+                f.write("".join(i + "\n" for i in ids))
+
+        self._ids = ids
+        self._flags = offsets["flags"].copy()
+        self._offsets = offsets
+        self._id_to_row = {}
+        self._live = np.zeros(rows, dtype=bool)
+        for row, case_id in enumerate(ids):
+            prev = self._id_to_row.get(case_id)
+            if prev is not None:
+                self._live[prev] = False
+            if self._flags[row] & FLAG_TOMBSTONE:
+                self._id_to_row.pop(case_id, None)
+                continue
+            self._id_to_row[case_id] = row
+            self._live[row] = bool(self._flags[row] & FLAG_VECTOR)
+
+    def _import_legacy_files(self):
+        """One-time migration of legacy {id}.json files into the store."""
+        reserved = {"meta.json", "index.json"}
+        legacy = sorted(f for f in os.listdir(self.path) if f.endswith(".json") and f not in reserved)
+        records = []
+        for fname in legacy:
+            with open(os.path.join(self.path, fname), "r") as f:
+                records.append(json.load(f))
+        if records:
+            self.append(records)
+
+    # -------------------------------------------------
+    # Append
+    # -------------------------------------------------
+    def validate(self, record: dict):
+        if "\n" in record["id"]:
+            raise ValueError("id must not contain a newline")
+        embedding = record.get("embedding")
+        if embedding is not None and len(embedding) != self.dim:
+            raise ValueError(f"embedding dim {len(embedding)} != index dim {self.dim}")
+
+    def append(self, records: list) -> list:
+        """
+        Append records in ONE write per file and return their rows.
+        Each record: { id, vector, nonce, embedding? } or a tombstone
+        { id, deleted: true } (see delete()).
+        """
+        for r in records:
+            self.validate(r)
+
+        with self._lock:
+            base = len(self._ids)
+            pos = self._records_f.tell()
+
+            blobs = []
+            vectors = np.zeros((len(records), self.dim), dtype=self.dtype)
+            offsets = np.zeros(len(records), dtype=OFFSET_DTYPE)
+
+            for i, r in enumerate(records):
+                blob = (json.dumps({k: v for k, v in r.items() if k != "embedding"}) + "\n").encode("utf-8")
+                blobs.append(blob)
+                offsets[i] = (pos, len(blob), FLAG_TOMBSTONE if r.get("deleted") else 0)
+                pos += len(blob)
+                if r.get("embedding") is not None:
+                    vectors[i] = np.asarray(r["embedding"], dtype=np.float32)
+                    offsets["flags"][i] |= FLAG_VECTOR
+
+            self._records_f.write(b"".join(blobs))
+            self._vectors_f.write(vectors.tobytes())
+            self._ids_f.write("".join(r["id"] + "\n" for r in records))
+            # sync point 1: every data file, before the marker references it
+            for f in (self._records_f, self._vectors_f, self._ids_f):
+                f.flush()
+                _datasync(f.fileno())
+
+            # sync point 2: commit marker
+            self._offsets_f.write(offsets.tobytes())
+            self._offsets_f.flush()
+            _datasync(self._offsets_f.fileno())
+
+            rows = list(range(base, base + len(records)))
+            self._offsets = np.concatenate([self._offsets, offsets])
+            self._flags = np.concatenate([self._flags, offsets["flags"]])
+            self._live = np.concatenate([self._live, (offsets["flags"] & FLAG_VECTOR) > 0])
+
+            for row, r in zip(rows, records):
+                prev = self._id_to_row.get(r["id"])
+                if prev is not None:
+                    self._live[prev] = False
+                if r.get("deleted"):
+                    self._id_to_row.pop(r["id"], None)
+                else:
+                    self._id_to_row[r["id"]] = row
+                self._ids.append(r["id"])
+
+            return rows
+
+    def append_current(self, records: list) -> tuple:
+        """
+        append() for records that may carry `if_row`, the row they were
+        read from: a record whose id has since moved to another row
+        (updated or deleted) is skipped, checked under the same lock as
+        the write.  Returns (rows of the written records, positions of the
+        skipped ones).
+        """
+        with self._lock:
+            skipped = [
+                i for i, r in enumerate(records)
+                if r.get("if_row") is not None and self._id_to_row.get(r["id"]) != r["if_row"]
+            ]
+            drop = set(skipped)
+            keep = [
+                {k: v for k, v in r.items() if k != "if_row"}
+                for i, r in enumerate(records)
+                if i not in drop
+            ]
+            return (self.append(keep) if keep else []), skipped
+
+    def delete(self, ids: list) -> tuple:
+        """
+        Append one tombstone per stored id (single commit).
+        Returns (tombstone rows, ids that were not stored).
+        """
+        with self._lock:
+            unique = list(dict.fromkeys(ids))
+            present = [i for i in unique if i in self._id_to_row]
+            missing = [i for i in unique if i not in self._id_to_row]
+            if not present:
+                return [], missing
+            return self.append([{"id": i, "deleted": True} for i in present]), missing
+
+    # -------------------------------------------------
+    # Read
+    # -------------------------------------------------
+    def __len__(self):
+        return len(self._id_to_row)
+
+    @property
+    def rows(self) -> int:
+        return len(self._ids)
+
+    def ids(self) -> list:
+        return sorted(self._id_to_row)
+
+    def row_id(self, row: int) -> str:
+        return self._ids[row]
+
+    def get(self, case_id: str):
+        row = self._id_to_row.get(case_id)
+        if row is None:
+            return None
+        off = self._offsets[row]
+        raw = os.pread(self._records_fd, int(off["length"]), int(off["offset"]))
+        return json.loads(raw)
+
+    def scan(self, start: int = 0, limit: int = 1000, end: int = None) -> tuple:
+        """
+        Current records in row order, from row `start` up to `end`
+        (exclusive, default = rows at call time), at most `limit` of them.
+        Superseded rows are skipped, so rows re-inserted after `end` was
+        taken are never returned twice.
+
+        Returns (records, next_row); next_row is None once `end` is reached.
+        Each record carries its `row` (for conditional re-writes, see
+        append_current()).
+        Each page is read from records.bin with a single pread spanning at
+        most 4 * limit rows (a page may be short, or empty, when most rows
+        in that span were superseded).
+        """
+        with self._lock:
+            end = self.rows if end is None else min(end, self.rows)
+            rows = []
+            row = max(0, start)
+            stop = min(end, row + 4 * limit)
+            while row < stop and len(rows) < limit:
+                if self._id_to_row.get(self._ids[row]) == row:
+                    rows.append(row)
+                row += 1
+            offsets = self._offsets
+            flags = self._flags
+
+        if not rows:
+            return [], (row if row < end else None)
+
+        first, last = offsets[rows[0]], offsets[rows[-1]]
+        base = int(first["offset"])
+        raw = os.pread(self._records_fd, int(last["offset"] + last["length"]) - base, base)
+
+        records = []
+        for r in rows:
+            off = offsets[r]
+            rec = json.loads(raw[int(off["offset"]) - base:int(off["offset"] + off["length"]) - base])
+            rec["has_embedding"] = bool(flags[r] & FLAG_VECTOR)
+            rec["row"] = r
+            records.append(rec)
+        return records, (row if row < end else None)
+
+    def matrix(self) -> np.ndarray:
+        """Memory-mapped (rows x dim) view, remapped only when rows grow."""
+        with self._lock:
+            rows = self.rows
+            if self._mmap is None or self._mmap.shape[0] != rows:
+                if rows == 0:
+                    return np.zeros((0, self.dim), dtype=self.dtype)
+                self._mmap = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+            return self._mmap
+
+    def has_vector(self, row: int) -> bool:
+        return bool(self._flags[row] & FLAG_VECTOR)
+
+    def live_mask(self) -> np.ndarray:
+        return self._live
+
+    # -------------------------------------------------
+    # Search
+    # -------------------------------------------------
+    def search(self, query, top_k: int, block_rows: int = SEARCH_BLOCK_ROWS):
+        """
+        Exact inner-product top-k over the memory-mapped matrix,
+        scored in blocks of `block_rows` rows.
+        Returns [(row, score)] sorted by descending score.
+        """
+        q = np.asarray(query, dtype=np.float32)
+        if q.shape[0] != self.dim:
+            raise ValueError(f"query dim {q.shape[0]} != index dim {self.dim}")
+
+        matrix = self.matrix()
+        live = self._live[: matrix.shape[0]]
+        if top_k <= 0 or matrix.shape[0] == 0:
+            return []
+
+        cand_rows, cand_scores = [], []
+        for start in range(0, matrix.shape[0], block_rows):
+            block = np.asarray(matrix[start:start + block_rows], dtype=np.float32)
+            scores = block @ q
+            scores[~live[start:start + block_rows]] = -np.inf
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            cand_rows.append(top + start)
+            cand_scores.append(scores[top])
+
+        rows = np.concatenate(cand_rows)
+        scores = np.concatenate(cand_scores)
+        order = np.argsort(-scores)[:top_k]
+
+        return [
+            (int(rows[i]), float(scores[i]))
+            for i in order
+            if np.isfinite(scores[i])
+        ]
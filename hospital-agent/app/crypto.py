@@ -0,0 +1,326 @@
+# hospital-agent/.../app/crypto.py
+
+import os
+import json
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# KEY_MODE = "file" → load or auto-generate local key
+# KEY_MODE = "kms"  → fetch key from KMS (kms_client.fetch_key)
+KEY_MODE = os.getenv('KEY_MODE', 'file')  # 'file' or 'kms'
+
+# WIRE_ENCODING = "base64" → nonce/ciphertext as base64 (tagged "encoding": "base64")
+# WIRE_ENCODING = "hex"    → legacy hex strings (no "encoding" field)
+WIRE_ENCODING = os.getenv('WIRE_ENCODING', 'base64').lower()
+
+# CryptoEngine tuning (see below)
+CRYPTO_WORKERS = int(os.getenv('CRYPTO_WORKERS', str(min(8, os.cpu_count() or 1))))
+CRYPTO_NONCE_MODE = os.getenv('CRYPTO_NONCE_MODE', 'random').lower()   # 'random' or 'counter'
+# counter mode: nonces per 64-bit prefix before a fresh prefix is drawn (max 2**32)
+CRYPTO_COUNTER_LIMIT = min(int(os.getenv('CRYPTO_COUNTER_LIMIT', str(2 ** 32))), 2 ** 32)
+CRYPTO_CIPHER_CACHE = int(os.getenv('CRYPTO_CIPHER_CACHE', '1024'))
+CRYPTO_PARALLEL_MIN_BYTES = int(os.getenv('CRYPTO_PARALLEL_MIN_BYTES', str(256 * 1024)))
+
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+
+# -------------------------------------------------------------
+# FILE MODE: load or auto-generate AES-256 key
+# -------------------------------------------------------------
+
+def load_key(path: str) -> bytes:
+    """Load key from a local file."""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def generate_key(path: str) -> bytes:
+    """Generate AES-256 key and store it securely."""
+    key = AESGCM.generate_key(bit_length=256)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, 'wb') as f:
+        f.write(key)
+
+    # Secure file permissions (best effort)
+    try:
+        os.chmod(path, 0o600)
+    except Exception:
+        pass
+
+    return key
+
+
+def load_key_auto(path: str, kms_fetcher=None, mode: str = None) -> bytes:
+    """
+    Unified key loader:
+
+    - FILE MODE → load or auto-generate AES-256 key
+    - KMS  MODE → fetch key using kms_fetcher()
+
+    `mode` overrides KEY_MODE (per-tenant key modes).
+    """
+    mode = mode or KEY_MODE
+
+    if mode == 'file':
+        if not os.path.exists(path):
+            return generate_key(path)
+        return load_key(path)
+
+    elif mode == 'kms':
+        if kms_fetcher is None:
+            raise RuntimeError("KMS fetcher required for KEY_MODE=kms")
+        return kms_fetcher()
+
+    else:
+        raise RuntimeError(f"Unknown KEY_MODE '{mode}'")
+
+
+# -------------------------------------------------------------
+# CRYPTO ENGINE: cached ciphers, batch AES-GCM on a thread pool
+# -------------------------------------------------------------
+
+class CryptoEngine:
+    """
+    Reusable AES-GCM engine.
+
+    - one AESGCM context per key (LRU, CRYPTO_CIPHER_CACHE keys)
+    - nonces generated per batch:
+        random  → one os.urandom(12 * n) call per batch
+        counter → 8-byte random prefix + 4-byte counter; a fresh prefix
+                  is drawn at start-up, in forked children and every
+                  CRYPTO_COUNTER_LIMIT nonces, so processes and restarts
+                  never share a counter range (collision odds are those
+                  of 64-bit random prefixes, not 32-bit ones)
+    - batch APIs write every nonce / ciphertext into one preallocated
+      buffer (encrypt_into / decrypt_into when available) and return
+      memoryview slices of it
+    - batches above CRYPTO_PARALLEL_MIN_BYTES are split across a thread
+      pool; the cryptography backend releases the GIL during AES-GCM
+    """
+
+    def __init__(self, workers: int = CRYPTO_WORKERS, nonce_mode: str = CRYPTO_NONCE_MODE):
+        if nonce_mode not in ('random', 'counter'):
+            raise ValueError(f"Unknown CRYPTO_NONCE_MODE '{nonce_mode}'")
+        self.workers = max(1, workers)
+        self.nonce_mode = nonce_mode
+        self._ciphers = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+        self._reset_counter()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_counter)
+
+    def _reset_counter(self):
+        self._prefix = os.urandom(8)
+        self._counter = 0
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='crypto')
+        return self._pool
+
+    def cipher(self, key: bytes) -> AESGCM:
+        digest = hashlib.sha256(key).digest()
+        with self._lock:
+            aes = self._ciphers.get(digest)
+            if aes is not None:
+                self._ciphers.move_to_end(digest)
+                return aes
+        aes = AESGCM(key)
+        with self._lock:
+            self._ciphers[digest] = aes
+            while len(self._ciphers) > CRYPTO_CIPHER_CACHE:
+                self._ciphers.popitem(last=False)
+        return aes
+
+    def nonces(self, n: int) -> bytes:
+        """n concatenated 12-byte nonces."""
+        if self.nonce_mode == 'random':
+            return os.urandom(NONCE_SIZE * n)
+        if n > CRYPTO_COUNTER_LIMIT:
+            raise ValueError(f"batch of {n} nonces exceeds CRYPTO_COUNTER_LIMIT")
+        with self._lock:
+            if self._counter + n > CRYPTO_COUNTER_LIMIT:
+                self._reset_counter()
+            prefix, start = self._prefix, self._counter
+            self._counter += n
+        return b''.join(prefix + (start + i).to_bytes(4, 'big') for i in range(n))
+
+    # ---------------------------------------------------------
+    # single item
+    # ---------------------------------------------------------
+    def encrypt(self, key: bytes, plaintext: bytes) -> tuple:
+        nonce = self.nonces(1)
+        return nonce, self.cipher(key).encrypt(nonce, plaintext, None)
+
+    def decrypt(self, key: bytes, nonce: bytes, ct: bytes) -> bytes:
+        return self.cipher(key).decrypt(nonce, ct, None)
+
+    # ---------------------------------------------------------
+    # batches
+    # ---------------------------------------------------------
+    def _run(self, n: int, total_bytes: int, fn):
+        """Call fn(start, end) over [0, n), in parallel for large batches."""
+        if self.workers == 1 or n < 2 or total_bytes < CRYPTO_PARALLEL_MIN_BYTES:
+            fn(0, n)
+            return
+        step = -(-n // self.workers)
+        futures = [self._executor().submit(fn, i, min(n, i + step)) for i in range(0, n, step)]
+        for f in futures:
+            f.result()
+
+    def encrypt_many(self, key: bytes, plaintexts: list) -> list:
+        """
+        Encrypt a list of buffers with one key.
+        Returns [(nonce, ciphertext)] as memoryviews into two preallocated buffers.
+        """
+        n = len(plaintexts)
+        aes = self.cipher(key)
+        nonces = memoryview(self.nonces(n))
+
+        offsets = [0] * (n + 1)
+        for i, pt in enumerate(plaintexts):
+            offsets[i + 1] = offsets[i] + len(pt) + TAG_SIZE
+        out = memoryview(bytearray(offsets[n]))
+        into = hasattr(aes, 'encrypt_into')
+
+        def work(start, end):
+            for i in range(start, end):
+                nonce = nonces[i * NONCE_SIZE:(i + 1) * NONCE_SIZE]
+                dst = out[offsets[i]:offsets[i + 1]]
+                if into:
+                    aes.encrypt_into(nonce, plaintexts[i], None, dst)
+                else:
+                    dst[:] = aes.encrypt(bytes(nonce), plaintexts[i], None)
+
+        self._run(n, offsets[n], work)
+        return [
+            (nonces[i * NONCE_SIZE:(i + 1) * NONCE_SIZE], out[offsets[i]:offsets[i + 1]])
+            for i in range(n)
+        ]
+
+    def decrypt_many(self, key: bytes, items: list) -> list:
+        """
+        Decrypt [(nonce, ciphertext)] with one key.
+        Returns plaintext memoryviews into one preallocated buffer.
+        Raises InvalidTag, like decrypt(), for a ciphertext too short to
+        hold its tag.
+        """
+        n = len(items)
+        aes = self.cipher(key)
+
+        offsets = [0] * (n + 1)
+        for i, (_, ct) in enumerate(items):
+            if len(ct) < TAG_SIZE:
+                raise InvalidTag()
+            offsets[i + 1] = offsets[i] + len(ct) - TAG_SIZE
+        out = memoryview(bytearray(offsets[n]))
+        into = hasattr(aes, 'decrypt_into')
+
+        def work(start, end):
+            for i in range(start, end):
+                nonce, ct = items[i]
+                dst = out[offsets[i]:offsets[i + 1]]
+                if into:
+                    aes.decrypt_into(nonce, ct, None, dst)
+                else:
+                    dst[:] = aes.decrypt(bytes(nonce), bytes(ct), None)
+
+        self._run(n, offsets[n], work)
+        return [out[offsets[i]:offsets[i + 1]] for i in range(n)]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+engine = CryptoEngine()
+
+
+# -------------------------------------------------------------
+# WIRE ENCODING (base64, legacy hex)
+# -------------------------------------------------------------
+
+def encode_wire(nonce: bytes, ct: bytes) -> dict:
+    if WIRE_ENCODING == 'hex':
+        return {"nonce": bytes(nonce).hex(), "ciphertext": bytes(ct).hex()}
+    return {
+        "nonce": base64.b64encode(nonce).decode('ascii'),
+        "ciphertext": base64.b64encode(ct).decode('ascii'),
+        "encoding": "base64",
+    }
+
+
+def decode_wire(enc: dict) -> tuple:
+    """Return (nonce, ciphertext) bytes from a stored blob of either encoding."""
+    if enc.get("encoding") == "base64":
+        return base64.b64decode(enc["nonce"]), base64.b64decode(enc["ciphertext"])
+    return bytes.fromhex(enc["nonce"]), bytes.fromhex(enc["ciphertext"])
+
+
+# -------------------------------------------------------------
+# AES-GCM ENCRYPT / DECRYPT
+# -------------------------------------------------------------
+
+def encrypt_vector(key: bytes, plaintext_bytes: bytes) -> dict:
+    """
+    Encrypt raw bytes using AES-GCM with a random nonce.
+    Suitable for embedding vectors (see envelope.pack_vector).
+    """
+    nonce, ct = engine.encrypt(key, plaintext_bytes)
+
+    return encode_wire(nonce, ct)
+
+
+def encrypt_vectors(key: bytes, plaintexts: list) -> list:
+    """
+    Batch variant: one cipher context, one nonce draw and one output
+    buffer for the whole batch (parallel for large batches).
+    """
+    return [encode_wire(nonce, ct) for nonce, ct in engine.encrypt_many(key, plaintexts)]
+
+
+def encrypt_blob(key: bytes, obj: dict) -> dict:
+    """
+    Encrypt a Python dict using AES-GCM.
+    This is used for /ingest_example where we encrypt structured JSON.
+    """
+    # Convert payload → bytes
+    plaintext = json.dumps(obj).encode("utf-8")
+
+    nonce, ct = engine.encrypt(key, plaintext)
+
+    return encode_wire(nonce, ct)
+
+
+def decrypt_vector(key: bytes, nonce_hex: str, ciphertext_hex: str) -> bytes:
+    """
+    Decrypt AES-GCM encrypted bytes.
+    """
+    nonce = bytes.fromhex(nonce_hex)
+    ct = bytes.fromhex(ciphertext_hex)
+
+    return engine.decrypt(key, nonce, ct)
+
+
+def decrypt_blob(key: bytes, enc: dict) -> bytes:
+    """
+    Decrypt a stored blob in either wire encoding (base64 or legacy hex).
+    """
+    nonce, ct = decode_wire(enc)
+    return engine.decrypt(key, nonce, ct)
+
+
+def decrypt_blobs(key: bytes, encs: list) -> list:
+    """Batch variant of decrypt_blob; returns plaintext bytes per blob."""
+    return [bytes(pt) for pt in engine.decrypt_many(key, [decode_wire(e) for e in encs])]
@@ -0,0 +1,153 @@
+# hospital-agent/.../app/data_keys.py
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from . import crypto
+
+"""
+Envelope Encryption (HKDF data keys)
+------------------------------------
+Records are no longer encrypted with the tenant master key directly.
+The master key (fetched from the KMS once per KMS_CACHE_TTL, see
+kms_client.get_key) only feeds HKDF-SHA256; every blob is encrypted
+with a derived data key and carries the key id needed to re-derive it:
+
+    { "nonce": ..., "ciphertext": ..., "encoding": "base64", "kid": "day:2026-10-18" }
+
+Key ids (DATA_KEY_SCOPE):
+ - day    → "day:<UTC date>"   one data key per tenant per day (default)
+ - case   → "case:<case_id>"   one data key per case (queries use "day")
+ - master → no kid, master key used directly (legacy blobs)
+
+Data key = HKDF(master, salt=none, info="cyborg-ehr/data-key/v1:" + kid).
+Nothing is wrapped or stored besides the kid: whoever holds the master
+key (agent, clinician UI) re-derives the data key locally, so the KMS
+is never called per record.  Blobs without a kid decrypt with the
+master key as before.
+
+The keyed search transform (transform.py) still uses the master key;
+search vectors must stay comparable across data keys.
+
+Environment variables:
+ - DATA_KEY_SCOPE = "day" (default), "case" or "master"
+ - DATA_KEY_CACHE = derived keys kept in memory (default 4096)
+"""
+
+DATA_KEY_SCOPE = os.getenv("DATA_KEY_SCOPE", "day").lower()
+DATA_KEY_CACHE = int(os.getenv("DATA_KEY_CACHE", "4096"))
+
+HKDF_INFO_PREFIX = b"cyborg-ehr/data-key/v1:"
+SCOPES = ("day", "case", "master")
+
+_keys = OrderedDict()     # (sha256(master), kid) → data key
+_lock = threading.Lock()
+_stats = {"derived": 0, "cache_hits": 0}
+
+
+# -------------------------------------------------------
+# KEY IDS + DERIVATION
+# -------------------------------------------------------
+def current_kid(case_id: str = None, scope: str = None, now: float = None):
+    """Key id for a new blob (None = encrypt with the master key)."""
+    scope = (scope or DATA_KEY_SCOPE).lower()
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown DATA_KEY_SCOPE '{scope}'")
+    if scope == "master":
+        return None
+    if scope == "case" and case_id:
+        return f"case:{case_id}"
+    return "day:" + time.strftime("%Y-%m-%d", time.gmtime(now))
+
+
+def derive_key(master: bytes, kid: str) -> bytes:
+    slot = (hashlib.sha256(master).digest(), kid)
+    with _lock:
+        key = _keys.get(slot)
+        if key is not None:
+            _keys.move_to_end(slot)
+            _stats["cache_hits"] += 1
+            return key
+
+    key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=HKDF_INFO_PREFIX + kid.encode("utf-8"),
+    ).derive(master)
+
+    with _lock:
+        _stats["derived"] += 1
+        _keys[slot] = key
+        while len(_keys) > DATA_KEY_CACHE:
+            _keys.popitem(last=False)
+    return key
+
+
+def key_for(master: bytes, kid: str = None) -> bytes:
+    return derive_key(master, kid) if kid else master
+
+
+def _tag(enc: dict, kid: str) -> dict:
+    if kid:
+        enc["kid"] = kid
+    return enc
+
+
+# -------------------------------------------------------
+# ENCRYPT / DECRYPT WITH DATA KEYS
+# -------------------------------------------------------
+def encrypt_vector(master: bytes, plaintext_bytes: bytes, case_id: str = None) -> dict:
+    kid = current_kid(case_id)
+    return _tag(crypto.encrypt_vector(key_for(master, kid), plaintext_bytes), kid)
+
+
+def encrypt_vectors(master: bytes, plaintexts: list, case_ids: list = None) -> list:
+    """
+    Batch variant: rows are grouped by key id so each data key is
+    derived once and encrypted with one crypto engine call.
+    """
+    case_ids = case_ids or [None] * len(plaintexts)
+    groups = {}
+    for i, case_id in enumerate(case_ids):
+        groups.setdefault(current_kid(case_id), []).append(i)
+
+    out = [None] * len(plaintexts)
+    for kid, rows in groups.items():
+        blobs = crypto.encrypt_vectors(key_for(master, kid), [plaintexts[i] for i in rows])
+        for i, enc in zip(rows, blobs):
+            out[i] = _tag(enc, kid)
+    return out
+
+
+def encrypt_blob(master: bytes, obj: dict, case_id: str = None) -> dict:
+    kid = current_kid(case_id)
+    return _tag(crypto.encrypt_blob(key_for(master, kid), obj), kid)
+
+
+def decrypt_blob(master: bytes, enc: dict) -> bytes:
+    return crypto.decrypt_blob(key_for(master, enc.get("kid")), enc)
+
+
+def decrypt_blobs(master: bytes, encs: list) -> list:
+    """Batch variant of decrypt_blob: one crypto engine call per key id."""
+    groups = {}
+    for i, enc in enumerate(encs):
+        groups.setdefault(enc.get("kid"), []).append(i)
+
+    out = [None] * len(encs)
+    for kid, rows in groups.items():
+        plain = crypto.decrypt_blobs(key_for(master, kid), [encs[i] for i in rows])
+        for i, pt in zip(rows, plain):
+            out[i] = pt
+    return out
+
+
+def stats() -> dict:
+    with _lock:
+        return {**_stats, "cached": len(_keys), "scope": DATA_KEY_SCOPE}
@@ -0,0 +1,183 @@
+# hospital-agent/.../app/embed_cache.py
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+"""
+Content-Addressed Embedding Cache
+---------------------------------
+Two tiers, both local to the hospital agent (nothing leaves the boundary):
+
+ - memory → LRU of the most recently used vectors (EMBED_CACHE_MEMORY)
+ - disk   → SQLite table (EMBED_CACHE_PATH), capped at EMBED_CACHE_MAX_ROWS;
+            least recently used rows are evicted in chunks when full
+
+key = SHA-256(model name + "\\0" + text), so a model change never serves
+stale vectors.  Vectors are stored as raw float32 bytes.
+
+Environment variables:
+ - EMBED_CACHE           = "on" / "off" (default on)
+ - EMBED_CACHE_PATH      = SQLite file (default /state/embed_cache.sqlite)
+ - EMBED_CACHE_MEMORY    = in-memory entries (default 10000)
+ - EMBED_CACHE_MAX_ROWS  = on-disk entries (default 1000000)
+"""
+
+EMBED_CACHE = os.getenv("EMBED_CACHE", "on").lower() not in ("off", "0", "false")
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "/state/embed_cache.sqlite")
+EMBED_CACHE_MEMORY = int(os.getenv("EMBED_CACHE_MEMORY", "10000"))
+EMBED_CACHE_MAX_ROWS = int(os.getenv("EMBED_CACHE_MAX_ROWS", "1000000"))
+
+# fraction of the disk tier dropped per eviction pass
+_EVICT_FRACTION = 0.05
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    return hashlib.sha256(model_name.encode("utf-8") + b"\0" + text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_memory: int = EMBED_CACHE_MEMORY,
+                 max_rows: int = EMBED_CACHE_MAX_ROWS):
+        self.path = path
+        self.max_memory = max_memory
+        self.max_rows = max_rows
+        self._memory = OrderedDict()   # key → list[float]
+        self._lock = threading.Lock()
+        self._db = None
+        self._rows = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key BLOB PRIMARY KEY, vec BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(last_used)")
+            self._rows = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._db = db
+        return self._db
+
+    def _remember(self, key: bytes, vec: list):
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    # -------------------------------------------------
+    # Lookup / store
+    # -------------------------------------------------
+    def get_many(self, keys: list) -> dict:
+        """Return {key: vector} for every key found in either tier."""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vec
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+            if not missing:
+                return found
+
+            db = self._conn()
+            now = time.time()
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = db.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({marks})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vec = np.frombuffer(blob, dtype=np.float32).tolist()
+                    found[bytes(key)] = vec
+                    self._remember(bytes(key), vec)
+                if rows:
+                    db.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows],
+                    )
+                    self.disk_hits += len(rows)
+            db.commit()
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: list):
+        """items = [(key, vector)]"""
+        if not items:
+            return
+        with self._lock:
+            db = self._conn()
+            now = time.time()
+            db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vec, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vec, dtype=np.float32).tobytes(), now) for key, vec in items],
+            )
+            for key, vec in items:
+                self._remember(key, vec)
+            self._rows += len(items)
+            if self._rows > self.max_rows:
+                self._evict(db)
+            db.commit()
+
+    def _evict(self, db):
+        self._rows = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._rows - self.max_rows
+        if excess <= 0:
+            return
+        drop = excess + int(self.max_rows * _EVICT_FRACTION)
+        db.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            " SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (drop,),
+        )
+        self._rows -= drop
+        self.evictions += drop
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            db = self._conn()
+            db.execute("DELETE FROM embeddings")
+            db.commit()
+            self._rows = 0
+
+    # -------------------------------------------------
+    # Metrics
+    # -------------------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "enabled": EMBED_CACHE,
+                "memory_entries": len(self._memory),
+                "memory_capacity": self.max_memory,
+                "disk_entries": self._rows,
+                "disk_capacity": self.max_rows,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "path": self.path,
+            }
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,184 @@
+# hospital-agent/.../app/embed_pool.py
+
+import os
+import math
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+"""
+Multi-Process Embedding Pool
+----------------------------
+EMBED_WORKERS processes, each loading the embedding backend once
+(torch or ONNX, see embeddings.py).  A batch is split into contiguous
+row ranges, one per worker, and exchanged through shared memory:
+
+    input  block → [n+1 uint64 byte offsets][UTF-8 text bytes]
+    output block → float32 matrix (n x dim), written in place by workers
+
+Only block names and row ranges are pickled, never the texts or vectors.
+The parent owns (creates + unlinks) both blocks.
+
+Workers are started with the "spawn" method (no forked torch state) and
+each is limited to EMBED_WORKER_THREADS intra-op threads so the pool
+does not oversubscribe the CPU.
+
+Environment variables:
+ - EMBED_WORKERS         = worker processes; 0 = embed in-process (default 0)
+ - EMBED_WORKER_THREADS  = threads per worker (default cpu_count // workers)
+ - EMBED_MIN_CHUNK       = min rows sent to one worker (default 16)
+"""
+
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+EMBED_WORKER_THREADS = int(os.getenv("EMBED_WORKER_THREADS", "0"))
+EMBED_MIN_CHUNK = int(os.getenv("EMBED_MIN_CHUNK", "16"))
+
+_OFFSET = np.dtype("<u8")
+
+
+# -------------------------------------------------------
+# WORKER SIDE
+# -------------------------------------------------------
+def _worker_init(threads: int):
+    if threads > 0:
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    from . import embeddings
+    embeddings.get_backend()    # load the model once per worker
+
+
+def _worker_probe() -> tuple:
+    """(output dimension, cache namespace) of this worker's backend."""
+    from . import embeddings
+    return len(embeddings.encode_local(["dimension probe"])[0]), embeddings.backend_cache_name()
+
+
+def _worker_encode(in_name: str, out_name: str, n: int, dim: int, start: int, end: int):
+    from . import embeddings
+
+    shm_in = shared_memory.SharedMemory(name=in_name)
+    shm_out = shared_memory.SharedMemory(name=out_name)
+    try:
+        offsets = np.ndarray((n + 1,), dtype=_OFFSET, buffer=shm_in.buf)
+        base = (n + 1) * _OFFSET.itemsize
+        texts = [
+            bytes(shm_in.buf[base + offsets[i]:base + offsets[i + 1]]).decode("utf-8")
+            for i in range(start, end)
+        ]
+        out = np.ndarray((n, dim), dtype=np.float32, buffer=shm_out.buf)
+        out[start:end] = np.asarray(embeddings.encode_local(texts), dtype=np.float32)
+        del offsets, out    # release buffer views before close()
+    finally:
+        shm_in.close()
+        shm_out.close()
+    return end - start
+
+
+# -------------------------------------------------------
+# PARENT SIDE
+# -------------------------------------------------------
+class EmbeddingPool:
+    def __init__(self, workers: int = EMBED_WORKERS):
+        self.workers = workers
+        self.threads = EMBED_WORKER_THREADS or max(1, (os.cpu_count() or 1) // max(1, workers))
+        self.dim = None
+        self.cache_name = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+        self.batches = 0
+        self.rows = 0
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    def start(self):
+        with self._start_lock:
+            if self.workers <= 0 or self._executor is not None:
+                return
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_worker_init,
+                initargs=(self.threads,),
+            )
+            # warm every worker (model load) and learn the output dimension;
+            # the pool only counts as running once dim + cache name are known
+            try:
+                probes = [executor.submit(_worker_probe) for _ in range(self.workers)]
+                dim, cache_name = probes[0].result()
+                for f in probes[1:]:
+                    f.result()
+            except BaseException:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            self.dim, self.cache_name = dim, cache_name
+            self._executor = executor
+
+    def stop(self):
+        with self._start_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def encode(self, texts: list) -> list:
+        """Blocking; call from a worker thread (asyncio.to_thread)."""
+        n = len(texts)
+        if n == 0:
+            return []
+
+        encoded = [t.encode("utf-8") for t in texts]
+        offsets = np.zeros(n + 1, dtype=_OFFSET)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        header = (n + 1) * _OFFSET.itemsize
+
+        shm_in = shared_memory.SharedMemory(create=True, size=max(1, header + int(offsets[-1])))
+        shm_out = shared_memory.SharedMemory(create=True, size=n * self.dim * 4)
+        try:
+            shm_in.buf[:header] = offsets.tobytes()
+            shm_in.buf[header:header + int(offsets[-1])] = b"".join(encoded)
+
+            chunk = max(EMBED_MIN_CHUNK, math.ceil(n / self.workers))
+            futures = [
+                self._executor.submit(
+                    _worker_encode, shm_in.name, shm_out.name, n, self.dim, start, min(n, start + chunk)
+                )
+                for start in range(0, n, chunk)
+            ]
+            for f in futures:
+                f.result()
+
+            out = np.ndarray((n, self.dim), dtype=np.float32, buffer=shm_out.buf)
+            result = out.tolist()
+            del out
+        finally:
+            shm_in.close()
+            shm_in.unlink()
+            shm_out.close()
+            shm_out.unlink()
+
+        with self._lock:
+            self.batches += 1
+            self.rows += n
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "threads_per_worker": self.threads,
+            "running": self.running,
+            "dim": self.dim,
+            "batches": self.batches,
+            "rows": self.rows,
+        }
+
+
+embed_pool = EmbeddingPool()
@@ -0,0 +1,132 @@
+import os
+import asyncio
+import logging
+import threading
+
+from .embed_cache import EMBED_CACHE, cache_key, embedding_cache
+from .embed_pool import EMBED_WORKERS, embed_pool
+
+log = logging.getLogger(__name__)
+
+EMBED_MODEL = os.getenv('EMBED_MODEL', 'all-MiniLM-L6-v2')
+
+# EMBED_BACKEND = "torch" → SentenceTransformer (PyTorch)
+# EMBED_BACKEND = "onnx"  → exported int8 ONNX Runtime model (onnx_backend.py),
+#                           falls back to torch if export/parity fails
+EMBED_BACKEND = os.getenv('EMBED_BACKEND', 'torch').lower()
+
+_model = None
+_onnx = None
+_active_backend = None
+_backend_lock = threading.Lock()
+
+WARMUP_TEXTS = [
+    "warm-up: elderly patient with chest pain",
+    "warm-up: pediatric asthma exacerbation after viral infection",
+]
+
+def get_model():
+    global _model
+    if _model is None:
+        # deferred: importing sentence_transformers pulls in torch (seconds)
+        from sentence_transformers import SentenceTransformer
+        # small & fast model for hackathon reproducibility
+        _model = SentenceTransformer(EMBED_MODEL)
+    return _model
+
+def get_backend():
+    """Return (name, encoder) for the configured backend."""
+    global _onnx, _active_backend
+    if _active_backend is None:
+        with _backend_lock:
+            if _active_backend is None:
+                backend = 'torch'
+                if EMBED_BACKEND == 'onnx':
+                    from .onnx_backend import load_or_export
+                    try:
+                        _onnx = load_or_export(EMBED_MODEL, get_model)
+                        backend = 'onnx'
+                    except Exception as e:
+                        log.warning("ONNX backend unavailable, using torch: %s", e)
+                _active_backend = backend
+    if _active_backend == 'onnx':
+        return 'onnx', _onnx
+    return 'torch', get_model()
+
+def encode_local(texts: list) -> list:
+    """Embed in this process (also what each pool worker runs)."""
+    name, encoder = get_backend()
+    if name == 'onnx':
+        return encoder.encode(texts)
+    embs = encoder.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+    return embs.tolist()
+
+class EmbeddingsNotReady(RuntimeError):
+    """EMBED_WORKERS > 0 but the worker pool is not up (yet)."""
+
+def pool_pending() -> bool:
+    return EMBED_WORKERS > 0 and not embed_pool.running
+
+def _encode(texts: list) -> list:
+    if embed_pool.running:
+        return embed_pool.encode(texts)
+    # the model belongs in the workers: never load a second copy here
+    if pool_pending():
+        raise EmbeddingsNotReady("embedding pool is still starting")
+    return encode_local(texts)
+
+def backend_cache_name() -> str:
+    # int8 ONNX vectors differ slightly from torch ones → separate cache keys
+    name, encoder = get_backend()
+    if name == 'onnx':
+        return f"{EMBED_MODEL}+onnx-{encoder.config.get('quantize', 'none')}"
+    return EMBED_MODEL
+
+def _cache_model_name() -> str:
+    # with a pool the model lives in the workers; ask them, not the parent
+    if embed_pool.running:
+        return embed_pool.cache_name
+    if pool_pending():
+        raise EmbeddingsNotReady("embedding pool is still starting")
+    return backend_cache_name()
+
+def embedding_version() -> str:
+    # model + backend variant, e.g. for the ingestion manifest
+    return _cache_model_name()
+
+def embed_texts(texts: list):
+    if not EMBED_CACHE:
+        return _encode(texts)
+
+    # content-addressed lookup; only unseen texts hit the model (once each)
+    model_name = _cache_model_name()
+    keys = [cache_key(model_name, t) for t in texts]
+    found = embedding_cache.get_many(keys)
+
+    todo = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in todo:
+            todo[key] = text
+
+    if todo:
+        vecs = _encode(list(todo.values()))
+        fresh = list(zip(todo.keys(), vecs))
+        embedding_cache.put_many(fresh)
+        found.update(fresh)
+
+    return [found[k] for k in keys]
+
+def load_backend():
+    """Load the model (in-process or in every pool worker)."""
+    if EMBED_WORKERS > 0:
+        embed_pool.start()
+    else:
+        get_backend()
+
+def warm_up():
+    """One forward pass so the first real request pays no lazy-init cost."""
+    _encode(WARMUP_TEXTS)
+
+async def embed_texts_async(texts: list):
+    """Non-blocking variant for request handlers (runs in a thread)."""
+    return await asyncio.to_thread(embed_texts, texts)
@@ -0,0 +1,99 @@
+# hospital-agent/.../app/envelope.py
+
+import os
+import json
+import struct
+import numpy as np
+
+"""
+Binary Vector Envelope (plaintext format, encrypted as a whole)
+---------------------------------------------------------------
+Replaces json.dumps({"vector": [...], "metadata": {...}}) before AES-GCM.
+
+Layout (little-endian, 20-byte header):
+
+    offset  size  field
+    0       4     magic      b"ECXV"
+    4       1     version    1
+    5       1     dtype      0 = float32, 1 = float16, 2 = int8
+    6       2     flags      reserved (0)
+    8       4     dim        number of vector components
+    12      4     scale      int8 dequantization scale (1.0 otherwise)
+    16      4     meta_len   bytes of metadata
+    20      ...   vector     dim * itemsize bytes
+    ...     ...   metadata   compact UTF-8 JSON
+
+Legacy plaintexts (JSON objects) are still accepted by unpack_vector();
+they are told apart by the magic bytes.
+
+Environment variables:
+ - VECTOR_FORMAT = "float32" (lossless, default), "float16" or "int8"
+"""
+
+MAGIC = b"ECXV"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sBBHIfI")
+
+DTYPES = {
+    "float32": (0, np.dtype("<f4")),
+    "float16": (1, np.dtype("<f2")),
+    "int8": (2, np.dtype("i1")),
+}
+_BY_CODE = {code: (name, dt) for name, (code, dt) in DTYPES.items()}
+
+VECTOR_FORMAT = os.getenv("VECTOR_FORMAT", "float32").lower()
+
+
+def pack_vector(vec, metadata: dict = None, dtype: str = None) -> bytes:
+    dtype = (dtype or VECTOR_FORMAT).lower()
+    if dtype not in DTYPES:
+        raise ValueError(f"unknown vector format '{dtype}'")
+    code, dt = DTYPES[dtype]
+
+    v = np.asarray(vec, dtype=np.float32).ravel()
+    scale = 1.0
+    if dtype == "int8":
+        peak = float(np.abs(v).max()) if v.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        body = np.clip(np.rint(v / scale), -127, 127).astype(dt).tobytes()
+    else:
+        body = v.astype(dt).tobytes()
+
+    meta = b""
+    if metadata:
+        meta = json.dumps(metadata, separators=(",", ":")).encode("utf-8")
+
+    return _HEADER.pack(MAGIC, VERSION, code, 0, v.size, scale, len(meta)) + body + meta
+
+
+def is_envelope(data: bytes) -> bool:
+    return data[:4] == MAGIC
+
+
+def unpack_vector(data: bytes) -> dict:
+    """Decode an envelope (or a legacy JSON plaintext) → {vector, metadata}."""
+    if not is_envelope(data):
+        obj = json.loads(data.decode("utf-8"))
+        return {"vector": obj.get("vector"), "metadata": obj.get("metadata", {})}
+
+    if len(data) < _HEADER.size:
+        raise ValueError("truncated envelope header")
+    magic, version, code, _flags, dim, scale, meta_len = _HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"unsupported envelope version {version}")
+    if code not in _BY_CODE:
+        raise ValueError(f"unknown envelope dtype {code}")
+
+    _, dt = _BY_CODE[code]
+    start = _HEADER.size
+    end = start + dim * dt.itemsize
+    if len(data) != end + meta_len:
+        raise ValueError("truncated envelope")
+
+    v = np.frombuffer(data, dtype=dt, count=dim, offset=start).astype(np.float32)
+    if code == DTYPES["int8"][0]:
+        v = v * np.float32(scale)
+
+    metadata = json.loads(data[end:].decode("utf-8")) if meta_len else {}
+    return {"vector": v.tolist(), "metadata": metadata}
@@ -0,0 +1,190 @@
+# hospital-agent/.../app/ingest_stream.py
+
+import os
+import json
+import time
+import hashlib
+from collections import deque
+
+"""
+Streaming, Resumable Ingestion
+------------------------------
+Reads an upload incrementally (INGEST_READ_CHUNK bytes at a time) and
+yields one Case per line, so memory stays bounded by
+(chunk + pipeline queues), not by the file size.
+
+Formats:
+ - csv    → one non-empty line = one case text   (legacy behaviour)
+ - jsonl  → one JSON object per line:
+              {"id": "...", "text": "...", "metadata": {...}}
+            `id` and `metadata` are optional
+
+Checkpoints (STATE_DIR/ingest-<tenant>-<job_id>.json):
+ - offset  → byte offset just past the last row of the last uploaded batch
+ - rows    → number of rows consumed up to `offset` (keeps generated ids stable)
+ - written atomically (tmp file + fsync + rename) after every batch
+ - other jobs reuse the same helpers with their own `kind` prefix
+   (e.g. rotate.py → STATE_DIR/rotate-<tenant>-<job_id>.json)
+
+Re-uploading the same file resumes from `offset`.  job_id defaults to
+a fingerprint of (filename, size, first MiB), so no client state is needed.
+
+Environment variables:
+ - STATE_DIR               = checkpoint directory (default /state)
+ - INGEST_READ_CHUNK       = bytes read per chunk (default 1 MiB)
+ - INGEST_MAX_LINE_BYTES   = reject lines longer than this (default 16 MiB)
+"""
+
+STATE_DIR = os.getenv("STATE_DIR", "/state")
+INGEST_READ_CHUNK = int(os.getenv("INGEST_READ_CHUNK", str(1024 * 1024)))
+INGEST_MAX_LINE_BYTES = int(os.getenv("INGEST_MAX_LINE_BYTES", str(16 * 1024 * 1024)))
+
+FORMATS = ("csv", "jsonl")
+
+
+def detect_format(filename: str, fmt: str = None) -> str:
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown format '{fmt}', expected one of {FORMATS}")
+        return fmt
+    name = (filename or "").lower()
+    return "jsonl" if name.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+async def fingerprint_upload(upload) -> tuple:
+    """Return (fingerprint, size) of an UploadFile without reading it all."""
+    upload.file.seek(0, os.SEEK_END)
+    size = upload.file.tell()
+    await upload.seek(0)
+    head = await upload.read(1024 * 1024)
+    await upload.seek(0)
+
+    h = hashlib.sha256()
+    h.update((upload.filename or "").encode("utf-8") + b"\0")
+    h.update(str(size).encode("ascii") + b"\0")
+    h.update(head)
+    return h.hexdigest()[:32], size
+
+
+# -------------------------------------------------------
+# CHECKPOINT STATE
+# -------------------------------------------------------
+def _state_path(job_id: str, tenant: str = None, kind: str = "ingest") -> str:
+    safe = "".join(ch for ch in job_id if ch.isalnum() or ch in "-_")
+    if not safe:
+        raise ValueError("invalid job_id")
+    name = f"{kind}-{tenant}-{safe}.json" if tenant else f"{kind}-{safe}.json"
+    return os.path.join(STATE_DIR, name)
+
+
+def load_checkpoint(job_id: str, tenant: str = None, kind: str = "ingest"):
+    try:
+        with open(_state_path(job_id, tenant, kind), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(state: dict):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = _state_path(state["job_id"], state.get("tenant"), state.get("kind", "ingest"))
+    tmp = path + ".tmp"
+    state["updated_at"] = time.time()
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# -------------------------------------------------------
+# UPLOAD SOURCE
+# -------------------------------------------------------
+class UploadSource:
+    """
+    Async iterator of Case objects read from an UploadFile, starting at a
+    byte offset.  Remembers each row's end offset until its batch is
+    committed, so commit(count) can advance the checkpoint.
+    """
+
+    def __init__(self, upload, fmt: str, make_case, size: int, offset: int = 0, rows: int = 0):
+        self.upload = upload
+        self.fmt = fmt
+        self.make_case = make_case      # (row_index, text, id, metadata) -> Case
+        self.size = size
+        self.start_offset = offset
+        self.rows = rows                # non-empty rows consumed so far
+        self.invalid = []               # first 1000 rejected rows
+        self.invalid_count = 0
+        self._pending = deque()         # (row_index, end_offset) awaiting commit
+
+    def _parse(self, row: int, line: bytes):
+        text = line.decode("utf-8").strip()
+        if self.fmt == "csv":
+            return self.make_case(row, text, None, None)
+
+        obj = json.loads(text)
+        if not isinstance(obj, dict) or not isinstance(obj.get("text"), str):
+            raise ValueError("expected an object with a 'text' field")
+        metadata = obj.get("metadata")
+        if metadata is not None and not isinstance(metadata, dict):
+            raise ValueError("'metadata' must be an object")
+        case_id = obj.get("id")
+        return self.make_case(row, obj["text"], None if case_id is None else str(case_id), metadata)
+
+    def _reject(self, row: int, error: str):
+        self.invalid_count += 1
+        if len(self.invalid) < 1000:
+            self.invalid.append({"row": row, "error": "invalid_row", "details": error})
+
+    async def __aiter__(self):
+        await self.upload.seek(self.start_offset)
+        buf = b""
+        buf_start = self.start_offset   # file offset of buf[0]
+        eof = False
+
+        while not eof:
+            chunk = await self.upload.read(INGEST_READ_CHUNK)
+            if chunk:
+                buf += chunk
+            else:
+                eof = True
+                buf += b"\n"     # final line without trailing newline
+
+            start = 0
+            while True:
+                nl = buf.find(b"\n", start)
+                if nl < 0:
+                    break
+                line = buf[start:nl]
+                end = min(buf_start + nl + 1, self.size)
+                start = nl + 1
+
+                if not line.strip():
+                    continue
+
+                row = self.rows
+                self.rows += 1
+                try:
+                    case = self._parse(row, line)
+                except (ValueError, UnicodeDecodeError) as e:
+                    self._reject(row, str(e))
+                    continue
+                self._pending.append((row, end))
+                yield case
+
+            buf = buf[start:]
+            buf_start += start
+            if len(buf) > INGEST_MAX_LINE_BYTES:
+                raise ValueError(f"line at offset {buf_start} exceeds INGEST_MAX_LINE_BYTES")
+
+    def commit(self, count: int):
+        """
+        Mark the next `count` yielded rows as uploaded.
+        Returns (offset, rows) safe to checkpoint.
+        """
+        row, offset = None, None
+        for _ in range(count):
+            row, offset = self._pending.popleft()
+        return offset, row + 1
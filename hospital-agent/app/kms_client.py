@@ -0,0 +1,126 @@
+# hospital-agent/app/kms_client.py
+import os
+import time
+import threading
+
+"""
+KMS Key Loader for Hospital Agent
+---------------------------------
+Supports:
+ - FILE MODE   → load key from local mounted path
+ - KMS MODE    → simulated KMS fetch (can later be replaced by AWS/GCP/Azure SDK)
+
+Environment variables:
+ - KEY_MODE        = "file" or "kms"
+ - FILE_KEY_PATH   = path to local key file
+ - KMS_KEY_PATH    = simulated KMS mount path
+
+Arguments override the environment, so a multi-tenant agent can fetch
+one key per tenant (see tenants.py).
+
+Master key caching (envelope encryption, see data_keys.py):
+ - get_key() serves the master key from memory for KMS_CACHE_TTL seconds,
+   then fetches it again; a failed refresh keeps the cached key and is
+   retried after KMS_RETRY_SECONDS
+ - every real fetch (KMS call) is counted, see stats(), so KMS traffic can be checked
+   to stay O(1) per TTL period rather than O(records)
+
+ - KMS_CACHE_TTL       = seconds a fetched master key is reused (default 3600, 0 = no cache)
+ - KMS_RETRY_SECONDS   = back-off after a failed refresh (default 30)
+"""
+
+KMS_CACHE_TTL = float(os.getenv("KMS_CACHE_TTL", "3600"))
+KMS_RETRY_SECONDS = float(os.getenv("KMS_RETRY_SECONDS", "30"))
+
+_cache = {}     # (mode, path) → (key, expires_at)
+_lock = threading.Lock()
+_stats = {"calls": 0, "cache_hits": 0, "refresh_failures": 0}
+
+def fetch_key(mode: str = None, file_path: str = None, kms_path: str = None):
+    mode = (mode or os.getenv("KEY_MODE", "file")).lower()
+
+    with _lock:
+        _stats["calls"] += 1
+
+    if mode == "file":
+        key = _load_from_file(file_path)
+
+    elif mode == "kms":
+        key = _load_from_kms(kms_path)
+
+    else:
+        raise RuntimeError(f"Invalid KEY_MODE '{mode}', expected 'file' or 'kms'")
+
+    return key
+
+
+# ---------------------------------------------------------
+# CACHED MASTER KEY (TTL)
+# ---------------------------------------------------------
+def get_key(mode: str = None, file_path: str = None, kms_path: str = None):
+    """fetch_key() behind a TTL cache, one entry per (mode, path)."""
+    mode = (mode or os.getenv("KEY_MODE", "file")).lower()
+    slot = (mode, kms_path if mode == "kms" else file_path)
+    now = time.monotonic()
+
+    with _lock:
+        cached = _cache.get(slot)
+        if cached is not None and now < cached[1]:
+            _stats["cache_hits"] += 1
+            return cached[0]
+
+    try:
+        key = fetch_key(mode=mode, file_path=file_path, kms_path=kms_path)
+    except Exception:
+        if cached is None:
+            raise
+        # keep serving the cached master key until the KMS is back
+        with _lock:
+            _stats["refresh_failures"] += 1
+            _cache[slot] = (cached[0], now + KMS_RETRY_SECONDS)
+        return cached[0]
+
+    if KMS_CACHE_TTL > 0:
+        with _lock:
+            _cache[slot] = (key, now + KMS_CACHE_TTL)
+    return key
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+
+def stats() -> dict:
+    with _lock:
+        return {**_stats, "cached_keys": len(_cache), "ttl_seconds": KMS_CACHE_TTL}
+
+
+# ---------------------------------------------------------
+# FILE MODE
+# ---------------------------------------------------------
+def _load_from_file(path: str = None):
+    path = path or os.getenv("FILE_KEY_PATH", "/keys/hospital_a.key")
+
+    if not os.path.exists(path):
+        raise RuntimeError(f"[FILE MODE] Key not found at {path}")
+
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# ---------------------------------------------------------
+# SIMULATED KMS MODE
+# ---------------------------------------------------------
+def _load_from_kms(path: str = None):
+    """
+    This simulates a cloud KMS by reading from a mounted secret path.
+    Replace this logic later with AWS KMS / GCP KMS / Azure Key Vault.
+    """
+    path = path or os.getenv("KMS_KEY_PATH", "/keys_kms/hospital_a.key")
+
+    if not os.path.exists(path):
+        raise RuntimeError(f"[KMS MODE] KMS key not found at {path}")
+
+    with open(path, "rb") as f:
+        return f.read()
\ No newline at end of file
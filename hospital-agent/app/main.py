@@ -0,0 +1,672 @@
+import os
+import time
+
+_STARTED = time.perf_counter()   # module import → startup/ready timings
+
+import json
+import asyncio
+import requests
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Depends, FastAPI, UploadFile, File, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+# Encryption + utilities
+from .crypto import engine as crypto_engine
+from .data_keys import encrypt_blob, encrypt_vector, encrypt_vectors
+from . import data_keys, kms_client
+from .utils import load_example
+
+# Tenants (per-hospital keys, shared model)
+from .tenants import Tenant, TenantRegistry
+
+# Embeddings
+from .embeddings import embed_texts, embed_texts_async, embedding_version, load_backend, pool_pending, warm_up
+from .embed_cache import embedding_cache
+from .embed_pool import embed_pool
+
+# Durable upload outbox
+from .outbox import OUTBOX, outbox
+
+# Delta ingestion manifest
+from .manifest import MANIFEST, content_hash, manifest
+
+# Pipelined batch ingestion
+from .pipeline import run_pipeline
+
+# Streaming, resumable uploads
+from .ingest_stream import (
+    UploadSource, detect_format, fingerprint_upload, load_checkpoint, save_checkpoint,
+)
+
+# Binary vector envelope
+from .envelope import VECTOR_FORMAT, VERSION as ENVELOPE_VERSION, pack_vector
+
+# Keyed search transform
+from .transform import SEARCH_MODE, transform_vector, transform_vectors, keyed_search_enabled
+
+CYBORG_PROXY_URL = os.getenv('CYBORG_PROXY_URL', 'http://cyborg-proxy:8000')
+KEY_PATH = os.getenv('KEY_PATH', '/keys/hospital_a.key')
+HOSPITAL_NAME = os.getenv('HOSPITAL_NAME', 'HospitalA')
+
+# single tenant (HOSPITAL_NAME) unless TENANTS_CONFIG lists several
+tenants = TenantRegistry.from_env(HOSPITAL_NAME, KEY_PATH)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # serve immediately; key + model load and warm up in the background
+    readiness["timings"]["startup_seconds"] = round(time.perf_counter() - _STARTED, 3)
+    task = asyncio.create_task(warm_start())
+    if OUTBOX:
+        # a dead record was never delivered: forget its manifest hash
+        outbox.start(send_from_outbox, on_dead=manifest.remove if MANIFEST else None)
+    yield
+    task.cancel()
+    await asyncio.to_thread(outbox.stop)
+    await asyncio.to_thread(embed_pool.stop)
+    crypto_engine.shutdown()
+
+
+app = FastAPI(
+    title=f"{HOSPITAL_NAME} Agent",
+    description="Encrypted hospital-side agent for secure clinical data ingestion",
+    version="1.0.0",
+    lifespan=lifespan,
+)
+
+# -------------------------------------------------------
+# SYSTEM ENDPOINTS
+# -------------------------------------------------------
+@app.get("/", tags=["System"])
+def root():
+    return {
+        "service": f"{HOSPITAL_NAME} Agent",
+        "role": "Encrypted data producer",
+        "health": "/health",
+        "ready": "/ready",
+        "tenants": tenants.names(),
+    }
+
+
+@app.get("/health", tags=["System"])
+def health():
+    return {
+        "status": "ok",
+        "service": HOSPITAL_NAME,
+    }
+
+
+@app.get("/ready", tags=["System"])
+def ready():
+    """
+    200 once the model is loaded and warmed up and at least one tenant's
+    key is loaded, 503 before.  `tenants` reports each tenant's key;
+    failed keys are retried (with back-off) on every probe.
+    """
+    keys = tenants.key_status(retry=True)
+    readiness["key"] = all(keys.values())
+    ok = readiness["model"] and readiness["warm"] and any(keys.values())
+    body = {"ready": ok, "service": HOSPITAL_NAME, **readiness, "tenants": keys}
+    if ok:
+        return body
+    return JSONResponse(status_code=503, content=body)
+
+
+@app.get("/tenants/{name}/ready", tags=["System"])
+def tenant_ready(name: str):
+    """Per-tenant readiness: model warm and this tenant's key loaded."""
+    try:
+        tenant = tenants.get(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant '{name}'")
+    ok = readiness["model"] and readiness["warm"] and tenant.retry_key()
+    body = {"ready": ok, **tenant.describe()}
+    if ok:
+        return body
+    return JSONResponse(status_code=503, content=body)
+
+
+@app.get("/tenants", tags=["System"])
+def list_tenants():
+    return tenants.describe()
+
+
+@app.get("/embed_cache/stats", tags=["System"])
+def embed_cache_stats():
+    """Hit rates and sizes of the local embedding cache."""
+    return embedding_cache.stats()
+
+
+@app.get("/embed_pool/stats", tags=["System"])
+def embed_pool_stats():
+    return embed_pool.stats()
+
+
+@app.get("/outbox/stats", tags=["System"])
+def outbox_stats():
+    """Pending / dead records and sender counters of the upload outbox."""
+    return outbox.stats()
+
+
+@app.get("/manifest/stats", tags=["System"])
+def manifest_stats():
+    return manifest.stats()
+
+
+@app.get("/kms/stats", tags=["System"])
+def kms_stats():
+    """KMS calls vs master key cache hits, and local data key derivations."""
+    return {"kms": kms_client.stats(), "data_keys": data_keys.stats()}
+
+
+@app.delete("/embed_cache", tags=["System"])
+def embed_cache_clear():
+    embedding_cache.clear()
+    return {"status": "cleared"}
+
+# -------------------------------------------------------
+# AUTHENTICATED POST TO PROXY (Option B)
+# -------------------------------------------------------
+def post_to_proxy(payload, tenant: Tenant):
+    proxy_url = os.getenv("CYBORG_PROXY_URL", "http://cyborg-proxy:8000")
+
+    r = requests.post(
+        f"{proxy_url}/store_blob",
+        json=payload,
+        headers=tenant.auth_headers(),
+        timeout=10,
+    )
+    r.raise_for_status()
+    return r
+
+
+# keep-alive session for batch uploads
+_proxy_session = requests.Session()
+
+
+def post_batch_to_proxy(records: list, tenant: Tenant) -> list:
+    """
+    Send a batch of encrypted records via /store_batch.
+    Returns per-record statuses from the proxy.
+    """
+    proxy_url = os.getenv("CYBORG_PROXY_URL", "http://cyborg-proxy:8000")
+
+    r = _proxy_session.post(
+        f"{proxy_url}/store_batch",
+        json={"hospital": tenant.name, "records": records},
+        headers=tenant.auth_headers(),
+        timeout=60,
+    )
+    r.raise_for_status()
+    return r.json()["results"]
+
+
+def send_from_outbox(tenant_name: str, records: list) -> list:
+    """Outbox sender callback: records were encrypted with this tenant's key."""
+    return post_batch_to_proxy(records, tenants.get(tenant_name))
+
+
+def post_delete_to_proxy(case_ids: list, tenant: Tenant) -> dict:
+    """Tombstone many cases of this tenant via /delete_batch."""
+    proxy_url = os.getenv("CYBORG_PROXY_URL", "http://cyborg-proxy:8000")
+
+    r = _proxy_session.post(
+        f"{proxy_url}/delete_batch",
+        json={"hospital": tenant.name, "case_ids": case_ids},
+        headers=tenant.auth_headers(),
+        timeout=60,
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+# -------------------------------------------------------
+# KEY LOADING (FILE OR KMS, PER TENANT) + MODEL WARM-UP, IN BACKGROUND
+# -------------------------------------------------------
+readiness = {
+    "key": False,
+    "model": False,
+    "warm": False,
+    "error": None,
+    "timings": {},
+}
+
+
+async def warm_start():
+    timings = readiness["timings"]
+
+    # every tenant's key; a tenant that fails is retried later (Tenant.key,
+    # /ready) and must not keep the model from loading for the others
+    t0 = time.perf_counter()
+    keys = await asyncio.to_thread(tenants.load_keys)
+    timings["key_seconds"] = round(time.perf_counter() - t0, 3)
+    readiness["key"] = all(keys.values())
+
+    steps = (
+        ("model", load_backend),    # in-process or every pool worker
+        ("warm", warm_up),          # first forward pass
+    )
+    try:
+        for name, fn in steps:
+            t0 = time.perf_counter()
+            await asyncio.to_thread(fn)
+            timings[f"{name}_seconds"] = round(time.perf_counter() - t0, 3)
+            readiness[name] = True
+        timings["ready_seconds"] = round(time.perf_counter() - _STARTED, 3)
+    except Exception as e:
+        readiness["error"] = f"{name}: {e}"
+
+
+def current_tenant(request: Request, x_tenant: str = Header(None)) -> Tenant:
+    """
+    Resolve the tenant from /tenants/{tenant}/... or the X-Tenant header
+    (default tenant otherwise); 503 until its key is loaded (a failed
+    load is retried with back-off on later requests).
+    """
+    name = request.path_params.get("tenant") or x_tenant
+    try:
+        tenant = tenants.get(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant '{name}'")
+    if tenant.key is None:
+        raise HTTPException(status_code=503, detail=f"Agent not ready: key for '{tenant.name}' not loaded")
+    return tenant
+
+
+def embeddings_ready():
+    """503 while the embedding pool starts (the parent must not load its own model)."""
+    if pool_pending():
+        raise HTTPException(status_code=503, detail="Agent not ready: embedding pool is starting")
+
+
+# tenant-scoped endpoints, mounted at / and at /tenants/{tenant}
+router = APIRouter()
+
+
+# -------------------------------------------------------
+# MODELS
+# -------------------------------------------------------
+class Case(BaseModel):
+    id: str
+    text: str
+    metadata: dict = Field(default_factory=dict)
+
+
+# -------------------------------------------------------
+# DELTA INGESTION (MANIFEST VERSIONS + SNAPSHOT DELETES)
+# -------------------------------------------------------
+# the example is stored as an encrypted JSON blob, no embedding
+EXAMPLE_VERSION = f"example-json|v{ENVELOPE_VERSION}"
+
+
+def manifest_version() -> str:
+    """Anything that changes the stored record forces a re-ingest."""
+    return f"{embedding_version()}|{VECTOR_FORMAT}|v{ENVELOPE_VERSION}|{SEARCH_MODE}"
+
+
+def sync_deletes(tenant: Tenant, job_id: str, chunk_size: int = 500) -> dict:
+    """
+    Tombstone every case of the tenant that the completed snapshot job
+    did not contain.  Failed chunks stay in the manifest and are retried
+    by the next sync.
+    """
+    stale = manifest.stale(tenant.name, job_id)
+    result = {"deleted": 0, "missing": 0, "delete_failed": 0}
+
+    for start in range(0, len(stale), chunk_size):
+        chunk = stale[start:start + chunk_size]
+        # a queued upsert must not resurrect the case after its tombstone
+        outbox.discard(tenant.name, chunk)
+        try:
+            r = post_delete_to_proxy(chunk, tenant)
+        except Exception as e:
+            result["delete_failed"] += len(chunk)
+            result["delete_error"] = str(e)
+            continue
+        manifest.remove(tenant.name, chunk)
+        result["deleted"] += r["deleted"]
+        result["missing"] += len(r["missing"])
+
+    return result
+
+
+# -------------------------------------------------------
+# INGEST EXAMPLE (AUTH + ENCRYPT + POST)
+# -------------------------------------------------------
+@router.post("/ingest_example", tags=["Ingest"])
+def ingest_example(full: bool = False, tenant: Tenant = Depends(current_tenant)):
+
+    # 1) Load plaintext example JSON (from /examples)
+    plain = load_example(tenant.example_path)
+    case_id = plain.get("case_id", "case-001")
+
+    # 2) Skip if this exact example was already delivered
+    digest = {case_id: content_hash(json.dumps(plain, sort_keys=True, default=str))}
+    if MANIFEST and not full and manifest.unchanged(tenant.name, digest, EXAMPLE_VERSION):
+        return {"status": "unchanged", "sent_to_proxy": False, "case_id": case_id, "skipped": 1}
+
+    # 3) Use the tenant's already-loaded key (file or kms)
+    key = tenant.key
+
+    # 4) Encrypt example
+    enc = encrypt_blob(key, plain, case_id)
+
+    record = {"case_id": case_id, "enc_blob": enc}
+
+    # 5) Queue for the background sender (durable; a dead record drops
+    #    its manifest hash), or send to the proxy with the ADMIN TOKEN
+    if OUTBOX:
+        outbox.enqueue(tenant.name, [record])
+        if MANIFEST:
+            manifest.record(tenant.name, digest, EXAMPLE_VERSION)
+        return {"status": "queued", "sent_to_proxy": False, "hospital": tenant.name, "case_id": case_id}
+
+    r = post_to_proxy({"hospital": tenant.name, **record}, tenant)
+
+    if MANIFEST:
+        manifest.record(tenant.name, digest, EXAMPLE_VERSION)
+
+    return {
+        "status": "ok",
+        "sent_to_proxy": True,
+        "proxy_response": r.json(),
+    }
+
+
+# -------------------------------------------------------
+# RECORD BUILDING (ENCRYPT + KEYED TRANSFORM)
+# -------------------------------------------------------
+def build_record(tenant: Tenant, case: Case, vec, search_vector=None, enc_blob=None) -> dict:
+    """
+    Encrypt one embedded case into a store record:
+    { case_id, enc_blob, search_vector? }
+    """
+    if enc_blob is None:
+        enc_blob = encrypt_vector(tenant.key, pack_vector(vec, case.metadata), case.id)
+
+    record = {
+        "case_id": case.id,
+        "enc_blob": enc_blob,
+    }
+
+    if keyed_search_enabled():
+        record["search_vector"] = (
+            search_vector if search_vector is not None else transform_vector(tenant.key, vec)
+        )
+
+    return record
+
+
+def build_records(tenant: Tenant, cases: list, vectors: list) -> list:
+    """
+    Bulk variant: one keyed transform (matrix product) and one batch
+    AES-GCM call (crypto engine) per batch.
+    """
+    search_vectors = transform_vectors(tenant.key, vectors) if keyed_search_enabled() else [None] * len(cases)
+    blobs = encrypt_vectors(
+        tenant.key,
+        [pack_vector(vec, case.metadata) for case, vec in zip(cases, vectors)],
+        [case.id for case in cases],
+    )
+    return [
+        build_record(tenant, case, vec, sv, blob)
+        for case, vec, sv, blob in zip(cases, vectors, search_vectors, blobs)
+    ]
+
+
+# -------------------------------------------------------
+# INGEST SINGLE CASE
+# -------------------------------------------------------
+@router.post("/ingest_case", tags=["Ingest"], dependencies=[Depends(embeddings_ready)])
+async def ingest_case(case: Case, tenant: Tenant = Depends(current_tenant)):
+    try:
+        # 1) Embed text
+        embs = await embed_texts_async([case.text])
+        vec = embs[0]
+
+        # 2-3) Encrypt payload (+ keyed search transform)
+        record = build_record(tenant, case, vec)
+
+        # 4) Queue for the background sender (durable), or send directly
+        if OUTBOX:
+            await asyncio.to_thread(outbox.enqueue, tenant.name, [record])
+            return {"status": "queued", "hospital": tenant.name, "case_id": case.id}
+
+        r = await asyncio.to_thread(post_to_proxy, {"hospital": tenant.name, **record}, tenant)
+        return r.json()
+
+    except Exception as e:
+        return {
+            "error": "proxy_store_failed",
+            "details": str(e),
+        }
+
+
+# -------------------------------------------------------
+# INGEST BATCH CSV
+# -------------------------------------------------------
+@router.post("/ingest_csv", tags=["Ingest"], dependencies=[Depends(embeddings_ready)])
+async def ingest_csv(
+    file: UploadFile = File(...),
+    batch_size: int = None,
+    format: str = None,
+    job_id: str = None,
+    restart: bool = False,
+    full: bool = False,
+    sync: bool = False,
+    tenant: Tenant = Depends(current_tenant),
+):
+    """
+    Streaming, batched + pipelined ingestion.
+
+    - csv   → one line = one case
+    - jsonl → {"id", "text", "metadata"} per line
+
+    Progress is checkpointed after every uploaded batch; re-posting the
+    same file (or the same job_id) resumes from the last committed offset.
+    Once the job completed, a re-post is diffed again (manifest on) or
+    answered with already_completed (manifest off).
+    A transport error (proxy or outbox unreachable) interrupts the job at
+    the last good batch instead of recording its rows as failed.
+    With the outbox on, "uploaded" means durably queued for the sender.
+
+    Delta ingestion (manifest on): rows whose content hash and model /
+    format version are unchanged since the last delivery are skipped.
+    full=true re-processes every row; sync=true treats the file as a
+    full snapshot and tombstones cases that are no longer in it.
+    """
+    try:
+        fmt = detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    fingerprint, size = await fingerprint_upload(file)
+    job_id = job_id or fingerprint
+
+    try:
+        state = None if restart else load_checkpoint(job_id, tenant.name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if state is not None and state.get("fingerprint") != fingerprint:
+        raise HTTPException(status_code=409, detail=f"job '{job_id}' belongs to a different file")
+
+    if state is not None and state.get("status") == "completed":
+        if not MANIFEST:
+            return {"job_id": job_id, "status": "completed", "already_completed": True, "job": state}
+        # with the manifest a re-post is re-diffed (unchanged rows are
+        # skipped anyway): an older snapshot posted again after a newer
+        # one is the source's current state and must be synced as such
+        state = None
+
+    if state is None:
+        state = {
+            "job_id": job_id,
+            "tenant": tenant.name,
+            "filename": file.filename,
+            "format": fmt,
+            "fingerprint": fingerprint,
+            "size": size,
+            "offset": 0,
+            "rows": 0,
+            "stored": 0,
+            "failed": 0,
+            "skipped": 0,
+            "batches": 0,
+            "full": full,
+            "sync": sync,
+            "status": "running",
+            "started_at": time.time(),
+        }
+    resumed_from = state["offset"]
+    state["status"] = "running"
+    # a resumed job keeps the mode it was started with
+    full, sync = state.get("full", full), state.get("sync", sync)
+
+    version = await asyncio.to_thread(manifest_version) if MANIFEST else None
+    pending = {}    # case_id → content hash, for rows in flight
+
+    def make_case(row, text, case_id, metadata):
+        return Case(
+            id=case_id or f"{tenant.name}-{row}",
+            text=text,
+            metadata=metadata or {},
+        )
+
+    source = UploadSource(file, fmt, make_case, size, offset=state["offset"], rows=state["rows"])
+
+    def select(batch):
+        # every row is stamped as seen by this job, changed or not
+        hashes = {c.id: content_hash(c.text, c.metadata) for c in batch}
+        same = manifest.unchanged(tenant.name, hashes, version, job_id)
+        todo = [c for c in batch if full or c.id not in same]
+        pending.update((c.id, hashes[c.id]) for c in todo)
+        return todo
+
+    def checkpoint(batch, statuses):
+        failures = [s for s in statuses if "error" in s or s.get("status") == "rejected"]
+        failed_ids = {s.get("case_id") for s in failures}
+        sent = {c.id: pending.pop(c.id) for c in batch if c.id in pending} if MANIFEST else None
+        if MANIFEST:
+            # only delivered rows are recorded; failures retry next run
+            manifest.record(
+                tenant.name,
+                {case_id: digest for case_id, digest in sent.items() if case_id not in failed_ids},
+                version,
+                job_id,
+            )
+            if OUTBOX:
+                # a row the sender already marked dead must not stay recorded
+                # (later ones are forgotten through outbox on_dead)
+                dead = outbox.dead(tenant.name, list(sent))
+                if dead:
+                    manifest.remove(tenant.name, dead)
+        processed = len(sent) if MANIFEST else len(batch)
+        state["offset"], state["rows"] = source.commit(len(batch))
+        state["stored"] += processed - len(failures)
+        state["failed"] += len(failures)
+        state["skipped"] = state.get("skipped", 0) + len(batch) - processed
+        state["batches"] += 1
+        save_checkpoint(state)
+
+    try:
+        summary = await run_pipeline(
+            source,
+            embed_fn=embed_texts,
+            encrypt_fn=lambda cases, vectors: build_records(tenant, cases, vectors),
+            upload_fn=(
+                (lambda records: outbox.enqueue(tenant.name, records)) if OUTBOX
+                else (lambda records: post_batch_to_proxy(records, tenant))
+            ),
+            batch_size=batch_size,
+            on_commit=checkpoint,
+            filter_fn=select if MANIFEST else None,
+        )
+    except Exception as e:
+        state["status"] = "interrupted"
+        state["error"] = str(e)
+        save_checkpoint(state)
+        return {
+            "error": "ingest_interrupted",
+            "details": str(e),
+            "job_id": job_id,
+            "resume_offset": state["offset"],
+        }
+
+    state["offset"] = size
+    state["rows"] = source.rows
+
+    # snapshot sync: only after a clean pass, or unparsed rows would
+    # look like deleted cases
+    deletes = None
+    if sync and MANIFEST:
+        if source.invalid_count or state["failed"]:
+            deletes = {"skipped": "job had invalid or failed rows"}
+        else:
+            deletes = await asyncio.to_thread(sync_deletes, tenant, job_id)
+        state["deletes"] = deletes
+
+    state["status"] = "completed"
+    state.pop("error", None)
+    save_checkpoint(state)
+
+    return {
+        "job_id": job_id,
+        "format": fmt,
+        "resumed_from": resumed_from,
+        "delivery": "queued" if OUTBOX else "direct",
+        **summary,
+        "invalid": source.invalid_count,
+        "invalid_rows": source.invalid,
+        "deletes": deletes,
+        "job": state,
+    }
+
+
+@router.get("/ingest_jobs/{job_id}", tags=["Ingest"])
+def ingest_job(job_id: str, tenant: Tenant = Depends(current_tenant)):
+    """Checkpoint state of a streaming ingestion job."""
+    try:
+        state = load_checkpoint(job_id, tenant.name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if state is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return state
+
+
+class RequeueRequest(BaseModel):
+    case_ids: list = None   # None = every dead record of the tenant
+
+
+@router.post("/outbox/requeue", tags=["Ingest"])
+def outbox_requeue(req: RequeueRequest = None, tenant: Tenant = Depends(current_tenant)):
+    """
+    Put dead outbox records (rejected by the proxy, or out of attempts)
+    back in the send queue, e.g. after fixing the index configuration.
+    """
+    if not OUTBOX:
+        raise HTTPException(status_code=409, detail="outbox is off")
+    case_ids = req.case_ids if req is not None else None
+    return {"requeued": outbox.requeue(tenant.name, case_ids)}
+
+@router.post("/encrypt_query", dependencies=[Depends(embeddings_ready)])
+async def encrypt_query(text: str, tenant: Tenant = Depends(current_tenant)):
+    """
+    Embed + encrypt clinician query.
+    Plaintext NEVER leaves hospital boundary.
+    """
+    emb = (await embed_texts_async([text]))[0]
+
+    vec_bytes = pack_vector(emb)
+    enc = encrypt_vector(tenant.key, vec_bytes)
+
+    # Keyed transform travels alongside the ciphertext
+    if keyed_search_enabled():
+        enc["search_vector"] = transform_vector(tenant.key, emb)
+
+    return enc
+
+
+app.include_router(router)
+app.include_router(router, prefix="/tenants/{tenant}")
@@ -0,0 +1,172 @@
+# hospital-agent/.../app/manifest.py
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+"""
+Ingestion Manifest (delta ingestion)
+------------------------------------
+Per tenant, the agent remembers what it last delivered for every case:
+
+    (tenant, case_id) → content_hash, version, last_seen_job
+
+ - content_hash = SHA-256(text + "\\0" + canonical JSON metadata)
+ - version      = embedding model + vector format + envelope version +
+                  search mode; a change re-processes every case
+
+Re-ingesting a nightly export only embeds, encrypts and uploads rows
+whose hash or version changed; unchanged rows are skipped before the
+model is called.  Hashes are recorded only after a batch is committed
+(uploaded or durably queued), so a failed upload is retried next run.
+
+Snapshot sync: every row of a job stamps last_seen_job; once the job
+completes, cases of the tenant not seen by it were deleted at the
+source and get tombstoned in the store (see main.ingest_csv).  Cases
+recorded outside any job (e.g. /ingest_example) are never part of a
+snapshot and are left alone.
+
+The manifest holds hashes only, never plaintext.
+
+Environment variables:
+ - MANIFEST       = "on" / "off" (default on)
+ - MANIFEST_PATH  = SQLite file (default /state/manifest.sqlite)
+"""
+
+MANIFEST = os.getenv("MANIFEST", "on").lower() not in ("off", "0", "false")
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", "/state/manifest.sqlite")
+
+# SQLite bound-parameter limit safety margin
+_CHUNK = 500
+
+
+def content_hash(text: str, metadata: dict = None) -> str:
+    meta = json.dumps(metadata or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8") + b"\0" + meta.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+
+        self.checked = 0
+        self.skipped = 0
+        self.recorded = 0
+        self.removed = 0
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS manifest ("
+                " tenant TEXT NOT NULL, case_id TEXT NOT NULL,"
+                " content_hash TEXT NOT NULL, version TEXT NOT NULL,"
+                " last_seen_job TEXT, updated REAL NOT NULL,"
+                " PRIMARY KEY (tenant, case_id))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS manifest_seen ON manifest(tenant, last_seen_job)")
+            self._db = db
+        return self._db
+
+    # -------------------------------------------------
+    # Delta check / record
+    # -------------------------------------------------
+    def unchanged(self, tenant: str, hashes: dict, version: str, job: str = None) -> set:
+        """
+        hashes = {case_id: content_hash}.  Returns the case ids whose
+        stored hash and version match.  With a job, every known case of
+        the batch is stamped as seen by it (changed or not).
+        """
+        ids = list(hashes)
+        same = set()
+        with self._lock:
+            db = self._conn()
+            for start in range(0, len(ids), _CHUNK):
+                chunk = ids[start:start + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows = db.execute(
+                    f"SELECT case_id, content_hash, version FROM manifest"
+                    f" WHERE tenant = ? AND case_id IN ({marks})",
+                    [tenant, *chunk],
+                ).fetchall()
+                same.update(
+                    case_id for case_id, digest, ver in rows
+                    if ver == version and digest == hashes[case_id]
+                )
+                if job is not None and rows:
+                    db.executemany(
+                        "UPDATE manifest SET last_seen_job = ? WHERE tenant = ? AND case_id = ?",
+                        [(job, tenant, case_id) for case_id, _, _ in rows],
+                    )
+            db.commit()
+            self.checked += len(ids)
+            self.skipped += len(same)
+        return same
+
+    def record(self, tenant: str, hashes: dict, version: str, job: str = None):
+        """Remember delivered cases ({case_id: content_hash})."""
+        if not hashes:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            db.executemany(
+                "INSERT OR REPLACE INTO manifest"
+                " (tenant, case_id, content_hash, version, last_seen_job, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(tenant, case_id, digest, version, job, now) for case_id, digest in hashes.items()],
+            )
+            db.commit()
+            self.recorded += len(hashes)
+
+    # -------------------------------------------------
+    # Snapshot sync (deletes)
+    # -------------------------------------------------
+    def stale(self, tenant: str, job: str) -> list:
+        """Case ids of the tenant, recorded by some job, that the given job did not see."""
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT case_id FROM manifest WHERE tenant = ?"
+                " AND last_seen_job IS NOT NULL AND last_seen_job != ? ORDER BY case_id",
+                (tenant, job),
+            ).fetchall()
+        return [case_id for (case_id,) in rows]
+
+    def remove(self, tenant: str, case_ids: list):
+        with self._lock:
+            db = self._conn()
+            db.executemany(
+                "DELETE FROM manifest WHERE tenant = ? AND case_id = ?",
+                [(tenant, case_id) for case_id in case_ids],
+            )
+            db.commit()
+            self.removed += len(case_ids)
+
+    # -------------------------------------------------
+    # Metrics
+    # -------------------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn().execute(
+                "SELECT tenant, COUNT(*) FROM manifest GROUP BY tenant"
+            ).fetchall())
+        return {
+            "enabled": MANIFEST,
+            "cases": counts,
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "recorded": self.recorded,
+            "removed": self.removed,
+            "path": self.path,
+        }
+
+
+manifest = Manifest()
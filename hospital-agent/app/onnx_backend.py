@@ -0,0 +1,248 @@
+# hospital-agent/.../app/onnx_backend.py
+
+import os
+import json
+import time
+import numpy as np
+
+"""
+ONNX Runtime Embedding Backend (int8, CPU)
+------------------------------------------
+Selected with EMBED_BACKEND=onnx (see embeddings.py).
+
+On first use the SentenceTransformer model is exported once:
+
+    ONNX_MODEL_DIR/
+        model.onnx         → fp32 export of the transformer
+        model.int8.onnx    → dynamic int8 quantization (weights int8)
+        tokenizer files
+        backend.json       → pooling, normalize, max_seq_length, parity
+
+Inference = batched fast tokenizer → ONNX Runtime → pooling (+ L2 norm),
+reproducing the SentenceTransformer pipeline without PyTorch.
+
+Texts are sorted by length before batching so each batch pads to a
+similar length.  The session uses a capped intra-op thread pool.
+
+Parity: right after export both backends embed a probe set; if the
+minimum cosine similarity is below ONNX_PARITY_MIN the export is
+rejected and the agent stays on PyTorch.
+
+Environment variables:
+ - ONNX_MODEL_DIR    = export directory (default /state/onnx/<model>)
+ - ONNX_QUANTIZE     = "int8" (default) or "none"
+ - ONNX_THREADS      = intra-op threads (default min(4, cpu count))
+ - ONNX_BATCH_SIZE   = texts per session.run (default 64)
+ - ONNX_PARITY_MIN   = minimum cosine vs PyTorch (default 0.99)
+"""
+
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "int8").lower()
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", str(min(4, os.cpu_count() or 1))))
+ONNX_BATCH_SIZE = int(os.getenv("ONNX_BATCH_SIZE", "64"))
+ONNX_PARITY_MIN = float(os.getenv("ONNX_PARITY_MIN", "0.99"))
+
+PARITY_TEXTS = [
+    "Elderly patient with chest pain radiating to the left arm",
+    "Type 2 diabetes with poorly controlled HbA1c",
+    "Pediatric asthma exacerbation after viral infection",
+    "Post-operative fever on day three after hip replacement",
+    "Chronic kidney disease stage 4, awaiting dialysis",
+    "Headache",
+    "Patient presents with shortness of breath, bilateral leg swelling and "
+    "orthopnea; history of hypertension and previous myocardial infarction.",
+    "No acute distress.",
+]
+
+
+def default_model_dir(model_name: str) -> str:
+    safe = model_name.replace("/", "__")
+    return os.getenv("ONNX_MODEL_DIR", os.path.join("/state/onnx", safe))
+
+
+def _cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return (a * b).sum(axis=1)
+
+
+# -------------------------------------------------------
+# EXPORT (requires torch, runs once)
+# -------------------------------------------------------
+def export_model(st_model, model_dir: str) -> dict:
+    """
+    Export a SentenceTransformer to ONNX (+ int8 quantization) and
+    write backend.json.  Returns the backend config.
+    """
+    import torch
+
+    transformer = st_model[0]
+    pooling = st_model[1]
+    normalize = any(type(m).__name__ == "Normalize" for m in st_model)
+
+    # sentence-transformers >= 3 exposes `pooling_mode`, older releases use flags
+    mode = getattr(pooling, "pooling_mode", None)
+    if mode in ("mean", "cls"):
+        pooling_mode = mode
+    elif getattr(pooling, "pooling_mode_mean_tokens", False):
+        pooling_mode = "mean"
+    elif getattr(pooling, "pooling_mode_cls_token", False):
+        pooling_mode = "cls"
+    else:
+        raise RuntimeError("ONNX backend supports mean or CLS pooling only")
+
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(model_dir)
+
+    sample = tokenizer(["export probe"], padding=True, return_tensors="pt")
+    input_names = list(sample.keys())
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *args):
+            return self.model(**dict(zip(input_names, args))).last_hidden_state
+
+    encoder = _Encoder(transformer.auto_model).eval()
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    dynamic = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            encoder,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=17,
+            dynamo=False,
+        )
+
+    model_file = "model.onnx"
+    if ONNX_QUANTIZE == "int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            fp32_path,
+            os.path.join(model_dir, "model.int8.onnx"),
+            weight_type=QuantType.QInt8,
+        )
+        model_file = "model.int8.onnx"
+
+    config = {
+        "model_file": model_file,
+        "input_names": input_names,
+        "pooling": pooling_mode,
+        "normalize": normalize,
+        "max_seq_length": int(transformer.max_seq_length),
+        "quantize": ONNX_QUANTIZE,
+        "exported_at": time.time(),
+    }
+
+    backend = OnnxEmbedder(model_dir, config=config)
+    config["parity"] = parity_check(st_model, backend)
+
+    with open(os.path.join(model_dir, "backend.json"), "w") as f:
+        json.dump(config, f, indent=2)
+
+    return config
+
+
+def parity_check(st_model, backend, texts: list = None) -> dict:
+    """Cosine similarity between PyTorch and ONNX vectors on probe texts."""
+    texts = texts or PARITY_TEXTS
+    ref = st_model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+    got = np.asarray(backend.encode(texts), dtype=np.float32)
+    cos = _cosines(np.asarray(ref, dtype=np.float32), got)
+    return {
+        "texts": len(texts),
+        "min_cosine": round(float(cos.min()), 6),
+        "mean_cosine": round(float(cos.mean()), 6),
+        "passed": bool(cos.min() >= ONNX_PARITY_MIN),
+    }
+
+
+# -------------------------------------------------------
+# INFERENCE (onnxruntime + tokenizer only)
+# -------------------------------------------------------
+class OnnxEmbedder:
+    def __init__(self, model_dir: str, config: dict = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        if config is None:
+            with open(os.path.join(model_dir, "backend.json")) as f:
+                config = json.load(f)
+        self.config = config
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = ONNX_THREADS
+        opts.inter_op_num_threads = 1
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, config["model_file"]),
+            sess_options=opts,
+            providers=["CPUExecutionProvider"],
+        )
+
+    def _run(self, texts: list) -> np.ndarray:
+        enc = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.config["max_seq_length"],
+            return_tensors="np",
+        )
+        feeds = {name: enc[name].astype(np.int64) for name in self.config["input_names"]}
+        hidden = self.session.run(None, feeds)[0]
+
+        if self.config["pooling"] == "cls":
+            out = hidden[:, 0]
+        else:
+            mask = feeds["attention_mask"][..., None].astype(np.float32)
+            out = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+        if self.config["normalize"]:
+            out = out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out.astype(np.float32)
+
+    def encode(self, texts: list) -> list:
+        if not texts:
+            return []
+        # length-sorted batches → less padding per batch
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        chunks = []
+        for start in range(0, len(order), ONNX_BATCH_SIZE):
+            idx = order[start:start + ONNX_BATCH_SIZE]
+            chunks.append((idx, self._run([texts[i] for i in idx])))
+
+        out = np.empty((len(texts), chunks[0][1].shape[1]), dtype=np.float32)
+        for idx, vecs in chunks:
+            out[idx] = vecs
+        return out.tolist()
+
+
+def load_or_export(model_name: str, load_torch_model) -> OnnxEmbedder:
+    """
+    Open the exported model, exporting it first if needed.
+    Raises RuntimeError if the export fails the parity check.
+    """
+    model_dir = default_model_dir(model_name)
+    config_path = os.path.join(model_dir, "backend.json")
+
+    if not os.path.exists(config_path):
+        config = export_model(load_torch_model(), model_dir)
+    else:
+        with open(config_path) as f:
+            config = json.load(f)
+
+    if not config.get("parity", {}).get("passed", False):
+        raise RuntimeError(f"ONNX parity check failed: {config.get('parity')}")
+
+    return OnnxEmbedder(model_dir, config=config)
@@ -0,0 +1,343 @@
+# hospital-agent/.../app/outbox.py
+
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+
+"""
+Durable Upload Outbox
+---------------------
+Encrypted store records are written to a local SQLite table (WAL,
+synchronous=FULL) and acknowledged right away; a background sender
+thread drains the table to the proxy.  Ingest latency no longer depends
+on proxy latency, and a proxy outage loses nothing.
+
+ - enqueue   → one transaction per batch of records; the row for an
+               existing (tenant, case_id) is replaced, so only the newest
+               version of a case is pending
+ - sender    → up to OUTBOX_BATCH due rows, grouped per tenant, one
+               /store_batch request per group over a keep-alive session
+ - success   → rows deleted; records the proxy rejects (e.g. wrong
+               dimension) are kept as "dead" with the error
+ - dead      → on_dead(tenant, case_ids) is called (the agent forgets the
+               cases' manifest hashes, so the next ingest re-sends them);
+               requeue() puts dead rows back to pending
+ - failure   → attempts += 1, next try after
+               min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2^(attempts-1)),
+               with jitter; after OUTBOX_MAX_ATTEMPTS (0 = never) → dead.
+               The whole sender also pauses for the same back-off (by
+               consecutive failures), so newly queued records do not
+               hammer a proxy that is down
+
+Delivery is at-least-once: a batch can be re-sent after a crash between
+the proxy's ack and the delete.  That is safe because case ids are
+stable and the store keeps the newest row per id.
+
+Only ciphertext (enc_blob) and keyed search vectors are stored here;
+the outbox never holds plaintext.
+
+Environment variables:
+ - OUTBOX               = "on" / "off" (default on; off = synchronous uploads)
+ - OUTBOX_PATH          = SQLite file (default /state/outbox.sqlite)
+ - OUTBOX_BATCH         = records per /store_batch request (default 256)
+ - OUTBOX_BACKOFF_BASE  = first retry delay in seconds (default 0.5)
+ - OUTBOX_BACKOFF_MAX   = retry delay cap in seconds (default 60)
+ - OUTBOX_MAX_ATTEMPTS  = attempts before a record is dead (default 0 = retry forever)
+"""
+
+OUTBOX = os.getenv("OUTBOX", "on").lower() not in ("off", "0", "false")
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "/state/outbox.sqlite")
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "256"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "0.5"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "60"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "0"))
+
+# longest idle wait before the sender re-checks the table
+_IDLE_SECONDS = 5.0
+
+# SQLite bound-parameter limit safety margin
+_CHUNK = 500
+
+
+class Outbox:
+    def __init__(self, path: str = OUTBOX_PATH, batch_size: int = OUTBOX_BATCH):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._send = None
+        self._on_dead = None
+        self._db = None
+        self._consecutive_failures = 0
+        self._paused_until = 0.0
+
+        self.enqueued = 0
+        self.sent = 0
+        self.batches = 0
+        self.send_failures = 0
+        self.rejected = 0
+        self.last_error = None
+        self.last_sent_at = None
+
+    def _conn(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=FULL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " tenant TEXT NOT NULL, case_id TEXT NOT NULL, record TEXT NOT NULL,"
+                " state TEXT NOT NULL DEFAULT 'pending',"
+                " attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL,"
+                " last_error TEXT, created REAL NOT NULL,"
+                " UNIQUE (tenant, case_id))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox(state, next_attempt)")
+            self._db = db
+        return self._db
+
+    # -------------------------------------------------
+    # Producer side
+    # -------------------------------------------------
+    def enqueue(self, tenant: str, records: list) -> list:
+        """
+        Durably queue store records ({case_id, enc_blob, search_vector?}).
+        Returns per-record statuses in the pipeline's format.
+        """
+        if not records:
+            return []
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            # OR REPLACE → a newer version of a pending case gets a new seq,
+            # so an in-flight send of the old version cannot delete it
+            db.executemany(
+                "INSERT OR REPLACE INTO outbox (tenant, case_id, record, next_attempt, created)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(tenant, r["case_id"], json.dumps(r), now, now) for r in records],
+            )
+            db.commit()
+            self.enqueued += len(records)
+        self._wake.set()
+        return [{"case_id": r["case_id"], "status": "queued"} for r in records]
+
+    def dead(self, tenant: str, case_ids: list) -> list:
+        """The given cases whose queued record is dead."""
+        found = []
+        with self._lock:
+            db = self._conn()
+            for start in range(0, len(case_ids), _CHUNK):
+                chunk = case_ids[start:start + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                found += [case_id for (case_id,) in db.execute(
+                    f"SELECT case_id FROM outbox WHERE tenant = ? AND state = 'dead'"
+                    f" AND case_id IN ({marks})",
+                    [tenant, *chunk],
+                )]
+        return found
+
+    def requeue(self, tenant: str, case_ids: list = None) -> int:
+        """Put dead records (all of the tenant's, or the given cases) back to pending."""
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            before = db.total_changes
+            sql = (
+                "UPDATE outbox SET state = 'pending', attempts = 0, next_attempt = ?, last_error = NULL"
+                " WHERE tenant = ? AND state = 'dead'"
+            )
+            if case_ids is None:
+                db.execute(sql, (now, tenant))
+            else:
+                db.executemany(sql + " AND case_id = ?", [(now, tenant, case_id) for case_id in case_ids])
+            db.commit()
+            requeued = db.total_changes - before
+        self._wake.set()
+        return requeued
+
+    def discard(self, tenant: str, case_ids: list) -> int:
+        """Drop queued records of cases that were deleted at the source."""
+        with self._lock:
+            db = self._conn()
+            before = db.total_changes
+            db.executemany(
+                "DELETE FROM outbox WHERE tenant = ? AND case_id = ?",
+                [(tenant, case_id) for case_id in case_ids],
+            )
+            db.commit()
+            return db.total_changes - before
+
+    # -------------------------------------------------
+    # Sender side
+    # -------------------------------------------------
+    def start(self, send_fn, on_dead=None):
+        """
+        send_fn(tenant, records) -> per-record statuses (raises on transport errors).
+        on_dead(tenant, case_ids) -> called after records were marked dead.
+        """
+        if self._thread is not None:
+            return
+        self._send = send_fn
+        self._on_dead = on_dead
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-sender", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _due(self) -> list:
+        with self._lock:
+            return self._conn().execute(
+                "SELECT seq, tenant, record, attempts FROM outbox"
+                " WHERE state = 'pending' AND next_attempt <= ?"
+                " ORDER BY seq LIMIT ?",
+                (time.time(), self.batch_size),
+            ).fetchall()
+
+    def _next_wait(self) -> float:
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT MIN(next_attempt) FROM outbox WHERE state = 'pending'"
+            ).fetchone()
+        if row[0] is None:
+            return _IDLE_SECONDS
+        return min(_IDLE_SECONDS, max(0.0, row[0] - time.time()))
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _deliver(self, tenant: str, rows: list):
+        seqs = [seq for seq, _, _ in rows]
+        try:
+            statuses = self._send(tenant, [json.loads(record) for _, record, _ in rows])
+        except Exception as e:
+            self._failed(tenant, rows, str(e))
+            return
+
+        by_case = {s.get("case_id"): s for s in statuses}
+        dead, dead_cases = {}, []
+        for seq, record, _ in rows:
+            case_id = json.loads(record)["case_id"]
+            status = by_case.get(case_id, {})
+            if status.get("status") == "rejected" or "error" in status:
+                dead[seq] = status.get("error", "rejected")
+                dead_cases.append(case_id)
+
+        with self._lock:
+            db = self._conn()
+            db.executemany(
+                "UPDATE outbox SET state = 'dead', last_error = ? WHERE seq = ?",
+                [(error, seq) for seq, error in dead.items()],
+            )
+            done = [(seq,) for seq in seqs if seq not in dead]
+            db.executemany("DELETE FROM outbox WHERE seq = ?", done)
+            db.commit()
+            self.sent += len(done)
+            self.rejected += len(dead)
+            self.batches += 1
+            self.last_sent_at = time.time()
+            self._consecutive_failures = 0
+        self._dead(tenant, dead_cases)
+
+    def _failed(self, tenant: str, rows: list, error: str):
+        now = time.time()
+        updates, dead_cases = [], []
+        for seq, record, attempts in rows:
+            attempts += 1
+            if OUTBOX_MAX_ATTEMPTS and attempts >= OUTBOX_MAX_ATTEMPTS:
+                updates.append(("dead", attempts, now, error, seq))
+                dead_cases.append(json.loads(record)["case_id"])
+            else:
+                updates.append(("pending", attempts, now + self._backoff(attempts), error, seq))
+        with self._lock:
+            db = self._conn()
+            db.executemany(
+                "UPDATE outbox SET state = ?, attempts = ?, next_attempt = ?, last_error = ? WHERE seq = ?",
+                updates,
+            )
+            db.commit()
+            self.send_failures += 1
+            self.last_error = error
+            self._consecutive_failures += 1
+            self._paused_until = now + self._backoff(self._consecutive_failures)
+        self._dead(tenant, dead_cases)
+
+    def _dead(self, tenant: str, case_ids: list):
+        if case_ids and self._on_dead is not None:
+            self._on_dead(tenant, case_ids)
+
+    def _run(self):
+        while not self._stop.is_set():
+            pause = self._paused_until - time.time()
+            if pause > 0:
+                self._stop.wait(pause)
+                continue
+
+            # clear before reading, so an enqueue during the read still wakes us
+            self._wake.clear()
+            try:
+                rows = self._due()
+            except Exception as e:
+                self.last_error = str(e)
+                self._stop.wait(_IDLE_SECONDS)
+                continue
+
+            if not rows:
+                self._wake.wait(self._next_wait())
+                continue
+
+            groups = {}
+            for seq, tenant, record, attempts in rows:
+                groups.setdefault(tenant, []).append((seq, record, attempts))
+            try:
+                for tenant, group in groups.items():
+                    self._deliver(tenant, group)
+            except Exception as e:
+                # e.g. a SQLite error while marking rows: keep the thread
+                # alive, the rows are still pending and are retried
+                self.last_error = str(e)
+                self._stop.wait(_IDLE_SECONDS)
+
+    # -------------------------------------------------
+    # Metrics
+    # -------------------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            db = self._conn()
+            counts = dict(db.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall())
+            oldest = db.execute(
+                "SELECT MIN(created) FROM outbox WHERE state = 'pending'"
+            ).fetchone()[0]
+        return {
+            "enabled": OUTBOX,
+            "running": self._thread is not None,
+            "pending": counts.get("pending", 0),
+            "dead": counts.get("dead", 0),
+            "oldest_pending_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "batches": self.batches,
+            "send_failures": self.send_failures,
+            "paused_seconds": round(max(0.0, self._paused_until - time.time()), 3),
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+            "last_sent_at": self.last_sent_at,
+            "path": self.path,
+        }
+
+
+outbox = Outbox()
@@ -0,0 +1,164 @@
+# hospital-agent/.../app/pipeline.py
+
+import os
+import time
+import asyncio
+
+"""
+Pipelined Batch Ingestion
+-------------------------
+Overlapping stages connected by bounded queues:
+
+    rows ─► [batch] ─► [embed] ─► [encrypt] ─► [upload] ─► results
+
+ - embed    → one model call per batch (INGEST_BATCH_SIZE rows)
+ - encrypt  → AES-GCM + keyed transform for the whole batch
+ - upload   → one /store_batch request per batch
+
+CPU-bound stages run in worker threads (asyncio.to_thread), so batch N
+is uploading while batch N+1 is being encrypted and N+2 embedded.
+PIPELINE_QUEUE_DEPTH bounds in-flight batches per stage (memory cap).
+An optional filter (delta ingestion, see manifest.py) drops unchanged
+rows before the model is called; they are counted as "skipped".
+Only failed records are kept in the summary (first PIPELINE_MAX_DETAILS),
+so memory does not grow with the number of rows.
+The first stage (or row reader) that raises cancels all the others and its
+error is re-raised; a batch already running in a worker thread finishes
+(and is committed) first, nothing after it is.
+
+Environment variables:
+ - INGEST_BATCH_SIZE     = rows per batch (default 256)
+ - PIPELINE_QUEUE_DEPTH  = batches buffered between stages (default 4)
+ - PIPELINE_MAX_DETAILS  = failed records reported per run (default 1000)
+"""
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+PIPELINE_QUEUE_DEPTH = int(os.getenv("PIPELINE_QUEUE_DEPTH", "4"))
+PIPELINE_MAX_DETAILS = int(os.getenv("PIPELINE_MAX_DETAILS", "1000"))
+
+_DONE = object()
+
+
+def _failed(status: dict) -> bool:
+    return "error" in status or status.get("status") == "rejected"
+
+
+async def _in_thread(fn, item):
+    work = asyncio.ensure_future(asyncio.to_thread(fn, item))
+    try:
+        return await asyncio.shield(work)
+    except asyncio.CancelledError:
+        # a worker thread cannot be interrupted: let it finish its batch
+        # before the pipeline reports, so nothing commits afterwards
+        await asyncio.gather(work, return_exceptions=True)
+        raise
+
+
+async def run_pipeline(rows, embed_fn, encrypt_fn, upload_fn, batch_size: int = None,
+                       on_commit=None, filter_fn=None):
+    """
+    rows       → iterable or async iterable of Case
+    embed_fn   → (texts)          -> list of vectors
+    encrypt_fn → (cases, vectors) -> list of store records
+    upload_fn  → (records)        -> per-record status list; raises on
+                 transport errors, which stop the run before that batch
+                 is committed
+    on_commit  → optional (batch, statuses) callback, called in order
+                 after each batch has been uploaded (checkpointing);
+                 always gets the full batch, statuses cover sent rows only
+    filter_fn  → optional (batch) -> cases that still need processing
+
+    Returns a summary with failed-record details and per-stage timings.
+    """
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    q_embed = asyncio.Queue(maxsize=PIPELINE_QUEUE_DEPTH)
+    q_encrypt = asyncio.Queue(maxsize=PIPELINE_QUEUE_DEPTH)
+    q_upload = asyncio.Queue(maxsize=PIPELINE_QUEUE_DEPTH)
+
+    timings = {"embed": 0.0, "encrypt": 0.0, "upload": 0.0}
+    details = []
+    counts = {"rows": 0, "failed": 0, "skipped": 0, "batches": 0}
+    started = time.perf_counter()
+
+    async def produce():
+        batch = []
+        if hasattr(rows, "__aiter__"):
+            async for case in rows:
+                batch.append(case)
+                if len(batch) >= batch_size:
+                    await q_embed.put(batch)
+                    batch = []
+        else:
+            for case in rows:
+                batch.append(case)
+                if len(batch) >= batch_size:
+                    await q_embed.put(batch)
+                    batch = []
+        if batch:
+            await q_embed.put(batch)
+        await q_embed.put(_DONE)
+
+    async def stage(name, inbox, outbox, fn):
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                if outbox is not None:
+                    await outbox.put(_DONE)
+                return
+            t0 = time.perf_counter()
+            result = await _in_thread(fn, item)
+            timings[name] += time.perf_counter() - t0
+            if outbox is not None:
+                await outbox.put(result)
+
+    def embed(batch):
+        todo = filter_fn(batch) if filter_fn is not None else batch
+        return batch, todo, (embed_fn([c.text for c in todo]) if todo else [])
+
+    def encrypt(item):
+        batch, todo, vectors = item
+        return batch, todo, (encrypt_fn(todo, vectors) if todo else [])
+
+    def upload(item):
+        batch, todo, records = item
+        # a transport error raises and interrupts the run, so the batch is
+        # never committed and a resumed job sends it again
+        statuses = upload_fn(records) if records else []
+        failures = [s for s in statuses if _failed(s)]
+        details.extend(failures[:max(0, PIPELINE_MAX_DETAILS - len(details))])
+        counts["rows"] += len(batch)
+        counts["failed"] += len(failures)
+        counts["skipped"] += len(batch) - len(todo)
+        counts["batches"] += 1
+        if on_commit is not None:
+            on_commit(batch, statuses)
+
+    tasks = [
+        asyncio.create_task(produce()),
+        asyncio.create_task(stage("embed", q_embed, q_encrypt, embed)),
+        asyncio.create_task(stage("encrypt", q_encrypt, q_upload, encrypt)),
+        asyncio.create_task(stage("upload", q_upload, None, upload)),
+    ]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        # one failure (or the caller going away) stops every stage, so
+        # nothing is left blocked on a queue no one reads any more
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for task in tasks:
+        if task in done and task.exception() is not None:
+            raise task.exception()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "stored": counts["rows"] - counts["failed"] - counts["skipped"],
+        "failed": counts["failed"],
+        "skipped": counts["skipped"],
+        "batches": counts["batches"],
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(counts["rows"] / elapsed, 1) if elapsed else 0.0,
+        "stage_seconds": {k: round(v, 3) for k, v in timings.items()},
+        "details": details,
+    }
@@ -0,0 +1,374 @@
+# hospital-agent/.../app/rotate.py
+
+import os
+import sys
+import time
+import json
+import hashlib
+import argparse
+import binascii
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from cryptography.exceptions import InvalidTag
+
+from . import data_keys
+from .crypto import load_key
+from .envelope import unpack_vector
+from .ingest_stream import load_checkpoint, save_checkpoint
+from .transform import transform_vectors, keyed_search_enabled
+
+"""
+Key Rotation / Re-encryption Job (offline)
+------------------------------------------
+Re-encrypts every stored record of one hospital index from an old master
+key to a new one.  Plaintext only exists inside this process (hospital
+boundary); the proxy and CyborgDB see ciphertext in and ciphertext out.
+
+    python -m app.rotate --hospital HospitalA \\
+        --old-key /keys/hospital_a.key --new-key /keys/hospital_a.new.key
+
+Flow (bounded memory: at most 2 x ROTATE_WORKERS pages in flight):
+
+    proxy /scan_blobs page ──▶ worker pool:  decrypt (old key, batch)
+                                           → re-encrypt (new key, data keys)
+                                           → re-transform search vector
+                                           → proxy /store_batch (conditional)
+                           ──▶ checkpoint (in page order)
+
+ - the first page snapshots the index row count (`end`); re-written
+   records land after it and supersede the old rows, so they are never
+   scanned twice and a resumed job skips work that was already stored
+ - every write carries the row it was scanned from (`if_row`); a case that
+   was updated or deleted in the meantime is not overwritten with its old
+   content but counted as superseded
+ - checkpoints (STATE_DIR/rotate-<hospital>-<job_id>.json) only advance
+   past pages whose writes completed, in scan order
+ - records that already decrypt with the new key are counted as
+   already_rotated; records that decrypt with neither key (or are
+   corrupt / carry a malformed envelope) are reported as failed
+ - the summary accounts for every scanned row:
+   scanned = rotated + skipped (already_rotated + superseded) + failed
+ - progress + throughput (rows/s, MB/s, ETA, per-stage seconds) go to
+   stderr, the final summary (JSON) to stdout
+
+Ingestion and deletes may keep running during the job thanks to the
+conditional writes, but switch the agent to the new key first: rows it
+writes after the scan snapshot are not visited by this job, so they must
+already be under the new key.
+
+Environment variables:
+ - CYBORG_PROXY_URL     = proxy base URL
+ - HOSPITAL_API_TOKEN   = admin token for the proxy
+ - ROTATE_WORKERS       = re-encryption threads (default min(4, cpu count))
+ - ROTATE_PAGE_SIZE     = records per scanned page / written batch (default 500)
+ - ROTATE_REPORT_SECONDS = progress report interval (default 5)
+"""
+
+ROTATE_WORKERS = int(os.getenv("ROTATE_WORKERS", str(min(4, os.cpu_count() or 1))))
+ROTATE_PAGE_SIZE = int(os.getenv("ROTATE_PAGE_SIZE", "500"))
+ROTATE_REPORT_SECONDS = float(os.getenv("ROTATE_REPORT_SECONDS", "5"))
+ROTATE_MAX_DETAILS = 1000
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    # one keep-alive session per thread (requests.Session is not thread-safe)
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def rotation_job_id(hospital: str, old_key: bytes, new_key: bytes) -> str:
+    h = hashlib.sha256()
+    h.update(hospital.encode("utf-8") + b"\0")
+    h.update(hashlib.sha256(old_key).digest())
+    h.update(hashlib.sha256(new_key).digest())
+    return h.hexdigest()[:32]
+
+
+# -------------------------------------------------------
+# PROXY I/O
+# -------------------------------------------------------
+class ProxyClient:
+    def __init__(self, proxy_url: str, token: str, hospital: str):
+        self.proxy_url = proxy_url.rstrip("/")
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.hospital = hospital
+
+    def scan(self, cursor: int, end: int = None, limit: int = ROTATE_PAGE_SIZE) -> dict:
+        params = {"hospital": self.hospital, "cursor": cursor, "limit": limit}
+        if end is not None:
+            params["end"] = end
+        r = _session().get(f"{self.proxy_url}/scan_blobs", params=params, headers=self.headers, timeout=60)
+        r.raise_for_status()
+        return r.json()
+
+    def store(self, records: list) -> list:
+        r = _session().post(
+            f"{self.proxy_url}/store_batch",
+            json={"hospital": self.hospital, "records": records},
+            headers=self.headers,
+            timeout=120,
+        )
+        r.raise_for_status()
+        return r.json()["results"]
+
+
+# -------------------------------------------------------
+# RE-ENCRYPTION (one page)
+# -------------------------------------------------------
+def _decrypt_page(old_key: bytes, new_key: bytes, encs: list) -> tuple:
+    """
+    Batch decrypt with the old key; on a bad tag or a corrupt blob fall
+    back per record.  Returns (plaintexts, skipped) where skipped maps
+    index → reason.
+    """
+    try:
+        return data_keys.decrypt_blobs(old_key, encs), {}
+    except (InvalidTag, ValueError, binascii.Error):
+        pass
+
+    plaintexts, skipped = [None] * len(encs), {}
+    for i, enc in enumerate(encs):
+        try:
+            plaintexts[i] = data_keys.decrypt_blob(old_key, enc)
+            continue
+        except (InvalidTag, ValueError, binascii.Error):
+            pass
+        try:
+            data_keys.decrypt_blob(new_key, enc)
+            skipped[i] = "already_rotated"
+        except (InvalidTag, ValueError, binascii.Error):
+            skipped[i] = "undecryptable"
+    return plaintexts, skipped
+
+
+def rotate_page(records: list, old_key: bytes, new_key: bytes, proxy: ProxyClient, timings: dict) -> dict:
+    lock = timings["_lock"]
+
+    t0 = time.perf_counter()
+    plaintexts, skipped = _decrypt_page(old_key, new_key, [r["enc_blob"] for r in records])
+    t1 = time.perf_counter()
+
+    vectors = {}
+    if keyed_search_enabled():
+        for i, r in enumerate(records):
+            if i in skipped or not r.get("has_search_vector"):
+                continue
+            try:
+                vectors[i] = unpack_vector(plaintexts[i])["vector"]
+            except ValueError:
+                skipped[i] = "malformed"
+
+    keep = [i for i in range(len(records)) if i not in skipped]
+    blobs = data_keys.encrypt_vectors(
+        new_key,
+        [plaintexts[i] for i in keep],
+        [records[i]["case_id"] for i in keep],
+    )
+    out = []
+    for i, enc in zip(keep, blobs):
+        rec = {"case_id": records[i]["case_id"], "enc_blob": enc}
+        if records[i].get("row") is not None:
+            rec["if_row"] = records[i]["row"]
+        out.append(rec)
+
+    if vectors:
+        with_sv = [(rec, vectors[i]) for rec, i in zip(out, keep) if vectors.get(i) is not None]
+        if with_sv:
+            search_vectors = transform_vectors(new_key, [vec for _, vec in with_sv])
+            for (rec, _), sv in zip(with_sv, search_vectors):
+                rec["search_vector"] = sv
+    t2 = time.perf_counter()
+
+    statuses = proxy.store(out) if out else []
+    t3 = time.perf_counter()
+
+    with lock:
+        timings["decrypt"] += t1 - t0
+        timings["encrypt"] += t2 - t1
+        timings["upload"] += t3 - t2
+
+    failed = [
+        {"case_id": s.get("case_id"), "error": s.get("error", s.get("status"))}
+        for s in statuses
+        if s.get("status") not in ("stored", "superseded")
+    ]
+    failed += [
+        {"case_id": records[i]["case_id"], "error": reason}
+        for i, reason in skipped.items()
+        if reason != "already_rotated"
+    ]
+
+    return {
+        "scanned": len(records),
+        "rotated": sum(1 for s in statuses if s.get("status") == "stored"),
+        "already_rotated": sum(1 for r in skipped.values() if r == "already_rotated"),
+        "superseded": sum(1 for s in statuses if s.get("status") == "superseded"),
+        "failed": failed,
+        "bytes": sum(len(r["enc_blob"]["ciphertext"]) for r in records),
+    }
+
+
+# -------------------------------------------------------
+# JOB
+# -------------------------------------------------------
+def _report(state: dict, seconds: float, final: bool = False):
+    rate = state["rotated"] / seconds if seconds > 0 else 0.0
+    done = state["cursor"] if state["cursor"] is not None else state["end"] or 0
+    remaining = max(0, (state["end"] or 0) - done)
+    line = {
+        "status": state["status"],
+        "scanned": state["scanned"],
+        "rotated": state["rotated"],
+        "already_rotated": state["already_rotated"],
+        "superseded": state["superseded"],
+        "skipped": state["already_rotated"] + state["superseded"],
+        "failed": state["failed"],
+        "progress": round(done / state["end"], 4) if state["end"] else 1.0,
+        "rows_per_sec": round(rate, 1),
+        "mb_per_sec": round(state["bytes"] / seconds / 1e6, 2) if seconds > 0 else 0.0,
+        "eta_seconds": round(remaining / rate, 1) if rate > 0 and not final else None,
+        "seconds_per_million": round(1e6 / rate, 1) if rate > 0 else None,
+    }
+    print("[rotate] " + json.dumps(line), file=sys.stderr, flush=True)
+    return line
+
+
+def run_rotation(hospital: str, old_key: bytes, new_key: bytes, proxy: ProxyClient,
+                 workers: int = ROTATE_WORKERS, page_size: int = ROTATE_PAGE_SIZE,
+                 job_id: str = None, restart: bool = False) -> dict:
+    if old_key == new_key:
+        raise ValueError("old and new key are identical")
+
+    job_id = job_id or rotation_job_id(hospital, old_key, new_key)
+    state = None if restart else load_checkpoint(job_id, hospital, kind="rotate")
+    if state is None:
+        state = {
+            "job_id": job_id,
+            "kind": "rotate",
+            "tenant": hospital,
+            "cursor": 0,
+            "end": None,
+            "scanned": 0,
+            "rotated": 0,
+            "already_rotated": 0,
+            "superseded": 0,
+            "failed": 0,
+            "bytes": 0,
+            "status": "running",
+            "started_at": time.time(),
+        }
+    elif state["status"] == "completed":
+        return {**state, "resumed": True}
+
+    resumed_from = state["cursor"]
+    state["status"] = "running"
+    state.setdefault("superseded", 0)
+    details = []
+    timings = {"scan": 0.0, "decrypt": 0.0, "encrypt": 0.0, "upload": 0.0, "_lock": threading.Lock()}
+
+    t_start = time.perf_counter()
+    t_report = t_start
+    cursor, end = state["cursor"], state["end"]
+    inflight = deque()     # (next_cursor, future) in scan order
+
+    with ThreadPoolExecutor(max(1, workers), thread_name_prefix="rotate") as pool:
+        try:
+            while cursor is not None or inflight:
+                # keep the pool fed, at most 2 pages per worker in flight
+                while cursor is not None and len(inflight) < 2 * max(1, workers):
+                    t0 = time.perf_counter()
+                    page = proxy.scan(cursor, end, page_size)
+                    timings["scan"] += time.perf_counter() - t0
+                    if end is None:
+                        end = state["end"] = page["end"]
+                    records = page["records"]
+                    fut = pool.submit(rotate_page, records, old_key, new_key, proxy, timings) if records else None
+                    inflight.append((page["next_cursor"], fut))
+                    cursor = page["next_cursor"]
+
+                next_cursor, fut = inflight.popleft()
+                if fut is not None:
+                    res = fut.result()
+                    state["scanned"] += res["scanned"]
+                    state["rotated"] += res["rotated"]
+                    state["already_rotated"] += res["already_rotated"]
+                    state["superseded"] += res["superseded"]
+                    state["failed"] += len(res["failed"])
+                    state["bytes"] += res["bytes"]
+                    details.extend(res["failed"][:max(0, ROTATE_MAX_DETAILS - len(details))])
+
+                state["cursor"] = next_cursor
+                if next_cursor is None:
+                    state["status"] = "completed"
+                save_checkpoint(state)
+
+                if time.perf_counter() - t_report >= ROTATE_REPORT_SECONDS:
+                    t_report = time.perf_counter()
+                    _report(state, t_report - t_start)
+
+        except BaseException as e:
+            # later pages may have been stored already; the checkpoint stays
+            # at the last contiguous page and the rerun skips superseded rows
+            for _, f in inflight:
+                if f is not None:
+                    f.cancel()
+            state["status"] = "interrupted"
+            state["error"] = str(e)
+            save_checkpoint(state)
+            raise
+
+    seconds = time.perf_counter() - t_start
+    summary = _report(state, seconds, final=True)
+    return {
+        **summary,
+        "job_id": job_id,
+        "hospital": hospital,
+        "resumed_from": resumed_from,
+        "end": end,
+        "seconds": round(seconds, 3),
+        "workers": workers,
+        "page_size": page_size,
+        "stage_seconds": {k: round(v, 3) for k, v in timings.items() if not k.startswith("_")},
+        "details": details,
+    }
+
+
+# -------------------------------------------------------
+# CLI
+# -------------------------------------------------------
+def main(argv: list = None) -> int:
+    ap = argparse.ArgumentParser(description="Re-encrypt a hospital index under a new master key")
+    ap.add_argument("--hospital", default=os.getenv("HOSPITAL_NAME", "HospitalA"))
+    ap.add_argument("--old-key", required=True, help="path to the current key file")
+    ap.add_argument("--new-key", required=True, help="path to the new key file")
+    ap.add_argument("--proxy-url", default=os.getenv("CYBORG_PROXY_URL", "http://cyborg-proxy:8000"))
+    ap.add_argument("--token", default=os.getenv("HOSPITAL_API_TOKEN", ""))
+    ap.add_argument("--workers", type=int, default=ROTATE_WORKERS)
+    ap.add_argument("--page-size", type=int, default=ROTATE_PAGE_SIZE)
+    ap.add_argument("--job-id", default=None)
+    ap.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = ap.parse_args(argv)
+
+    old_key, new_key = load_key(args.old_key), load_key(args.new_key)
+    for name, key in (("old", old_key), ("new", new_key)):
+        if len(key) != 32:
+            ap.error(f"{name} key must be 32 bytes (AES-256), got {len(key)}")
+
+    proxy = ProxyClient(args.proxy_url, args.token, args.hospital)
+    result = run_rotation(
+        args.hospital, old_key, new_key, proxy,
+        workers=args.workers, page_size=args.page_size,
+        job_id=args.job_id, restart=args.restart,
+    )
+    print(json.dumps(result, indent=2))
+    return 0 if not result.get("failed") else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
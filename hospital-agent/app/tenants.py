@@ -0,0 +1,216 @@
+# hospital-agent/.../app/tenants.py
+
+import os
+import json
+import time
+import threading
+
+from .crypto import load_key_auto
+from .kms_client import get_key
+
+"""
+Tenant Registry
+---------------
+One agent process can serve many hospitals.  Everything that differs
+per hospital lives here; the embedding model, worker pool and caches
+are shared, so memory grows with the number of keys, not models.
+
+Per tenant:
+ - name          → hospital / CyborgDB index name (e.g. "HospitalA")
+ - key_mode      → "file" or "kms" (default KEY_MODE)
+ - key_path      → FILE MODE key (auto-generated if missing, default /keys/<name>.key)
+ - kms_key_path  → KMS MODE master key, fetched via kms_client.get_key
+                   (cached, re-fetched once per KMS_CACHE_TTL)
+ - api_token     → bearer token for the proxy (or api_token_env → env var name)
+ - example_path  → /ingest_example source (optional)
+
+TENANTS_CONFIG (JSON):
+
+    {
+      "default": "HospitalA",
+      "tenants": [
+        {"name": "HospitalA", "key_mode": "kms",
+         "kms_key_path": "/keys_kms/hospital_a.key",
+         "api_token_env": "HOSPITAL_A_API_TOKEN"},
+        ...
+      ]
+    }
+
+Without TENANTS_CONFIG the agent is single-tenant, configured from
+HOSPITAL_NAME / KEY_PATH / KEY_MODE / KMS_KEY_PATH / HOSPITAL_API_TOKEN
+exactly as before.
+
+Requests pick a tenant by route prefix (/tenants/{name}/...) or the
+X-Tenant header; otherwise the default tenant is used.
+
+A tenant whose key fails to load (missing file, KMS down) does not hold
+back the others: it is reported not-ready on /ready and retried with
+exponential back-off on the next request or readiness probe.
+
+Environment variables:
+ - TENANTS_CONFIG        = path to the tenants JSON file (optional)
+ - KEY_RETRY_SECONDS     = first retry delay after a failed key load (default 1)
+ - KEY_RETRY_MAX_SECONDS = back-off ceiling (default 60)
+"""
+
+TENANTS_CONFIG = os.getenv("TENANTS_CONFIG", "")
+KEY_RETRY_SECONDS = float(os.getenv("KEY_RETRY_SECONDS", "1"))
+KEY_RETRY_MAX_SECONDS = float(os.getenv("KEY_RETRY_MAX_SECONDS", "60"))
+
+
+class Tenant:
+    def __init__(self, name: str, key_mode: str = None, key_path: str = None,
+                 kms_key_path: str = None, api_token: str = None, example_path: str = None):
+        if not name or any(not (ch.isalnum() or ch in "-_") for ch in name):
+            raise ValueError(f"invalid tenant name '{name}'")
+        self.name = name
+        self.key_mode = (key_mode or os.getenv("KEY_MODE", "file")).lower()
+        self.key_path = key_path or f"/keys/{name}.key"
+        self.kms_key_path = kms_key_path
+        self.api_token = api_token or ""
+        self.example_path = example_path
+        self._key = None
+        self.error = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def key(self) -> bytes:
+        """
+        Master key; KMS keys come from the TTL cache (one fetch per period).
+        None while the key is not loaded (a failed load is retried with back-off).
+        """
+        if self._key is None:
+            self.retry_key()
+        elif self.key_mode == "kms":
+            self._key = get_key(mode="kms", kms_path=self.kms_key_path)
+        return self._key
+
+    @property
+    def ready(self) -> bool:
+        return self._key is not None
+
+    def load_key(self) -> bytes:
+        try:
+            self._key = load_key_auto(
+                self.key_path,
+                kms_fetcher=lambda: get_key(mode="kms", kms_path=self.kms_key_path),
+                mode=self.key_mode,
+            )
+        except Exception as e:
+            self.error = str(e)
+            self._failures += 1
+            delay = KEY_RETRY_SECONDS * 2 ** (self._failures - 1)
+            self._retry_at = time.monotonic() + min(delay, KEY_RETRY_MAX_SECONDS)
+            raise
+        self.error = None
+        self._failures = 0
+        return self._key
+
+    def retry_key(self) -> bool:
+        """Retry a failed load_key() once its back-off has passed; True when loaded."""
+        if self._key is None and time.monotonic() >= self._retry_at:
+            with self._lock:
+                if self._key is None and time.monotonic() >= self._retry_at:
+                    try:
+                        self.load_key()
+                    except Exception:
+                        pass
+        return self._key is not None
+
+    def auth_headers(self) -> dict:
+        if self.api_token:
+            return {"Authorization": f"Bearer {self.api_token}"}
+        return {}
+
+    def describe(self) -> dict:
+        # never expose key material or tokens
+        return {
+            "name": self.name,
+            "key_mode": self.key_mode,
+            "key_loaded": self._key is not None,
+            "error": self.error,
+            "key_failures": self._failures,
+        }
+
+
+class TenantRegistry:
+    def __init__(self, tenants: list, default: str = None):
+        if not tenants:
+            raise ValueError("at least one tenant is required")
+        self._tenants = {}
+        for t in tenants:
+            if t.name in self._tenants:
+                raise ValueError(f"duplicate tenant '{t.name}'")
+            self._tenants[t.name] = t
+        self.default = default or tenants[0].name
+        if self.default not in self._tenants:
+            raise ValueError(f"default tenant '{self.default}' is not configured")
+
+    @classmethod
+    def from_env(cls, default_name: str, default_key_path: str):
+        if not TENANTS_CONFIG:
+            return cls([
+                Tenant(
+                    default_name,
+                    key_path=default_key_path,
+                    kms_key_path=os.getenv("KMS_KEY_PATH"),
+                    api_token=os.getenv("HOSPITAL_API_TOKEN", ""),
+                    example_path=os.getenv("EXAMPLE_PATH"),
+                )
+            ])
+
+        with open(TENANTS_CONFIG) as f:
+            cfg = json.load(f)
+
+        tenants = []
+        for entry in cfg.get("tenants", []):
+            token = entry.get("api_token")
+            if token is None and entry.get("api_token_env"):
+                token = os.getenv(entry["api_token_env"], "")
+            tenants.append(Tenant(
+                entry["name"],
+                key_mode=entry.get("key_mode"),
+                key_path=entry.get("key_path"),
+                kms_key_path=entry.get("kms_key_path"),
+                api_token=token if token is not None else os.getenv("HOSPITAL_API_TOKEN", ""),
+                example_path=entry.get("example_path"),
+            ))
+        return cls(tenants, default=cfg.get("default"))
+
+    @property
+    def multi(self) -> bool:
+        return len(self._tenants) > 1
+
+    def names(self) -> list:
+        return list(self._tenants)
+
+    def get(self, name: str = None) -> Tenant:
+        """Raises KeyError for unknown tenants."""
+        return self._tenants[name or self.default]
+
+    def load_keys(self) -> dict:
+        """
+        Load every tenant's key.  A failing tenant does not stop the
+        others (its error is kept on the tenant and retried later).
+        """
+        for t in self._tenants.values():
+            try:
+                t.load_key()
+            except Exception:
+                pass
+        return self.key_status()
+
+    def key_status(self, retry: bool = False) -> dict:
+        """{tenant: key loaded}; `retry` re-attempts failed loads (with back-off)."""
+        return {
+            name: t.retry_key() if retry else t.ready
+            for name, t in self._tenants.items()
+        }
+
+    def describe(self) -> dict:
+        return {
+            "default": self.default,
+            "tenants": [t.describe() for t in self._tenants.values()],
+        }
@@ -0,0 +1,97 @@
+# hospital-agent/.../app/transform.py
+
+import os
+import hmac
+import hashlib
+import numpy as np
+
+"""
+Keyed Search Transform
+----------------------
+Distance-preserving transform applied to embeddings BEFORE they leave the
+hospital boundary, so CyborgDB can rank vectors without seeing plaintext:
+
+    t(v) = Q · v + noise
+
+ - Q      → secret orthogonal matrix derived from the hospital key
+            (QR decomposition of a keyed Gaussian matrix)
+ - noise  → fresh Gaussian noise per vector (SEARCH_NOISE_SCALE)
+
+Q is orthogonal, so inner products are preserved up to the noise term:
+<t(a), t(b)> ≈ <a, b>.  Without the hospital key the server cannot undo Q.
+
+Environment variables:
+ - SEARCH_MODE         = "keyed" (send transformed vector) or "opaque"
+ - SEARCH_NOISE_SCALE  = std-dev of per-vector noise (default 0.01)
+"""
+
+SEARCH_MODE = os.getenv("SEARCH_MODE", "keyed").lower()
+SEARCH_NOISE_SCALE = float(os.getenv("SEARCH_NOISE_SCALE", "0.01"))
+
+_TRANSFORM_INFO = b"ecx-search-transform-v1"
+
+# (key digest, dim) -> orthogonal matrix
+_rotations = {}
+
+
+def _derive_seed(key: bytes) -> int:
+    """Derive a deterministic RNG seed from the hospital key."""
+    digest = hmac.new(key, _TRANSFORM_INFO, hashlib.sha256).digest()
+    return int.from_bytes(digest, "big")
+
+
+def get_rotation(key: bytes, dim: int) -> np.ndarray:
+    """
+    Return the secret (dim x dim) orthogonal matrix for this key.
+    Computed once per key and cached.
+    """
+    cache_key = (hashlib.sha256(key).digest(), dim)
+    q = _rotations.get(cache_key)
+    if q is None:
+        rng = np.random.default_rng(_derive_seed(key))
+        g = rng.standard_normal((dim, dim))
+        q, r = np.linalg.qr(g)
+        # sign correction → uniformly distributed orthogonal matrix
+        q = q * np.sign(np.diag(r))
+        q = q.astype(np.float32)
+        _rotations[cache_key] = q
+    return q
+
+
+def transform_vector(key: bytes, vec, noise_scale: float = None) -> list:
+    """
+    Apply the keyed rotation + noise to a single embedding.
+    Returns a plain list so it can be JSON encoded.
+    """
+    if noise_scale is None:
+        noise_scale = SEARCH_NOISE_SCALE
+
+    v = np.asarray(vec, dtype=np.float32)
+    q = get_rotation(key, v.shape[0])
+    out = q @ v
+
+    if noise_scale > 0:
+        out = out + np.random.default_rng().normal(0.0, noise_scale, out.shape).astype(np.float32)
+
+    return out.tolist()
+
+
+def transform_vectors(key: bytes, vecs, noise_scale: float = None) -> list:
+    """Batch variant: one matrix product for a whole batch of embeddings."""
+    if noise_scale is None:
+        noise_scale = SEARCH_NOISE_SCALE
+
+    v = np.asarray(vecs, dtype=np.float32)
+    if len(v) == 0:
+        return []
+    q = get_rotation(key, v.shape[1])
+    out = v @ q.T
+
+    if noise_scale > 0:
+        out = out + np.random.default_rng().normal(0.0, noise_scale, out.shape).astype(np.float32)
+
+    return out.tolist()
+
+
+def keyed_search_enabled() -> bool:
+    return SEARCH_MODE == "keyed"
@@ -0,0 +1,14 @@
+import os
+import json
+
+def load_example(path: str = None):
+    """
+    Loads the hospital's example case.
+    The default path is /examples/example_a.json; each hospital container sets EXAMPLE_PATH.
+    """
+    example_path = path or os.getenv("EXAMPLE_PATH", "/examples/example_a.json")
+    if not os.path.exists(example_path):
+        raise RuntimeError(f"Example file not found: {example_path}")
+
+    with open(example_path, "r") as f:
+        return json.load(f)
\ No newline at end of file
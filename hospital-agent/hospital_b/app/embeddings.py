@@ -1,16 +0,0 @@
-from sentence_transformers import SentenceTransformer
-import numpy as np
-
-_model = None
-
-def get_model():
-    global _model
-    if _model is None:
-        # small & fast model for hackathon reproducibility
-        _model = SentenceTransformer('all-MiniLM-L6-v2')
-    return _model
-
-def embed_texts(texts: list):
-    model = get_model()
-    embs = model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
-    return embs.tolist()
\ No newline at end of file
@@ -1,14 +0,0 @@
-import os
-import json
-
-def load_example():
-    """
-    Loads example data for hospital_b.
-    The default path is /examples/example_b.json, but you can override with EXAMPLE_PATH env var.
-    """
-    example_path = os.getenv("EXAMPLE_PATH", "/examples/example_b.json")
-    if not os.path.exists(example_path):
-        raise RuntimeError(f"Example file not found: {example_path}")
-
-    with open(example_path, "r") as f:
-        return json.load(f)
\ No newline at end of file
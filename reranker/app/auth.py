@@ -5,6 +5,8 @@ from jose import jwt, JWTError
 import os
 from dataclasses import dataclass
 
+from shared.jwt_cache import token_cache, RevokedTokenError
+
 JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
 JWT_ALG = os.getenv("JWT_ALG", "HS256")
 
@@ -27,17 +29,24 @@ async def verify_jwt(request: Request) -> TokenData:
     token = auth.split(" ", 1)[1]
 
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
-        sub = payload.get("sub")
-        role = payload.get("role")
-
-        if not sub or not role:
-            raise HTTPException(status_code=401, detail="Invalid token payload")
-
-        return TokenData(sub=sub, role=role)
+        # full HMAC verification only on cache miss
+        return token_cache.get_or_verify(token, _decode)
 
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+    except RevokedTokenError:
+        raise HTTPException(status_code=401, detail="Revoked token")
+
+
+def _decode(token: str):
+    payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+    sub = payload.get("sub")
+    role = payload.get("role")
+
+    if not sub or not role:
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+
+    return TokenData(sub=sub, role=role), payload
 
 
 def require_roles(*allowed_roles):
@@ -1,10 +1,11 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
 
 # Shared auth (single source of truth)
 from .auth import verify_jwt, require_roles, TokenData
+from shared.jwt_cache import token_cache
 
 # -------------------------------------------------------
 # APP METADATA (Swagger polish)
@@ -115,4 +116,33 @@ def whoami(token: TokenData = Depends(verify_jwt)):
         "sub": token.sub,
         "role": token.role,
         "service": "reranker",
-    }
\ No newline at end of file
+    }
+
+
+class RevokeRequest(BaseModel):
+    token: Optional[str] = None   # revoke one token
+    sub: Optional[str] = None     # revoke every token of a subject
+
+
+@app.post(
+    "/auth/revoke",
+    tags=["Auth"],
+    summary="Revoke a token or subject (admin only)",
+)
+def revoke(
+    req: RevokeRequest,
+    token: TokenData = Depends(require_roles("admin")),
+):
+    """
+    Revocations are per process: revoke on the proxy AND here.
+    """
+    if not req.token and not req.sub:
+        raise HTTPException(status_code=422, detail="token or sub required")
+
+    cleared = 0
+    if req.token:
+        cleared += token_cache.revoke_token(req.token)
+    if req.sub:
+        cleared += token_cache.revoke_subject(req.sub)
+
+    return {"status": "revoked", "cleared": cleared}
@@ -0,0 +1,2 @@
+# Code shared by several services.  Images that need it are built from the
+# repo root and copy this package to /app/shared, next to their /app/app.
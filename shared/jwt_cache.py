@@ -0,0 +1,173 @@
+# shared/jwt_cache.py — used by cyborg-proxy (app.auth) and reranker (app.auth);
+# both images are built from the repo root and copy shared/ next to app/.
+
+import os
+import json
+import math
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+"""
+Verified JWT Cache
+------------------
+Bounded LRU of already-verified tokens:
+
+ - key      → SHA-256 digest of the raw token (tokens are never stored)
+ - value    → the service's verified claims object, built once per token
+ - expiry   → the token's own `exp` claim (JWT_CACHE_DEFAULT_TTL if absent)
+
+Revocation:
+ - revoke_token(token)  → evicts the entry and rejects the token until its
+                          own `exp` (read unverified from the token, so it
+                          works for tokens never seen or already evicted);
+                          tokens without `exp` stay revoked for good
+ - revoke_subject(sub)  → evicts every cached token of `sub` and rejects
+                          that subject until clear_subject(sub)
+
+Revocations live in process memory: each service (proxy, reranker)
+keeps its own list, so revoke on every service (POST /auth/revoke on
+each), and a restart forgets them — keep token lifetimes short.
+
+Environment variables:
+ - JWT_CACHE_SIZE         = max cached tokens (default 10000)
+ - JWT_CACHE_DEFAULT_TTL  = seconds to cache tokens without `exp` (default 300)
+"""
+
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+JWT_CACHE_DEFAULT_TTL = float(os.getenv("JWT_CACHE_DEFAULT_TTL", "300"))
+
+
+class RevokedTokenError(Exception):
+    pass
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def unverified_exp(token: str):
+    """`exp` claim of a JWT, read WITHOUT verification (None if absent/unreadable)."""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        exp = claims.get("exp")
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+
+class VerifiedTokenCache:
+    def __init__(self, max_entries: int = JWT_CACHE_SIZE, default_ttl: float = JWT_CACHE_DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()     # digest → (claims, expires_at, sub)
+        self._revoked_tokens = {}         # digest → expires_at
+        self._revoked_subjects = set()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_verify(self, token: str, verify):
+        """
+        Return cached claims for `token`, or call verify(token) once.
+
+        verify(token) must return (claims, payload) and raise on an
+        invalid token; payload supplies `exp` and `sub`.
+        """
+        digest = token_digest(token)
+        now = time.time()
+
+        with self._lock:
+            if digest in self._revoked_tokens:
+                raise RevokedTokenError("token revoked")
+
+            entry = self._entries.get(digest)
+            if entry is not None:
+                claims, expires_at, sub = entry
+                if expires_at > now:
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return claims
+                del self._entries[digest]
+                self.expirations += 1
+            self.misses += 1
+
+        claims, payload = verify(token)
+        sub = payload.get("sub")
+        exp = payload.get("exp")
+        expires_at = float(exp) if exp is not None else now + self.default_ttl
+
+        with self._lock:
+            if sub in self._revoked_subjects:
+                raise RevokedTokenError("subject revoked")
+            self._entries[digest] = (claims, expires_at, sub)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return claims
+
+    # -------------------------------------------------
+    # Revocation
+    # -------------------------------------------------
+    def revoke_token(self, token: str, expires_at: float = None) -> int:
+        """
+        Reject `token` until `expires_at`, by default the token's own
+        exp claim.  A token without exp never expires, so neither does
+        its revocation.
+        """
+        digest = token_digest(token)
+        if expires_at is None:
+            expires_at = unverified_exp(token)
+        if expires_at is None:
+            expires_at = math.inf
+        with self._lock:
+            entry = self._entries.pop(digest, None)
+            self._revoked_tokens[digest] = expires_at
+            self._purge_revoked()
+            return 1 if entry else 0
+
+    def revoke_subject(self, sub: str) -> int:
+        with self._lock:
+            self._revoked_subjects.add(sub)
+            stale = [d for d, (_, _, s) in self._entries.items() if s == sub]
+            for d in stale:
+                del self._entries[d]
+            return len(stale)
+
+    def clear_subject(self, sub: str):
+        with self._lock:
+            self._revoked_subjects.discard(sub)
+
+    def _purge_revoked(self):
+        now = time.time()
+        for d in [d for d, exp in self._revoked_tokens.items() if exp <= now]:
+            del self._revoked_tokens[d]
+
+    # -------------------------------------------------
+    # Metrics
+    # -------------------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "revoked_tokens": len(self._revoked_tokens),
+                "revoked_subjects": len(self._revoked_subjects),
+            }
+
+
+token_cache = VerifiedTokenCache()
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+
+def test_counter_nonces_use_64_bit_prefix_and_roll_over(load_agent):
+    crypto = load_agent("crypto", CRYPTO_COUNTER_LIMIT=8)
+    engine = crypto.CryptoEngine(workers=1, nonce_mode="counter")
+
+    first = engine.nonces(5)
+    second = engine.nonces(5)     # would pass the limit: fresh prefix
+    nonces = [blob[i:i + 12] for blob in (first, second) for i in range(0, len(blob), 12)]
+    assert len(set(nonces)) == 10
+    assert first[:8] != second[:8]
+    assert [int.from_bytes(n[8:], "big") for n in nonces] == [0, 1, 2, 3, 4] * 2
+
+    other = crypto.CryptoEngine(workers=1, nonce_mode="counter")
+    assert other.nonces(1)[:8] != second[:8]
+
+    with pytest.raises(ValueError):
+        engine.nonces(9)
+
+
+def test_counter_mode_round_trip(load_agent):
+    crypto = load_agent("crypto")
+    engine = crypto.CryptoEngine(workers=1, nonce_mode="counter")
+    key = os.urandom(32)
+    nonce, ct = engine.encrypt(key, b"case")
+    assert engine.decrypt(key, nonce, ct) == b"case"
+
+
+def test_decrypt_many_rejects_short_ciphertext_as_invalid_tag(load_agent):
+    crypto = load_agent("crypto")
+    engine = crypto.CryptoEngine(workers=1)
+    key = os.urandom(32)
+    nonce, ct = engine.encrypt(key, b"case")
+
+    with pytest.raises(InvalidTag):
+        engine.decrypt_many(key, [(nonce, ct), (nonce, ct[:5])])
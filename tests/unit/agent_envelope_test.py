@@ -0,0 +1,11 @@
+import pytest
+
+
+def test_short_or_truncated_envelopes_raise_value_error(load_agent):
+    envelope = load_agent("envelope")
+    data = envelope.pack_vector([0.5, -1.0, 2.0], {"age": 72})
+    assert envelope.unpack_vector(data)["metadata"] == {"age": 72}
+
+    for bad in (data[:4], data[:12], data[:-1], data + b"x"):
+        with pytest.raises(ValueError):
+            envelope.unpack_vector(bad)
@@ -0,0 +1,201 @@
+import os
+import json
+import sqlite3
+import importlib
+import time
+
+import pytest
+import requests
+from fastapi.testclient import TestClient
+
+
+def _jsonl(cases):
+    return "".join(json.dumps({"id": i, "text": t}) + "\n" for i, t in cases).encode()
+
+
+def _post(client, data, name="cases.jsonl", **params):
+    r = client.post("/ingest_csv", params=params, files={"file": (name, data)})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+class FakeProxy:
+    """post_batch_to_proxy stand-in; cases in `reject` come back rejected."""
+
+    def __init__(self):
+        self.stored = []
+        self.reject = set()
+
+    def __call__(self, records, tenant):
+        statuses = []
+        for r in records:
+            if r["case_id"] in self.reject:
+                statuses.append({"case_id": r["case_id"], "status": "rejected", "error": "bad dim"})
+            else:
+                self.stored.append(r["case_id"])
+                statuses.append({"case_id": r["case_id"], "status": "stored"})
+        return statuses
+
+
+def _agent(load_agent, monkeypatch, **env):
+    main = load_agent(**{"OUTBOX": "off", **env})
+    proxy = FakeProxy()
+    monkeypatch.setattr(main, "post_batch_to_proxy", proxy)
+    return main, TestClient(main.app), proxy
+
+
+def _wait(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _drained(main):
+    return lambda: main.outbox.stats()["pending"] == 0
+
+
+def _manifest_ids(main, tenant="HospitalA"):
+    with main.manifest._lock:
+        rows = main.manifest._conn().execute("SELECT case_id FROM manifest WHERE tenant = ?", (tenant,))
+        return sorted(case_id for (case_id,) in rows)
+
+
+def test_transport_error_interrupts_and_resumes(load_agent, monkeypatch):
+    main, client, proxy = _agent(load_agent, monkeypatch)
+    data = _jsonl((f"c{i}", f"case {i}") for i in range(30))
+
+    real = proxy.__call__
+    calls = []
+
+    def flaky(records, tenant):
+        calls.append(1)
+        if len(calls) == 2:
+            raise requests.ConnectionError("proxy unreachable")
+        return real(records, tenant)
+
+    monkeypatch.setattr(main, "post_batch_to_proxy", flaky)
+    r = _post(client, data, batch_size=10)
+    assert r["error"] == "ingest_interrupted"
+    assert 0 < r["resume_offset"] < len(data), r
+    job = client.get(f"/ingest_jobs/{r['job_id']}").json()
+    assert job["status"] == "interrupted" and job["failed"] == 0
+
+    r = _post(client, data, batch_size=10)
+    assert r["job"]["status"] == "completed" and r["resumed_from"] > 0
+    assert sorted(proxy.stored) == sorted(f"c{i}" for i in range(30))
+
+
+def test_outbox_rejected_row_is_resent_by_next_ingest(load_agent, monkeypatch):
+    main, client, proxy = _agent(load_agent, monkeypatch, OUTBOX="on")
+    proxy.reject = {"c1"}
+    with client:
+        _post(client, _jsonl([("c0", "a"), ("c1", "b"), ("c2", "c")]))
+        _wait(_drained(main))
+        assert main.outbox.stats()["dead"] == 1
+        assert _manifest_ids(main) == ["c0", "c2"]
+
+        # the index is fixed; the next export re-sends only the dead case
+        proxy.reject = set()
+        r = _post(client, _jsonl([("c0", "a"), ("c1", "b"), ("c2", "c"), ("c3", "d")]), name="next.jsonl")
+        assert r["skipped"] == 2
+        _wait(_drained(main))
+        assert main.outbox.stats()["dead"] == 0
+        assert sorted(proxy.stored) == ["c0", "c1", "c2", "c3"]
+        assert _manifest_ids(main) == ["c0", "c1", "c2", "c3"]
+
+
+def test_outbox_requeue_dead_rows(load_agent, monkeypatch):
+    main, client, proxy = _agent(load_agent, monkeypatch, OUTBOX="on")
+    proxy.reject = {"c0", "c1"}
+    with client:
+        _post(client, _jsonl([("c0", "a"), ("c1", "b")]))
+        _wait(lambda: main.outbox.stats()["dead"] == 2)
+
+        proxy.reject = set()
+        assert client.post("/outbox/requeue", json={"case_ids": ["c1"]}).json() == {"requeued": 1}
+        _wait(lambda: proxy.stored == ["c1"])
+        assert client.post("/outbox/requeue").json() == {"requeued": 1}
+        _wait(lambda: sorted(proxy.stored) == ["c0", "c1"])
+        assert main.outbox.stats()["dead"] == 0
+
+
+def test_outbox_sender_survives_storage_errors(load_agent, monkeypatch):
+    main, client, proxy = _agent(load_agent, monkeypatch, OUTBOX="on")
+    monkeypatch.setattr(importlib.import_module("app.outbox"), "_IDLE_SECONDS", 0.05)
+    real = main.outbox._deliver
+    calls = []
+
+    def flaky(tenant, rows):
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return real(tenant, rows)
+
+    monkeypatch.setattr(main.outbox, "_deliver", flaky)
+    with client:
+        _post(client, _jsonl([("c0", "a")]))
+        _wait(lambda: proxy.stored == ["c0"])
+        stats = main.outbox.stats()
+        assert stats["running"] and stats["pending"] == 0
+
+
+class FakeDeletes:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, case_ids, tenant):
+        self.calls.append(sorted(case_ids))
+        return {"deleted": len(case_ids), "missing": []}
+
+
+class FakeResponse:
+    def json(self):
+        return {"status": "ok"}
+
+
+def test_snapshot_sync_leaves_example_case_alone(load_agent, monkeypatch):
+    example = os.path.join(os.path.dirname(__file__), "..", "..", "examples", "example_a.json")
+    main, client, proxy = _agent(load_agent, monkeypatch, EXAMPLE_PATH=example)
+    deletes = FakeDeletes()
+    monkeypatch.setattr(main, "post_to_proxy", lambda payload, tenant: FakeResponse())
+    monkeypatch.setattr(main, "post_delete_to_proxy", deletes)
+
+    assert client.post("/ingest_example").json()["sent_to_proxy"] is True
+    _post(client, _jsonl([("c0", "a"), ("c1", "b")]), sync="true")
+    r = _post(client, _jsonl([("c0", "a")]), name="next.jsonl", sync="true")
+
+    assert r["deletes"]["deleted"] == 1
+    assert deletes.calls == [["c1"]]
+    assert _manifest_ids(main) == ["a-001", "c0"]
+
+
+def test_reposting_an_older_snapshot_is_synced_again(load_agent, monkeypatch):
+    main, client, proxy = _agent(load_agent, monkeypatch)
+    deletes = FakeDeletes()
+    monkeypatch.setattr(main, "post_delete_to_proxy", deletes)
+    snapshot_a = _jsonl([("c0", "a"), ("c1", "b")])
+    snapshot_b = _jsonl([("c1", "b"), ("c2", "c")])
+
+    _post(client, snapshot_a, name="a.jsonl", sync="true")
+    _post(client, snapshot_b, name="b.jsonl", sync="true")
+    r = _post(client, snapshot_a, name="a.jsonl", sync="true")
+
+    assert "already_completed" not in r
+    assert r["skipped"] == 1 and r["stored"] == 1
+    assert deletes.calls == [["c0"], ["c2"]]
+    assert sorted(proxy.stored) == ["c0", "c0", "c1", "c2"]
+    assert _manifest_ids(main) == ["c0", "c1"]
+
+
+def test_example_goes_through_the_outbox(load_agent, monkeypatch):
+    example = os.path.join(os.path.dirname(__file__), "..", "..", "examples", "example_a.json")
+    main, client, proxy = _agent(load_agent, monkeypatch, OUTBOX="on", EXAMPLE_PATH=example)
+    monkeypatch.setattr(main, "post_to_proxy", lambda payload, tenant: pytest.fail("bypassed the outbox"))
+
+    with client:
+        r = client.post("/ingest_example").json()
+        assert r["status"] == "queued" and r["case_id"] == "a-001"
+        _wait(lambda: proxy.stored == ["a-001"])
+        assert _manifest_ids(main) == ["a-001"]
+        assert client.post("/ingest_example").json()["status"] == "unchanged"
@@ -0,0 +1,59 @@
+import time
+
+
+def _record(case_id, ct="ct"):
+    return {"case_id": case_id, "enc_blob": {"ciphertext": ct, "nonce": "n"}}
+
+
+def _drain_once(box):
+    groups = {}
+    for seq, tenant, record, attempts in box._due():
+        groups.setdefault(tenant, []).append((seq, record, attempts))
+    for tenant, group in groups.items():
+        box._deliver(tenant, group)
+
+
+def test_transport_failure_backs_off_then_goes_dead(load_agent, tmp_path):
+    outbox = load_agent("outbox", OUTBOX_MAX_ATTEMPTS=2, OUTBOX_BACKOFF_BASE=0.2)
+    box = outbox.Outbox(str(tmp_path / "o.sqlite"))
+    dead = []
+    box._on_dead = lambda tenant, ids: dead.append((tenant, ids))
+
+    def down(tenant, records):
+        raise ConnectionError("proxy unreachable")
+
+    box._send = down
+    box.enqueue("H", [_record("c0")])
+
+    _drain_once(box)
+    assert box.stats()["pending"] == 1 and box._due() == []   # backing off
+    time.sleep(0.25)
+    _drain_once(box)
+    assert box.stats()["dead"] == 1 and dead == [("H", ["c0"])]
+
+    assert box.requeue("H") == 1
+    box._send = lambda tenant, records: [{"case_id": r["case_id"], "status": "stored"} for r in records]
+    _drain_once(box)
+    stats = box.stats()
+    assert stats["pending"] == 0 and stats["dead"] == 0 and stats["sent"] == 1
+
+
+def test_newer_version_replaces_pending_and_dead_rows(load_agent, tmp_path):
+    outbox = load_agent("outbox")
+    box = outbox.Outbox(str(tmp_path / "o.sqlite"))
+    sent = []
+    box._send = lambda tenant, records: sent.extend(records) or [
+        {"case_id": r["case_id"], "status": "rejected" if r["enc_blob"]["ciphertext"] == "bad" else "stored"}
+        for r in records
+    ]
+
+    box.enqueue("H", [_record("c0", "v1"), _record("c1", "bad")])
+    box.enqueue("H", [_record("c0", "v2")])
+    _drain_once(box)
+    assert [r["enc_blob"]["ciphertext"] for r in sent] == ["bad", "v2"]
+    assert box.dead("H", ["c0", "c1"]) == ["c1"]
+
+    box.enqueue("H", [_record("c1", "fixed")])
+    assert box.stats()["dead"] == 0
+    _drain_once(box)
+    assert sent[-1]["enc_blob"]["ciphertext"] == "fixed" and box.stats()["pending"] == 0
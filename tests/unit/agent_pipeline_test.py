@@ -0,0 +1,64 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+
+def _rows(n, read):
+    for i in range(n):
+        read.append(i)
+        yield SimpleNamespace(id=f"c{i}", text=f"case {i}")
+
+
+def _embed(texts):
+    return [[0.0] for _ in texts]
+
+
+def _encrypt(cases, vectors):
+    return [{"id": c.id} for c in cases]
+
+
+def test_stage_error_cancels_the_others(load_agent):
+    pipeline = load_agent("pipeline", PIPELINE_QUEUE_DEPTH=1)
+    read, batches = [], []
+
+    def embed(texts):
+        batches.append(len(texts))
+        if len(batches) == 2:
+            raise RuntimeError("model crashed")
+        return _embed(texts)
+
+    with pytest.raises(RuntimeError, match="model crashed"):
+        asyncio.run(asyncio.wait_for(pipeline.run_pipeline(
+            _rows(10_000, read), embed, _encrypt, lambda records: [], batch_size=10,
+        ), timeout=5))
+
+    # the reader stopped instead of draining the whole input
+    assert len(read) < 100 and len(batches) == 2
+
+
+def test_in_flight_batch_commits_before_the_error_is_raised(load_agent):
+    pipeline = load_agent("pipeline")
+    commits = []
+
+    def encrypt(cases, vectors):
+        if cases[0].id != "c0":
+            raise RuntimeError("encrypt failed")
+        return _encrypt(cases, vectors)
+
+    def upload(records):
+        time.sleep(0.2)     # batch 0 still uploading when batch 1 fails
+        return [{"id": r["id"], "status": "ok"} for r in records]
+
+    async def run():
+        with pytest.raises(RuntimeError, match="encrypt failed"):
+            await pipeline.run_pipeline(
+                _rows(30, []), _embed, encrypt, upload, batch_size=10,
+                on_commit=lambda batch, statuses: commits.append(batch[0].id),
+            )
+        seen = list(commits)
+        await asyncio.sleep(0.3)
+        return seen
+
+    assert asyncio.run(run()) == ["c0"] and commits == ["c0"]
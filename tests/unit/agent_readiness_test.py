@@ -0,0 +1,116 @@
+import json
+import importlib
+import logging
+import os
+import time
+from concurrent.futures import Future
+
+from fastapi.testclient import TestClient
+
+
+def _tenants_config(tmp_path):
+    cfg = {
+        "default": "HospitalA",
+        "tenants": [
+            {"name": "HospitalA", "key_mode": "kms", "kms_key_path": str(tmp_path / "a.key")},
+            {"name": "HospitalB", "key_mode": "kms", "kms_key_path": str(tmp_path / "b.key")},
+        ],
+    }
+    (tmp_path / "a.key").write_bytes(os.urandom(32))
+    path = tmp_path / "tenants.json"
+    path.write_text(json.dumps(cfg))
+    return path
+
+
+def _wait_warm(main):
+    deadline = time.time() + 10
+    while not main.readiness["warm"] and not main.readiness["error"]:
+        assert time.time() < deadline, main.readiness
+        time.sleep(0.01)
+
+
+def test_failed_tenant_key_does_not_block_model_or_others(load_agent, tmp_path):
+    main = load_agent(
+        TENANTS_CONFIG=_tenants_config(tmp_path), OUTBOX="off", KEY_RETRY_SECONDS=0,
+    )
+    with TestClient(main.app) as client:
+        _wait_warm(main)
+        assert main.readiness["model"] and main.readiness["error"] is None
+
+        r = client.get("/ready")
+        assert r.status_code == 200
+        assert r.json()["tenants"] == {"HospitalA": True, "HospitalB": False}
+        assert client.get("/tenants/HospitalA/ready").status_code == 200
+        assert client.get("/tenants/HospitalB/ready").status_code == 503
+
+        # the KMS key shows up later: the next probe picks it up
+        (tmp_path / "b.key").write_bytes(os.urandom(32))
+        assert client.get("/tenants/HospitalB/ready").status_code == 200
+        assert client.get("/ready").json()["tenants"]["HospitalB"] is True
+
+
+def test_tenant_key_retries_with_backoff(load_agent, tmp_path, monkeypatch):
+    tenants = load_agent("tenants", KEY_RETRY_SECONDS=30)
+    path = tmp_path / "missing.key"
+    tenant = tenants.Tenant("HospitalB", key_mode="kms", kms_key_path=str(path))
+
+    calls = []
+    real = tenant.load_key
+    monkeypatch.setattr(tenant, "load_key", lambda: calls.append(1) or real())
+
+    assert tenant.key is None and len(calls) == 1
+    assert "not found" in tenant.error
+
+    path.write_bytes(os.urandom(32))
+    assert tenant.key is None and len(calls) == 1   # still backing off
+
+    now = time.monotonic()
+    monkeypatch.setattr(tenants.time, "monotonic", lambda: now + 31)
+    assert tenant.key is not None and len(calls) == 2
+    assert tenant.error is None
+
+
+def test_embedding_requests_wait_for_the_worker_pool(load_agent):
+    main = load_agent(OUTBOX="off", EMBED_WORKERS=2)
+    client = TestClient(main.app)
+
+    # lifespan not run → pool never started: no fallback model in the parent
+    r = client.post("/ingest_case", json={"id": "c0", "text": "chest pain"})
+    assert r.status_code == 503 and "embedding pool" in r.json()["detail"]
+    assert client.post("/encrypt_query", params={"text": "q"}).status_code == 503
+    r = client.post("/ingest_csv", files={"file": ("c.jsonl", b'{"id": "c0", "text": "a"}\n')})
+    assert r.status_code == 503
+
+
+def test_pool_is_published_only_after_the_probes(load_agent, monkeypatch):
+    embed_pool = load_agent("embed_pool")
+    pool = embed_pool.EmbeddingPool(workers=2)
+    seen = []
+
+    class FakeExecutor:
+        def __init__(self, **kwargs):
+            pass
+
+        def submit(self, fn):
+            future = Future()
+            seen.append(pool.running)
+            future.set_result((384, "fake"))
+            return future
+
+    monkeypatch.setattr(embed_pool, "ProcessPoolExecutor", FakeExecutor)
+    pool.start()
+    assert seen == [False, False]
+    assert pool.running and pool.dim == 384 and pool.cache_name == "fake"
+
+
+def test_onnx_fallback_is_logged(load_agent, monkeypatch, caplog):
+    embeddings = load_agent("embeddings", EMBED_BACKEND="onnx")
+    onnx_backend = importlib.import_module("app.onnx_backend")
+
+    def broken(model, get_model):
+        raise RuntimeError("export failed")
+
+    monkeypatch.setattr(onnx_backend, "load_or_export", broken)
+    with caplog.at_level(logging.WARNING, logger="app.embeddings"):
+        assert embeddings.get_backend()[0] == "torch"
+    assert "export failed" in caplog.text
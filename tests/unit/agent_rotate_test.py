@@ -0,0 +1,146 @@
+import os
+import base64
+import importlib
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+INDEX = "HospitalA"
+
+
+class MockProxy:
+    """rotate.ProxyClient over the CyborgDB mock, translated like the proxy does."""
+
+    def __init__(self, client, before_store=None):
+        self.client = client
+        self.before_store = before_store
+
+    def scan(self, cursor, end=None, limit=500):
+        params = {"index": INDEX, "cursor": cursor, "limit": limit}
+        if end is not None:
+            params["end"] = end
+        page = self.client.get("/scan", params=params).json()
+        page["records"] = [
+            {
+                "case_id": r["id"],
+                "enc_blob": _stored_blob(r),
+                "has_search_vector": r["has_embedding"],
+                "row": r["row"],
+            }
+            for r in page["records"]
+        ]
+        return page
+
+    def store(self, records):
+        if self.before_store is not None:
+            self.before_store()
+            self.before_store = None
+        r = self.client.post("/insert_batch", json={"index": INDEX, "records": [_mock_record(r) for r in records]})
+        return [{"case_id": s.pop("id"), **s} for s in r.json()["results"]]
+
+
+def _mock_record(r):
+    enc = r["enc_blob"]
+    out = {"id": r["case_id"], "vector": enc["ciphertext"], "nonce": enc["nonce"]}
+    out.update({k: enc[k] for k in ("encoding", "kid") if k in enc})
+    if r.get("if_row") is not None:
+        out["if_row"] = r["if_row"]
+    return out
+
+
+def _stored_blob(rec):
+    return {"nonce": rec["nonce"], "ciphertext": rec["vector"], **{k: rec[k] for k in ("encoding", "kid") if k in rec}}
+
+
+def _encrypt(rotate, key, cases):
+    pack_vector = importlib.import_module("app.envelope").pack_vector
+    blobs = rotate.data_keys.encrypt_vectors(
+        key, [pack_vector(np.ones(4), meta) for _, meta in cases], [case_id for case_id, _ in cases],
+    )
+    return [{"case_id": case_id, "enc_blob": enc} for (case_id, _), enc in zip(cases, blobs)]
+
+
+def test_rotation_racing_an_update_and_a_delete(load_service, load_agent, tmp_path):
+    mock = load_service("cyborgdb-mock", DATA_DIR=tmp_path / "db", VECTOR_DIM=4)
+    client = TestClient(mock.app)
+    rotate = load_agent("rotate", SEARCH_MODE="off")
+
+    old, new = os.urandom(32), os.urandom(32)
+    seed = _encrypt(rotate, old, [(f"c{i}", {"v": 1}) for i in range(20)])
+    client.post("/insert_batch", json={"index": INDEX, "records": [_mock_record(r) for r in seed]})
+
+    def race():
+        # the agent (already on the new key) updates c3 and deletes c5
+        # while the first page is being re-encrypted
+        update = _encrypt(rotate, new, [("c3", {"v": 2})])
+        client.post("/insert_batch", json={"index": INDEX, "records": [_mock_record(r) for r in update]})
+        client.post("/delete_batch", json={"index": INDEX, "ids": ["c5"]})
+
+    summary = rotate.run_rotation(INDEX, old, new, MockProxy(client, race), workers=1, page_size=10)
+    assert summary["scanned"] == 20
+    assert summary["superseded"] == 2 and summary["skipped"] == 2
+    assert summary["rotated"] == 18 and summary["failed"] == 0
+
+    store = mock.get_store(INDEX)
+    assert store.get("c5") is None
+    plain = rotate.data_keys.decrypt_blob(new, _stored_blob(store.get("c3")))
+    assert rotate.unpack_vector(plain)["metadata"] == {"v": 2}
+
+    # every surviving case is readable with the new key only
+    for case_id in store.ids():
+        rotate.data_keys.decrypt_blob(new, _stored_blob(store.get(case_id)))
+
+
+def test_interrupted_rotation_resumes_without_rewriting(load_service, load_agent, tmp_path):
+    mock = load_service("cyborgdb-mock", DATA_DIR=tmp_path / "db", VECTOR_DIM=4)
+    client = TestClient(mock.app)
+    rotate = load_agent("rotate", SEARCH_MODE="off")
+
+    old, new = os.urandom(32), os.urandom(32)
+    seed = _encrypt(rotate, old, [(f"c{i}", {"v": 1}) for i in range(30)])
+    client.post("/insert_batch", json={"index": INDEX, "records": [_mock_record(r) for r in seed]})
+
+    class Flaky(MockProxy):
+        calls = 0
+
+        def store(self, records):
+            Flaky.calls += 1
+            if Flaky.calls == 2:
+                raise ConnectionError("proxy unreachable")
+            return super().store(records)
+
+    with pytest.raises(ConnectionError):
+        rotate.run_rotation(INDEX, old, new, Flaky(client), workers=1, page_size=10)
+
+    summary = rotate.run_rotation(INDEX, old, new, MockProxy(client), workers=1, page_size=10)
+    assert summary["resumed_from"] == 10
+    assert summary["rotated"] == 30 and summary["already_rotated"] == 0
+    assert summary["superseded"] == 0 and summary["failed"] == 0
+    assert mock.get_store(INDEX).rows == 60
+
+
+def test_corrupt_blobs_are_reported_without_interrupting(load_service, load_agent, tmp_path):
+    mock = load_service("cyborgdb-mock", DATA_DIR=tmp_path / "db", VECTOR_DIM=4)
+    client = TestClient(mock.app)
+    rotate = load_agent("rotate", SEARCH_MODE="keyed")
+    pack_vector = importlib.import_module("app.envelope").pack_vector
+
+    old, new = os.urandom(32), os.urandom(32)
+    seed = _encrypt(rotate, old, [(f"c{i}", {"v": 1}) for i in range(6)])
+    nonce = base64.b64encode(os.urandom(12)).decode()
+    seed.append({"case_id": "short", "enc_blob": {"nonce": nonce, "ciphertext": base64.b64encode(b"x" * 5).decode(), "encoding": "base64"}})
+    seed.append({"case_id": "garbled", "enc_blob": {"nonce": nonce, "ciphertext": "@@not base64@@", "encoding": "base64"}})
+    truncated = rotate.data_keys.encrypt_vectors(old, [pack_vector(np.ones(4), {"v": 1})[:-3]], ["truncated"])[0]
+    seed.append({"case_id": "truncated", "enc_blob": truncated})
+
+    records = [_mock_record(r) for r in seed]
+    for r in records:
+        r["embedding"] = [0.5] * 4
+    client.post("/insert_batch", json={"index": INDEX, "records": records})
+
+    summary = rotate.run_rotation(INDEX, old, new, MockProxy(client), workers=1, page_size=20)
+    assert summary["scanned"] == 9 and summary["rotated"] == 6 and summary["failed"] == 3
+    assert {d["case_id"]: d["error"] for d in summary["details"]} == {
+        "short": "undecryptable", "garbled": "undecryptable", "truncated": "malformed",
+    }
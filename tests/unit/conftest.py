@@ -0,0 +1,80 @@
+import os
+import sys
+import hashlib
+import importlib
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _purge_app():
+    # every service ships its own top-level `app` package (+ the repo's `shared`)
+    for name in list(sys.modules):
+        if name in ("app", "shared") or name.startswith(("app.", "shared.")):
+            del sys.modules[name]
+
+
+@pytest.fixture
+def load_service(monkeypatch):
+    """
+    Import `<service>/app/<module>` (or a `shared.*` module) fresh with the
+    given environment.  Calling it again with the same env simulates a
+    process restart.
+    """
+    added = []
+
+    def load(service, module="main", **env):
+        for key, value in env.items():
+            monkeypatch.setenv(key, str(value))
+        _purge_app()
+        # images copy <service>/app and shared/ side by side under /app
+        for path in (ROOT, os.path.join(ROOT, service)):
+            if path not in sys.path:
+                sys.path.insert(0, path)
+                added.append(path)
+        return importlib.import_module(module if module.startswith("shared.") else f"app.{module}")
+
+    yield load
+
+    _purge_app()
+    for path in added:
+        sys.path.remove(path)
+
+
+class FakeModel:
+    """Deterministic unit vectors per text, instead of downloading a model."""
+
+    def encode(self, texts, **kwargs):
+        out = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+            v = np.random.default_rng(seed).standard_normal(384).astype(np.float32)
+            out.append(v / np.linalg.norm(v))
+        return np.asarray(out)
+
+
+@pytest.fixture
+def load_agent(load_service, tmp_path):
+    """
+    Import the hospital agent with its keys and state under tmp_path and a
+    fake embedding model.  Calling it again simulates a restart.
+    """
+    def load(module="main", **env):
+        state = tmp_path / "state"
+        state.mkdir(exist_ok=True)
+        defaults = {
+            "KEY_MODE": "file",
+            "KEY_PATH": tmp_path / "keys" / "hospital_a.key",
+            "STATE_DIR": state,
+            "MANIFEST_PATH": state / "manifest.sqlite",
+            "OUTBOX_PATH": state / "outbox.sqlite",
+            "EMBED_CACHE_PATH": state / "embed_cache.sqlite",
+            "CYBORG_PROXY_URL": "http://proxy.invalid",
+        }
+        mod = load_service("hospital-agent", module, **{**defaults, **env})
+        importlib.import_module("app.embeddings")._model = FakeModel()
+        return mod
+
+    return load
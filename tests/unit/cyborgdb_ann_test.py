@@ -0,0 +1,166 @@
+import json
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+DIM = 16
+
+
+def _mock(load_service, data_dir):
+    main = load_service("cyborgdb-mock", DATA_DIR=data_dir, VECTOR_DIM=DIM, VECTOR_DTYPE="float32")
+    return main, TestClient(main.app)
+
+
+def _vectors(n, seed=0):
+    v = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _insert(client, index, vectors, prefix="c"):
+    records = [
+        {"id": f"{prefix}{i}", "vector": "ct", "nonce": "n", "embedding": v.tolist()}
+        for i, v in enumerate(vectors)
+    ]
+    r = client.post("/insert_batch", json={"index": index, "records": records})
+    assert r.status_code == 200
+
+
+def _search(client, index, q, top_k=5):
+    r = client.post("/search", json={
+        "index": index, "vector": "ct", "nonce": "n", "embedding": q.tolist(), "top_k": top_k,
+    })
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _configure(client, index, kind, params, storage="float"):
+    return client.post("/indexes", json={"index": index, "kind": kind, "storage": storage, "params": params})
+
+
+def test_ivf_reconfigure_nlist_and_restart(load_service, tmp_path):
+    _, client = _mock(load_service, tmp_path)
+    vecs = _vectors(400)
+    _insert(client, "H", vecs)
+
+    r = _configure(client, "H", "ivf", {"nlist": 16, "train_size": 64})
+    assert r.status_code == 200 and r.json()["trained"]
+
+    r = _configure(client, "H", "ivf", {"nlist": 4, "train_size": 64, "nprobe": 4})
+    assert r.status_code == 200, r.text
+    assert r.json()["nlist"] == 4 and r.json()["trained"]
+    assert _search(client, "H", vecs[7])[0]["id"] == "c7"
+
+    # restart: persisted centroids/assignments must match the new nlist
+    main, client = _mock(load_service, tmp_path)
+    assert _search(client, "H", vecs[11])[0]["id"] == "c11"
+    assert main._anns["H"].centroids.shape == (4, DIM)
+
+
+def test_ivf_kind_round_trip(load_service, tmp_path):
+    _, client = _mock(load_service, tmp_path)
+    vecs = _vectors(300)
+    _insert(client, "H", vecs[:200])
+
+    assert _configure(client, "H", "ivf", {"nlist": 8, "train_size": 64}).status_code == 200
+    assert _configure(client, "H", "hnsw", {"M": 8}).status_code == 200
+    _insert(client, "H", vecs[200:], prefix="d")
+    r = _configure(client, "H", "ivf", {"nlist": 12, "train_size": 64, "nprobe": 12})
+    assert r.status_code == 200, r.text
+
+    main, client = _mock(load_service, tmp_path)
+    assert _search(client, "H", vecs[250])[0]["id"] == "d50"
+    assert main._anns["H"].centroids.shape == (12, DIM)
+
+
+def test_kmeans_centroids_are_unit_length(load_service):
+    ann = load_service("cyborgdb-mock", "ann")
+    centroids = ann.kmeans(_vectors(200) * 3.0, 8)
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0, atol=1e-5)
+
+
+def test_invalid_pq_m_is_rejected_and_keeps_config(load_service, tmp_path):
+    _, client = _mock(load_service, tmp_path)
+    vecs = _vectors(300)
+    _insert(client, "H", vecs)
+    assert _configure(client, "H", "ivf", {"nlist": 8, "train_size": 64}).status_code == 200
+
+    r = _configure(client, "H", "flat", {"pq_m": 5}, storage="pq")
+    assert r.status_code == 400 and "pq_m=5" in r.json()["detail"]
+    for bad in ({"nlist": 0}, {"M": 1}, {"nprobe": "x"}, {"recall_target": 2}):
+        assert _configure(client, "H", "ivf", bad).status_code == 400
+
+    with open(tmp_path / "H" / "index.json") as f:
+        assert json.load(f)["kind"] == "ivf"
+
+    # restart: the previous config still opens and serves
+    _, client = _mock(load_service, tmp_path)
+    _insert(client, "H", vecs[:1], prefix="new")
+    assert _search(client, "H", vecs[5])[0]["id"] == "c5"
+
+
+def test_pq_reconfigure_m_and_restart(load_service, tmp_path):
+    main, client = _mock(load_service, tmp_path)
+    vecs = _vectors(400)
+    _insert(client, "H", vecs)
+    params = {"pq_train_size": 256, "recall_target": 0.9, "rescore": "false"}
+
+    # training runs in the background: the request does not wait for it
+    r = _configure(client, "H", "flat", {**params, "pq_m": 4}, storage="pq")
+    assert r.status_code == 200 and r.json()["training"] and not r.json()["rescore"]
+
+    r = _configure(client, "H", "flat", {**params, "pq_m": 8}, storage="pq")
+    assert r.status_code == 200, r.text
+    assert r.json()["pq_m"] == 8
+    main._anns["H"].codec.wait()
+    stats = client.get("/indexes/H").json()
+    assert stats["trained"] and not stats["training"]
+    assert _search(client, "H", vecs[3])[0]["id"] == "c3"
+    assert _configure(client, "H", "flat", {"rescore": "maybe"}, storage="pq").status_code == 400
+
+    main, client = _mock(load_service, tmp_path)
+    assert _search(client, "H", vecs[9])[0]["id"] == "c9"
+    assert main._anns["H"].codec.pq.codebooks.shape[0] == 8
+
+
+def test_out_of_order_adds_cover_every_row(load_service, tmp_path):
+    main, client = _mock(load_service, tmp_path)
+    vecs = _vectors(120)
+    _insert(client, "H", vecs[:60])
+    assert _configure(client, "H", "ivf", {"nlist": 4, "train_size": 32}).status_code == 200
+    assert _configure(client, "H", "hnsw", {"M": 8}).status_code == 200
+
+    store = main.get_store("H")
+    ivf = main.open_index(store, {"kind": "ivf", "params": {"nlist": 4, "train_size": 32}})
+    hnsw = main._anns["H"]
+
+    # two requests append, then call add() in the opposite order
+    def records(lo, hi):
+        return [{"id": f"d{i}", "vector": "ct", "nonce": "n", "embedding": vecs[i].tolist()} for i in range(lo, hi)]
+
+    first, second = store.append(records(60, 90)), store.append(records(90, 120))
+    for index in (ivf, hnsw):
+        index.add(second)
+        index.add(first)
+
+    assert len(ivf._assign) == 120 and sum(len(l) for l in ivf._lists) == 120
+    assert hnsw.count == 120 and set(hnsw.levels) == set(range(120))
+
+
+def test_pq_out_of_order_adds_encode_every_row(load_service, tmp_path):
+    main, client = _mock(load_service, tmp_path)
+    vecs = _vectors(360)
+    _insert(client, "H", vecs[:300])
+    assert _configure(client, "H", "flat", {"pq_m": 4, "pq_train_size": 256}, storage="pq").status_code == 200
+    codec = main._anns["H"].codec
+    codec.wait()
+
+    store = main.get_store("H")
+
+    def records(lo, hi):
+        return [{"id": f"d{i}", "vector": "ct", "nonce": "n", "embedding": vecs[i].tolist()} for i in range(lo, hi)]
+
+    first, second = store.append(records(300, 330)), store.append(records(330, 360))
+    codec.add(second)
+    codec.add(first)
+    assert codec._codes.shape == (360, 4)
+    assert np.array_equal(codec._codes[300:330], codec.pq.encode(vecs[300:330]))
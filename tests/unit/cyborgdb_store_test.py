@@ -0,0 +1,20 @@
+from fastapi.testclient import TestClient
+
+
+def test_ids_with_line_breaks_survive_restart(load_service, tmp_path):
+    main = load_service("cyborgdb-mock", DATA_DIR=tmp_path, VECTOR_DIM=4)
+    client = TestClient(main.app)
+    ids = ["plain", "cr\rid", "sep\u2028id", "ff\x0cid", "nel\x85id"]
+    records = [{"id": i, "vector": "ct", "nonce": "n"} for i in ids + ["bad\nid"]]
+
+    r = client.post("/insert_batch", json={"index": "H", "records": records}).json()
+    assert r["stored"] == 5 and r["rejected"] == 1
+    assert r["results"][-1]["error"] == "id must not contain a newline"
+    assert client.post("/insert", json={"index": "H", "id": "x\ny", "vector": "ct", "nonce": "n"}).status_code == 400
+
+    # restart: every row maps back to its own id
+    main = load_service("cyborgdb-mock", DATA_DIR=tmp_path, VECTOR_DIM=4)
+    store = main.get_store("H")
+    assert store.rows == 5
+    assert [store.row_id(row) for row in range(5)] == ids
+    assert store.get("cr\rid")["id"] == "cr\rid"
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+
+SECRET = "dev-secret-change-me"
+
+
+def _token(sub="alice", role="clinician", **claims):
+    return jwt.encode({"sub": sub, "role": role, **claims}, SECRET)
+
+
+def _verify(token):
+    payload = jwt.decode(token, SECRET, algorithms=["HS256"])
+    return payload["sub"], payload
+
+
+def test_revocation_of_uncached_token_lasts_until_exp(load_service, monkeypatch):
+    cache_mod = load_service("cyborg-proxy", "shared.jwt_cache")
+    cache = cache_mod.VerifiedTokenCache(default_ttl=300)
+    now = time.time()
+    token = _token(exp=int(now) + 3600)
+
+    # never verified / cached before the revoke
+    assert cache.revoke_token(token) == 0
+
+    # past the default TTL; the next revoke purges expired revocations
+    monkeypatch.setattr(cache_mod.time, "time", lambda: now + 400)
+    cache.revoke_token(_token(sub="bob", exp=int(now) + 100))
+
+    with pytest.raises(cache_mod.RevokedTokenError):
+        cache.get_or_verify(token, _verify)
+
+
+def test_revocation_without_exp_never_lapses(load_service, monkeypatch):
+    cache_mod = load_service("cyborg-proxy", "shared.jwt_cache")
+    cache = cache_mod.VerifiedTokenCache(default_ttl=300)
+    token = _token()
+    cache.get_or_verify(token, _verify)
+    assert cache.revoke_token(token) == 1
+
+    later = time.time() + 10 ** 6
+    monkeypatch.setattr(cache_mod.time, "time", lambda: later)
+    cache.revoke_token(_token(sub="bob"))
+    with pytest.raises(cache_mod.RevokedTokenError):
+        cache.get_or_verify(token, _verify)
+
+
+def test_reranker_revoke_endpoint(load_service):
+    main = load_service("reranker", JWT_SECRET=SECRET)
+    client = TestClient(main.app)
+    # one cache implementation for both services (no per-service copy)
+    assert type(main.token_cache).__module__ == "shared.jwt_cache"
+    victim = _token(exp=int(time.time()) + 3600)
+    admin = {"Authorization": f"Bearer {_token(sub='root', role='admin')}"}
+
+    assert client.get("/whoami", headers={"Authorization": f"Bearer {victim}"}).status_code == 200
+    assert client.post("/auth/revoke", json={"token": victim}, headers=admin).json()["cleared"] == 1
+    assert client.get("/whoami", headers={"Authorization": f"Bearer {victim}"}).status_code == 401
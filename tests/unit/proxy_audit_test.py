@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+import time
+import threading
+
+
+def _writer(load_service, tmp_path, **env):
+    audit = load_service("cyborg-proxy", "audit", AUDIT_FSYNC="never", **env)
+    return audit, audit.AuditWriter(str(tmp_path / "audit.log"))
+
+
+def _entry(i):
+    return {"ts": f"t{i}", "actor": "a", "role": "admin", "action": "x", "filename": str(i)}
+
+
+def _verify(audit, path):
+    with open(path) as f:
+        entries = [json.loads(line) for line in f]
+    prev = audit.GENESIS_HASH
+    for e in entries:
+        assert e["prev"] == prev and audit.chain_hash(prev, e) == e["hash"]
+        prev = e["hash"]
+    return entries
+
+
+class _FailingFile:
+    """Writes half of the data, then fails like a full disk."""
+
+    def __init__(self, real):
+        self.real = real
+
+    def tell(self):
+        return self.real.tell()
+
+    def write(self, data):
+        self.real.write(data[: len(data) // 2])
+        self.real.flush()
+        raise OSError(28, "No space left on device")
+
+    def flush(self):
+        self.real.flush()
+
+    def close(self):
+        self.real.close()
+
+
+def test_full_queue_applies_backpressure(load_service, tmp_path):
+    _, writer = _writer(load_service, tmp_path, AUDIT_QUEUE_SIZE=1)
+    assert writer.submit(_entry(0))
+    assert writer.try_submit(_entry(1)) is False
+
+    # the writer frees a slot while the producer waits → nothing is lost
+    threading.Timer(0.1, writer._queue.get_nowait).start()
+    assert writer.submit(_entry(1), timeout=5)
+    assert writer.backpressure_events == 1 and writer.dropped == 0
+
+    # the writer never catches up → give up after the timeout, counted
+    t0 = time.perf_counter()
+    assert writer.submit(_entry(2), timeout=0.1) is False
+    assert time.perf_counter() - t0 >= 0.1
+    assert writer.dropped == 1
+
+
+def test_failed_write_keeps_chain_intact(load_service, tmp_path):
+    audit, writer = _writer(load_service, tmp_path)
+    writer._file = open(writer.path, "a")
+
+    writer._commit([_entry(0), _entry(1)])
+    head = writer.last_hash
+
+    writer._file = _FailingFile(writer._file)
+    writer._commit([_entry(2), _entry(3)])
+    assert writer.last_hash == head
+    assert writer.errors == 1 and writer.dropped == 2
+
+    writer._commit([_entry(4)])
+    writer._file.close()
+
+    entries = _verify(audit, writer.path)
+    assert [e["filename"] for e in entries] == ["0", "1", "4"]
+
+
+def test_verify_chain_detects_a_cut_head(load_service, tmp_path):
+    audit, writer = _writer(load_service, tmp_path)
+    writer._file = open(writer.path, "a")
+    writer._commit([_entry(i) for i in range(4)])
+    writer._file.close()
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "tools"))
+    try:
+        import audit_analyzer
+    finally:
+        sys.path.pop(0)
+
+    with open(writer.path, "rb") as f:
+        lines = f.read().splitlines()
+    assert audit_analyzer.verify_chain(lines)
+    assert not audit_analyzer.verify_chain(lines[1:])
+
+    # a chain anchored to a legacy (unchained) head line still verifies
+    legacy = json.dumps({"ts": "t", "actor": "a", "role": "admin", "action": "old", "filename": ""}).encode()
+    writer._file = open(writer.path, "w")
+    writer._file.write(legacy.decode() + "\n")
+    writer._file.flush()
+    writer.last_hash = writer._recover_last_hash()
+    writer._commit([_entry(9)])
+    writer._file.close()
+    with open(writer.path, "rb") as f:
+        assert audit_analyzer.verify_chain(f.read().splitlines())
@@ -0,0 +1,31 @@
+from fastapi.testclient import TestClient
+from jose import jwt
+
+SECRET = "dev-secret-change-me"
+
+
+def _client(load_service, tmp_path):
+    for i in range(5):
+        (tmp_path / f"HospitalA__case-{i}.json").write_text("{}")
+    main = load_service("cyborg-proxy", DATA_DIR=tmp_path, JWT_SECRET=SECRET, AUDIT_FSYNC="never")
+    token = jwt.encode({"sub": "alice", "role": "clinician"}, SECRET)
+    return TestClient(main.app), {"Authorization": f"Bearer {token}"}
+
+
+def test_stream_with_bad_cursor_is_400(load_service, tmp_path):
+    client, auth = _client(load_service, tmp_path)
+    with client:
+        r = client.get("/list_blobs", params={"stream": "true", "cursor": "a"}, headers=auth)
+        assert r.status_code == 400
+        assert r.json()["detail"] == "invalid cursor"
+
+
+def test_stream_and_pages_from_cursor(load_service, tmp_path):
+    client, auth = _client(load_service, tmp_path)
+    with client:
+        page = client.get("/list_blobs", params={"limit": 2}, headers=auth).json()
+        assert page["blobs"] == ["HospitalA__case-0.json", "HospitalA__case-1.json"]
+
+        r = client.get("/list_blobs", params={"stream": "true", "cursor": page["next_cursor"]}, headers=auth)
+        assert r.status_code == 200
+        assert len(r.text.splitlines()) == 3
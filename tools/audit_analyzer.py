@@ -1,13 +1,27 @@
-import json, os
+import json, os, hashlib
 
 LOG = "cyborg-proxy/data/audit.log"
 
-def load():
+GENESIS_HASH = "0" * 64
+
+def load_lines():
+    """Raw log lines, rotated segments (audit-<ts>.log) first, oldest → newest."""
     if not os.path.exists(LOG):
         print("No audit log found.")
         return []
-    with open(LOG) as f:
-        return [json.loads(l) for l in f]
+    directory = os.path.dirname(LOG)
+    segments = sorted(
+        os.path.join(directory, f) for f in os.listdir(directory)
+        if f.startswith("audit-") and f.endswith(".log")
+    )
+    lines = []
+    for path in segments + [LOG]:
+        with open(path, "rb") as f:
+            lines += [l for l in f.read().splitlines() if l.strip()]
+    return lines
+
+def load(lines=None):
+    return [json.loads(l) for l in (load_lines() if lines is None else lines)]
 
 def summarize(entries):
     users, roles = {}, {}
@@ -19,12 +33,51 @@ def summarize(entries):
     print("Users:", users)
     print("Roles:", roles)
 
+def chain_hash(prev, entry):
+    body = {k: v for k, v in entry.items() if k != "hash"}
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256((prev + canonical).encode("utf-8")).hexdigest()
+
+def verify_chain(lines):
+    """
+    Check the SHA-256 hash chain written by the proxy's audit writer.
+    The chain is anchored like the writer anchors it: at GENESIS_HASH, or
+    at the hash of the last legacy (unchained) line before it, so a log
+    whose head was cut off does not verify.
+    """
+    print("\n=== HASH CHAIN ===")
+    ok, chained, prev = True, 0, GENESIS_HASH
+    for line in lines:
+        e = json.loads(line)
+        if "hash" not in e:
+            if chained:
+                print(f"UNCHAINED entry after chained entry {chained - 1}: {e.get('ts')} {e.get('action')}")
+                ok = False
+                break
+            prev = hashlib.sha256(line).hexdigest()
+            continue
+        if e["prev"] != prev or chain_hash(prev, e) != e["hash"]:
+            print(f"BROKEN at chained entry {chained}: {e.get('ts')} {e.get('action')}")
+            ok = False
+            break
+        prev = e["hash"]
+        chained += 1
+
+    if ok and not chained:
+        print("No chained entries (legacy log).")
+        return True
+    print("Chained entries:", chained)
+    print("Chain intact:", ok)
+    return ok
+
 def timeline(entries):
     print("\n=== TIMELINE ===")
     for e in entries:
         print(f'{e["ts"]} → {e["actor"]} ({e["role"]}) {e["action"]} {e.get("filename","")}')
 
 if __name__ == "__main__":
-    data = load()
+    lines = load_lines()
+    data = load(lines)
     summarize(data)
+    verify_chain(lines)
     timeline(data)
\ No newline at end of file